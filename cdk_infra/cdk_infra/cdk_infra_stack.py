@@ -21,7 +21,7 @@ class MinimalStack(Stack):
         )
 
         # Customers Table
-        dynamodb.Table(self, "CustomersTable",
+        customers_table = dynamodb.Table(self, "CustomersTable",
             table_name="customers",
             partition_key=dynamodb.Attribute(
                 name="email",
@@ -31,6 +31,20 @@ class MinimalStack(Stack):
             removal_policy=RemovalPolicy.RETAIN
         )
 
+        # Name/surname search index of the customers table
+        customers_table.add_global_secondary_index(
+            index_name="surname-name-index",
+            partition_key=dynamodb.Attribute(
+                name="surname",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="name",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.ALL
+        )
+
         # Products table
         dynamodb.Table(self, "ProductsTable",
             table_name="products",
@@ -43,7 +57,7 @@ class MinimalStack(Stack):
         )
 
         # Purchases table
-        dynamodb.Table(self, "PurchasesTable",
+        purchases_table = dynamodb.Table(self, "PurchasesTable",
             table_name="purchases",
             partition_key=dynamodb.Attribute(
                 name="customer_email",
@@ -57,7 +71,30 @@ class MinimalStack(Stack):
             removal_policy=RemovalPolicy.RETAIN
         )
 
-        purchases_table = dynamodb.Table.from_table_name(self, "PurchasesTableRef", "purchases")
+        # Latest-purchases index of the purchases table (purchases with a created_at)
+        purchases_table.add_global_secondary_index(
+            index_name="customer-created-index",
+            partition_key=dynamodb.Attribute(
+                name="customer_email",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="created_at",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.ALL
+        )
+
+        # Counters table (running aggregates such as the purchases revenue)
+        dynamodb.Table(self, "CountersTable",
+            table_name="counters",
+            partition_key=dynamodb.Attribute(
+                name="counter_name",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.RETAIN
+        )
 
         search_lambda = _lambda.Function(
             self, "DBSearchLambda",
@@ -65,7 +102,8 @@ class MinimalStack(Stack):
             handler="src.lambda_function.lambda_handler",
             code=_lambda.Code.from_asset("../lambda/db_search_app/dist"),
             environment={
-                "PURCHASES_TABLE_NAME": "purchases"
+                "PURCHASES_TABLE_NAME": "purchases",
+                "SCAN_SEGMENTS": "4"
             }
         )
 
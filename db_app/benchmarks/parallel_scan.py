@@ -0,0 +1,95 @@
+'''Benchmark of full-table reads by scan segment count.
+
+A local stand-in for DynamoDB holds a purchases table and answers every Scan
+page after a fixed latency, splitting the table into segments by key hash the
+way DynamoDB does. The whole table is read once sequentially and then through
+SegmentedScanner at each segment count; wall time, items per second and the
+speedup over the sequential read are reported. Run from db_app/:
+
+    python benchmarks/parallel_scan.py --items 20000 --page-size 500 --segments 1 2 4 8 16
+'''
+import argparse
+import os
+import sys
+import time
+import zlib
+from decimal import Decimal
+from typing import Any
+
+DB_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DB_APP_DIR)
+
+# pylint: disable=wrong-import-position
+from segmented_scan import SegmentedScanner
+
+
+class StandInClient:
+    '''Stand-in for a DynamoDB client whose Scan pages each take a fixed latency.'''
+    def __init__(self, items: int, page_size: int, latency: float) -> None:
+        '''Create a table of the given number of purchases.'''
+        self.page_size = page_size
+        self.latency = latency
+        self.items = [{'purchase_id': f'purchase-{index}', 'customer_email': f'customer{index % 997}@example.com',
+                       'total_price': Decimal(index % 500) + Decimal('0.99')} for index in range(items)]
+        self.segments: dict[tuple[int, int], list[dict[str, Any]]] = {}
+
+    def segment(self, segment: int, total_segments: int) -> list[dict[str, Any]]:
+        '''Return the items of one segment, the ones whose key hashes to it.'''
+        key = (segment, total_segments)
+        if key not in self.segments:
+            self.segments[key] = [item for item in self.items
+                                  if zlib.crc32(item['purchase_id'].encode()) % total_segments == segment]
+        return self.segments[key]
+
+    def scan(self, **kwargs: Any) -> dict[str, Any]:
+        '''Return one page of the requested segment, after the page latency.'''
+        items = self.segment(kwargs.get('Segment', 0), kwargs.get('TotalSegments', 1))
+        start = kwargs.get('ExclusiveStartKey', {}).get('position', 0)
+        time.sleep(self.latency)
+        response: dict[str, Any] = {'Items': items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            response['LastEvaluatedKey'] = {'position': start + self.page_size}
+        return response
+
+
+def sequential_read(client: StandInClient) -> int:
+    '''Read the table with one scan, page after page, and return the item count.'''
+    count = 0
+    kwargs: dict[str, Any] = {}
+    while True:
+        response = client.scan(**kwargs)
+        count += len(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return count
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main_cli() -> None:
+    '''Parse arguments and print a table of read time per segment count.'''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20000, help='items in the table')
+    parser.add_argument('--page-size', type=int, default=500, help='items read per Scan page')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per Scan page')
+    parser.add_argument('--segments', nargs='+', type=int, default=[1, 2, 4, 8, 16], help='segment counts')
+    args = parser.parse_args()
+
+    client = StandInClient(args.items, args.page_size, args.latency)
+    # partition up front, so the timed reads only pay the page latency
+    for segments in args.segments:
+        for segment in range(segments):
+            client.segment(segment, segments)
+    start = time.perf_counter()
+    count = sequential_read(client)
+    baseline = time.perf_counter() - start
+    print(f'{"segments":>8} {"items":>7} {"seconds":>8} {"items/s":>9} {"speedup":>7}')
+    print(f'{"seq":>8} {count:>7} {baseline:>8.3f} {count / baseline:>9.0f} {1.0:>7.2f}')
+    for segments in args.segments:
+        scanner = SegmentedScanner(total_segments=segments, workers=segments)
+        start = time.perf_counter()
+        count = sum(1 for _ in scanner.scan(client, 'purchases'))
+        seconds = time.perf_counter() - start
+        print(f'{segments:>8} {count:>7} {seconds:>8.3f} {count / seconds:>9.0f} {baseline / seconds:>7.2f}')
+
+
+if __name__ == '__main__':
+    main_cli()
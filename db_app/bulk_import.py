@@ -0,0 +1,127 @@
+'''This module provides the bulk import engine of db_app.
+Rows are parsed from an NDJSON or CSV upload while it is read, so an import of
+millions of rows keeps only one batch in memory. Valid rows are written with
+BatchWriteItem, 25 items per call (the API limit); items DynamoDB returns as
+UnprocessedItems are sent again after an exponential backoff with jitter.
+
+boto3's Table.batch_writer is not used because it resends unprocessed items at
+once, which keeps a throttled table throttled. Rows are upserted: a row whose
+key is already in the table replaces the stored item.'''
+import io
+import csv
+import json
+import time
+import random
+from typing import IO, Any, Callable, Iterable, Iterator
+
+BATCH_SIZE = 25
+MAX_REPORTED_ERRORS = 20
+
+
+class BatchWriter:
+    '''Buffers items of one table and writes them 25 at a time.'''
+    def __init__(
+        self,
+        client: Any,
+        table_name: str,
+        key_names: tuple[str, ...],
+        max_attempts: int = 8,
+        base_delay: float = 0.05,
+        max_delay: float = 5.0
+    ) -> None:
+        '''Create a writer for a table whose primary key is made of key_names.'''
+        self.client = client
+        self.table_name = table_name
+        self.key_names = key_names
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.written = 0
+        self.retries = 0
+        # keyed by primary key: a batch may not hold the same key twice, the last row wins
+        self._pending: dict[tuple[Any, ...], dict[str, Any]] = {}
+
+    def put(self, item: dict[str, Any]) -> None:
+        '''Queue an item, writing a batch when 25 are queued.'''
+        key = tuple(item[name] for name in self.key_names)
+        self._pending.pop(key, None)
+        self._pending[key] = item
+        if len(self._pending) >= BATCH_SIZE:
+            self._write_batch()
+
+    def flush(self) -> None:
+        '''Write every queued item.'''
+        while self._pending:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        '''Write up to 25 queued items, resending unprocessed ones with backoff.'''
+        keys = list(self._pending)[:BATCH_SIZE]
+        requests = [{"PutRequest": {"Item": self._pending.pop(key)}} for key in keys]
+        attempt = 1
+        while True:
+            response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            self.written += len(requests) - len(unprocessed)
+            if not unprocessed:
+                return
+            if attempt == self.max_attempts:
+                raise RuntimeError(f"{len(unprocessed)} items still unprocessed after {attempt} attempts")
+            self.retries += 1
+            time.sleep(min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0))
+            requests = unprocessed
+            attempt += 1
+
+
+def read_rows(stream: IO[bytes], data_format: str) -> Iterator[tuple[int, Any]]:
+    '''Yield (line number, row) pairs of an NDJSON or CSV upload as it is read.
+    CSV rows are dicts keyed by the header line; an NDJSON line that is not valid
+    JSON is yielded as a ValueError.'''
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if data_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"invalid JSON: {e}")
+
+
+def import_rows(
+    rows: Iterable[tuple[int, Any]],
+    to_item: Callable[[Any], dict[str, Any]],
+    writer: BatchWriter,
+    progress_rows: int = 100000,
+    on_progress: Callable[[dict[str, Any]], None] | None = None
+) -> dict[str, Any]:
+    '''Convert every row with to_item, which raises ValueError for an invalid row, and
+    write the items. Invalid rows are skipped and the first ones reported. on_progress
+    receives the running report every progress_rows rows; the final report is returned.'''
+    start = time.perf_counter()
+    report: dict[str, Any] = {"rows": 0, "imported": 0, "rejected": 0, "errors": []}
+
+    def snapshot() -> dict[str, Any]:
+        seconds = time.perf_counter() - start
+        report.update(imported=writer.written, retries=writer.retries, seconds=round(seconds, 3),
+                      rows_per_second=round(report["rows"] / seconds) if seconds else 0)
+        return report
+
+    for line_number, row in rows:
+        report["rows"] += 1
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            writer.put(to_item(row))
+        except ValueError as e:
+            report["rejected"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_number, "error": str(e)})
+        if on_progress is not None and report["rows"] % progress_rows == 0:
+            on_progress(snapshot())
+    writer.flush()
+    return snapshot()
@@ -3,50 +3,372 @@ This is simple application, which has a database of 'clients' on DynamoDB AWS,
 and user can add clients, update, search or delete them.
 '''
 import os
+import json
+import time
 import uuid
+import random
+import base64
+import binascii
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Iterator
+import click
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import boto3
 from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
 from boto3.exceptions import Boto3Error
 from botocore.exceptions import ClientError
+from metrics import instrument_app, instrument_boto3_client, registry
+from tracing import budget_timeout, trace_app, trace_boto3_client
+from response_compression import compress_app
+from segmented_scan import SegmentedScanner
+from bulk_import import BatchWriter, import_rows, read_rows
+from product_cache import ProductCache
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'db_app')
+trace_app(app, 'db_app')
+compress_app(app)
 
 dynamodb = boto3.resource(
     'dynamodb',
     aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
     aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
     region_name=os.environ.get('AWS_REGION'))
+instrument_boto3_client(dynamodb.meta.client, 'dynamodb')
+trace_boto3_client(dynamodb.meta.client, 'dynamodb')
 
 customer_table = dynamodb.Table('customers')
 purchase_table = dynamodb.Table("purchases")
 product_table = dynamodb.Table("products")
+counter_table = dynamodb.Table("counters")
+
+REVENUE_COUNTER = "purchases_revenue"
+VERSION_COUNTER_PREFIX = "table_version#"
+CUSTOMER_SURNAME_INDEX = "surname-name-index"
+# purchases by customer_email and created_at; purchases without created_at are not in it
+PURCHASE_CREATED_INDEX = os.getenv('PURCHASE_CREATED_INDEX', 'customer-created-index')
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '25'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '100'))
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+SCAN_SEGMENTS = int(os.getenv('SCAN_SEGMENTS', '1'))
+PURCHASE_VIEWS = ('all', 'count', 'latest')
+DEFAULT_LATEST_PURCHASES = int(os.getenv('DEFAULT_LATEST_PURCHASES', '5'))
+PURCHASE_ATTEMPTS = int(os.getenv('PURCHASE_ATTEMPTS', '3'))
+# a transaction holds at most 100 items: the customer check, the purchase and the stock updates
+MAX_CART_ITEMS = min(int(os.getenv('MAX_CART_ITEMS', '25')), 98)
+# unprocessed keys of a BatchGetItem are sent again with an exponential backoff, as BatchWriter does
+BATCH_GET_ATTEMPTS = int(os.getenv('BATCH_GET_ATTEMPTS', '8'))
+BATCH_GET_BASE_DELAY = float(os.getenv('BATCH_GET_BASE_DELAY', '0.05'))
+BATCH_GET_MAX_DELAY = float(os.getenv('BATCH_GET_MAX_DELAY', '2.0'))
+IMPORT_PROGRESS_ROWS = int(os.getenv('IMPORT_PROGRESS_ROWS', '100000'))
+IMPORT_FORMATS = {"application/x-ndjson": "ndjson", "text/csv": "csv"}
+
+IMPORT_ROWS = registry.counter(
+    'import_rows_total',
+    'Rows read by bulk imports, by table and outcome.',
+    ('table', 'outcome')
+)
+
+scanner = SegmentedScanner(
+    total_segments=SCAN_SEGMENTS,
+    workers=int(os.getenv('SCAN_WORKERS', str(SCAN_SEGMENTS)))
+)
+
+# Read-through cache of products; PRODUCT_CACHE_DIR shares invalidations between workers
+product_cache = ProductCache(
+    ttl=float(os.getenv('PRODUCT_CACHE_TTL', '60')),
+    directory=os.getenv('PRODUCT_CACHE_DIR') or None
+)
+
+# Bounded pool for the per-customer purchase queries of a search
+purchase_lookup_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PURCHASE_LOOKUP_WORKERS', '8')),
+    thread_name_prefix='purchases'
+)
+
+def scan_all_items(table: Any, **scan_kwargs: Any) -> Iterator[dict[str, Any]]:
+    '''Yield every item of a table, following LastEvaluatedKey across scan pages.'''
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+def query_all_items(table: Any, **query_kwargs: Any) -> Iterator[dict[str, Any]]:
+    '''Yield every item matching a query, following LastEvaluatedKey across query pages.'''
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+def read_all_items(table: Any, **scan_kwargs: Any) -> Iterator[dict[str, Any]]:
+    '''Yield every item of a table: with a parallel scan of SCAN_SEGMENTS segments
+    when it is above 1, else with one sequential scan. Expressions in scan_kwargs
+    must be strings, not boto3 condition objects.'''
+    if scanner.total_segments > 1:
+        return scanner.scan(table.meta.client, table.name, **scan_kwargs)
+    return scan_all_items(table, **scan_kwargs)
+
+def customer_purchases(email: str, count_only: bool = False, latest: int | None = None) -> tuple[int, list[dict[str, Any]]]:
+    '''Return the number of purchases of a customer and, unless count_only, the purchases,
+    following LastEvaluatedKey; with latest, only the latest ones, newest first, read with one
+    query of PURCHASE_CREATED_INDEX. It runs on the lookup pool, so it uses the thread-safe client.'''
+    query_kwargs: dict[str, Any] = {
+        "TableName": purchase_table.name,
+        "KeyConditionExpression": "customer_email = :email",
+        "ExpressionAttributeValues": {":email": email}
+    }
+    purchases: list[dict[str, Any]] = []
+    if latest is not None:
+        purchases = dynamodb.meta.client.query(**query_kwargs, IndexName=PURCHASE_CREATED_INDEX,
+                                               ScanIndexForward=False, Limit=latest).get("Items", [])
+        count_only = True
+    if count_only:
+        query_kwargs["Select"] = "COUNT"
+    count = 0
+    while True:
+        response = dynamodb.meta.client.query(**query_kwargs)
+        count += response.get("Count", 0)
+        purchases.extend(response.get("Items", []))
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return count, purchases
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+def ndjson_lines(items: Iterator[dict[str, Any]]) -> Iterator[str]:
+    '''Serialize items as newline-delimited JSON, one line per item. A failure
+    after the first line ends the stream with an {"error": ...} line.'''
+    try:
+        for item in items:
+            yield app.json.dumps(item) + "\n"
+    except (ClientError, Boto3Error) as e:
+        app.logger.error("NDJSON export failed: %s", str(e))
+        yield json.dumps({"error": "Export failed"}) + "\n"
+
+def add_to_revenue(total_price: Any, purchase_count: int = 1) -> None:
+    '''Add a purchase to the running revenue total kept in the counters table.'''
+    counter_table.update_item(
+        Key={"counter_name": REVENUE_COUNTER},
+        UpdateExpression="ADD total_price :t, purchase_count :c",
+        ExpressionAttributeValues={
+            ":t": Decimal(str(total_price)),
+            ":c": purchase_count
+        }
+    )
+
+def write_purchase(purchase: dict[str, Any], lines: list[tuple[str, int]], prices: dict[str, Any]) -> None:
+    '''Write a purchase in one transaction: the customer must exist, the stock of every
+    (product_name, amount) line is decreased only if it covers the amount and the product
+    still has the price in prices the purchase was priced at, and the purchase is inserted.
+    Raises the ClientError of a cancelled transaction, whose CancellationReasons are in that
+    order: customer, one per line, purchase.'''
+    transact_items: list[dict[str, Any]] = [{"ConditionCheck": {
+        "TableName": customer_table.name,
+        "Key": {"email": purchase["customer_email"]},
+        "ConditionExpression": "attribute_exists(email)"
+    }}]
+    for product_name, amount in lines:
+        transact_items.append({"Update": {
+            "TableName": product_table.name,
+            "Key": {"product_name": product_name},
+            "UpdateExpression": "SET available_amount = available_amount - :n",
+            "ConditionExpression": "attribute_exists(product_name) AND available_amount >= :n AND price = :p",
+            "ExpressionAttributeValues": {":n": amount, ":p": prices[product_name]},
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD"
+        }})
+    transact_items.append({"Put": {
+        "TableName": purchase_table.name,
+        "Item": purchase,
+        "ConditionExpression": "attribute_not_exists(purchase_id)"
+    }})
+    dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+
+def commit_purchase(
+    purchase: dict[str, Any],
+    lines: list[tuple[str, int]],
+    prices: dict[str, Any]
+) -> tuple[str, dict[str, int | None]]:
+    '''Write a purchase with write_purchase, retrying a transaction conflict up to PURCHASE_ATTEMPTS
+    times. Return "written", or why the transaction was cancelled: "customer_not_found", "refused"
+    with the lines whose stock check failed (product_name to its available amount, None when the
+    product does not exist), "repriced" when only the price of some product changed, or "conflict".
+    Other ClientErrors are raised.'''
+    for attempt in range(1, PURCHASE_ATTEMPTS + 1):
+        try:
+            write_purchase(purchase, lines, prices)
+            return "written", {}
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            reasons = e.response.get("CancellationReasons", [])
+        codes = [reason.get("Code") for reason in reasons]
+        if codes[0:1] == ["ConditionalCheckFailed"]:
+            return "customer_not_found", {}
+        refused: dict[str, int | None] = {}
+        repriced = False
+        for (product_name, amount), reason in zip(lines, reasons[1:]):
+            if reason.get("Code") == "ConditionalCheckFailed":
+                # the items of the reasons are not deserialized by the resource's client
+                product = reason.get("Item")
+                available_amount = int(TypeDeserializer().deserialize(product["available_amount"])) \
+                    if product else None
+                if available_amount is not None and available_amount >= amount:
+                    repriced = True
+                else:
+                    refused[product_name] = available_amount
+        if refused:
+            return "refused", refused
+        if repriced:
+            return "repriced", {}
+        if "TransactionConflict" not in codes or attempt == PURCHASE_ATTEMPTS:
+            app.logger.warning("Purchase transaction cancelled: %s", codes)
+            break
+    return "conflict", {}
+
+def read_product(product_name: str) -> dict[str, Any] | None:
+    '''Read a product from the table, or None when it does not exist.'''
+    item: dict[str, Any] | None = product_table.get_item(Key={"product_name": product_name}).get("Item")
+    return item
+
+def read_products(product_names: list[str]) -> dict[str, dict[str, Any]]:
+    '''Read several products with BatchGetItem, keyed by name. Unprocessed keys are sent again
+    after an exponential backoff with jitter; raises RuntimeError when some remain after
+    BATCH_GET_ATTEMPTS calls.'''
+    request_items: dict[str, Any] = {product_table.name: {
+        "Keys": [{"product_name": product_name} for product_name in product_names]
+    }}
+    products = {}
+    attempt = 1
+    while True:
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        for product in response.get("Responses", {}).get(product_table.name, []):
+            products[product["product_name"]] = product
+        request_items = response.get("UnprocessedKeys") or {}
+        if not request_items:
+            return products
+        if attempt == BATCH_GET_ATTEMPTS:
+            unprocessed = len(request_items[product_table.name]["Keys"])
+            raise RuntimeError(f"{unprocessed} products still unprocessed after {attempt} attempts")
+        delay = min(BATCH_GET_MAX_DELAY, BATCH_GET_BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        time.sleep(budget_timeout(delay, 'DynamoDB'))
+        attempt += 1
+
+def bump_version(*tables: Any) -> None:
+    '''Increase the version counter of every table written, so that their ETags change.'''
+    for table in tables:
+        counter_table.update_item(
+            Key={"counter_name": f"{VERSION_COUNTER_PREFIX}{table.name}"},
+            UpdateExpression="ADD version :one",
+            ExpressionAttributeValues={":one": 1}
+        )
+
+def table_etag(table: Any) -> str:
+    '''Return the strong ETag of a read of a table: its version counter and the query arguments.
+    The version is read before the table, so a concurrent write can only make the tag older.'''
+    response = counter_table.get_item(
+        Key={"counter_name": f"{VERSION_COUNTER_PREFIX}{table.name}"},
+        ConsistentRead=True
+    )
+    version = int((response.get("Item") or {}).get("version", 0))
+    arguments = json.dumps(sorted(request.args.items(multi=True)))
+    return f"{table.name}-{version}-{hashlib.sha256(arguments.encode()).hexdigest()[:16]}"
+
+def not_modified(etag: str) -> tuple[Response, int] | None:
+    '''Return a 304 answer when the request's If-None-Match matches the ETag, else None.
+    The weak comparison is used, so the weak tag of a compressed answer matches too.'''
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response, 304
+
+def with_etag(result: tuple[Response, int], etag: str) -> tuple[Response, int]:
+    '''Attach the ETag to a successful answer; clients must revalidate before reusing it.'''
+    response, status = result
+    if status == 200:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+    return response, status
+
+def encode_cursor(last_key: dict[str, Any] | None) -> str | None:
+    '''Turn a DynamoDB LastEvaluatedKey into an opaque, URL-safe next token.'''
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True).encode()).decode()
+
+def decode_cursor(token: str) -> dict[str, Any]:
+    '''Turn a next token back into an ExclusiveStartKey. Raises ValueError for a bad token.'''
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid next token") from e
+    if not isinstance(last_key, dict) or not all(isinstance(value, str) for value in last_key.values()):
+        raise ValueError("Invalid next token")
+    return last_key
+
+def list_table(table: Any) -> tuple[Response, int]:
+    '''List a table, answering 304 without a scan when the client's ETag is current.'''
+    etag = table_etag(table)
+    return not_modified(etag) or with_etag(scan_table(table), etag)
+
+def scan_table(table: Any) -> tuple[Response, int]:
+    '''Scan a table. With format=ndjson every item is streamed as one JSON line,
+    reading one scan page at a time. With a limit or next parameter one page is
+    returned as {"items": [...], "next": token or null}; without them every
+    scan page is read and the items are returned as one JSON array.'''
+    if request.args.get("format") == "ndjson":
+        return Response(ndjson_lines(read_all_items(table)), content_type=NDJSON_CONTENT_TYPE), 200
+    if "limit" not in request.args and "next" not in request.args:
+        return jsonify(list(read_all_items(table))), 200
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        scan_kwargs: dict[str, Any] = {"Limit": limit}
+        if request.args.get("next"):
+            scan_kwargs["ExclusiveStartKey"] = decode_cursor(request.args["next"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        response = table.scan(**scan_kwargs)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ValidationException':
+            return jsonify({"error": "Invalid next token"}), 400
+        return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+    return jsonify({
+        "items": response.get('Items', []),
+        "next": encode_cursor(response.get("LastEvaluatedKey"))
+    }), 200
 
 @app.route('/all-customers', methods=['GET'])
 def list_all_customers() -> tuple[Response, int]:
-    '''This function will list all the customers.'''
-    response = customer_table.scan()
-    customers = response.get('Items', [])
-    return jsonify(customers), 200
+    '''This function will list all the customers, optionally one page at a time.'''
+    return list_table(customer_table)
 
 @app.route('/all-products', methods=['GET'])
 def list_all_products() -> tuple[Response, int]:
-    '''This function will list all available products.'''
-    response = product_table.scan()
-    products = response.get('Items', [])
-    return jsonify(products), 200
+    '''This function will list all available products, optionally one page at a time.'''
+    return list_table(product_table)
 
 @app.route('/all-purchases', methods=['GET'])
 def list_all_purchases() -> tuple[Response, int]:
-    '''This function will list all purchases.'''
-    response = purchase_table.scan()
-    purchases = response.get('Items', [])
-    return jsonify(purchases), 200
+    '''This function will list all purchases, optionally one page at a time.'''
+    return list_table(purchase_table)
 
 
 @app.route('/add-product', methods=['GET', 'POST'])
@@ -60,12 +382,15 @@ def add_product() -> tuple[Response, int]:
                 app.logger.warning("Product name is missing in GET request")
                 return jsonify({"error": "Product name is required"}), 400
 
-            response = product_table.get_item(Key={"product_name": product_name})
-            existing_product = response.get("Item") if response else None
+            etag = table_etag(product_table)
+            cached = not_modified(etag)
+            if cached:
+                return cached
+            existing_product = product_cache.get(product_name, read_product)
 
             if existing_product:
                 app.logger.info("Product found: %s", product_name)
-                return jsonify(existing_product), 200
+                return with_etag((jsonify(existing_product), 200), etag)
             return jsonify({"message": "Product not found"}), 404
 
         if request.method == "POST":
@@ -99,6 +424,8 @@ def add_product() -> tuple[Response, int]:
                         ":p": updated_price
                     }
                 )
+                product_cache.invalidate(product_name)
+                bump_version(product_table)
                 app.logger.info("Product updated: %s", product_name)
                 return jsonify({"message": "Product updated successfully"}), 200
 
@@ -109,6 +436,8 @@ def add_product() -> tuple[Response, int]:
             }
 
             product_table.put_item(Item=new_product)
+            product_cache.invalidate(product_name)
+            bump_version(product_table)
             app.logger.info("New product added: %s", product_name)
             return jsonify({"message": "Product added successfully"}), 201
 
@@ -117,13 +446,41 @@ def add_product() -> tuple[Response, int]:
         return jsonify({'error': f"Unexpected runtime error: {str(e)}"}), 500
     return jsonify({'error': 'An unexpected error occurred'}), 500
 
+def attach_purchases(customers: list[dict[str, Any]], view: str, latest: int) -> None:
+    '''Query the purchases of every customer concurrently and add them in the given view:
+    all of them, their count only, or the latest ones with the count.'''
+    # a copy of the request context per query, so the calls join the request's trace
+    lookups = [purchase_lookup_executor.submit(contextvars.copy_context().run, customer_purchases,
+                                               customer["email"], view == "count", latest if view == "latest" else None)
+               for customer in customers]
+    for customer, lookup in zip(customers, lookups):
+        count, purchases = lookup.result()
+        if view != "count":
+            customer["purchases"] = purchases
+        if view != "all":
+            customer["purchase_count"] = count
+
 @app.route('/search-customers', methods=['GET'])
 def search_customers() -> tuple[Response, int]:
-    '''Search customers by email (query) or by name/surname (scan)'''
+    '''Search customers by email (get), by surname and optionally name (index query)
+    or by name alone (scan). The purchases of the customers found are queried
+    concurrently; purchases=count returns only their number and purchases=latest
+    only the latest ones (latest=K, DEFAULT_LATEST_PURCHASES by default).'''
     name = request.args.get("name", "").strip()
     surname = request.args.get("surname", "").strip()
     email = request.args.get("email", "").strip()
+    view = request.args.get("purchases", "all")
     app.logger.info("Received request: /search-customers | Params: name=%s, surname=%s, email=%s", name, surname, email)
+    if view not in PURCHASE_VIEWS:
+        return jsonify({"error": f"purchases must be one of: {', '.join(PURCHASE_VIEWS)}"}), 400
+    latest = DEFAULT_LATEST_PURCHASES
+    if view == "latest":
+        try:
+            latest = int(request.args.get("latest", DEFAULT_LATEST_PURCHASES))
+        except ValueError:
+            return jsonify({"error": "latest must be an integer"}), 400
+        if not 1 <= latest <= MAX_PAGE_SIZE:
+            return jsonify({"error": f"latest must be between 1 and {MAX_PAGE_SIZE}"}), 400
 
     try:
         customers = []
@@ -139,34 +496,28 @@ def search_customers() -> tuple[Response, int]:
                 app.logger.error("AWS Client Error while quering by email: %s | Error: %s", email, str(e))
                 return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
 
-        elif name or surname:
-            filter_expression = None
+        elif surname:
+            key_condition = Key("surname").eq(surname)
             if name:
-                filter_expression = Attr("name").eq(name)
-            if surname:
-                if filter_expression:
-                    filter_expression &= Attr("surname").eq(surname)
-                else:
-                    filter_expression = Attr("surname").eq(surname)
+                key_condition &= Key("name").eq(name)
+            customers = list(query_all_items(customer_table, IndexName=CUSTOMER_SURNAME_INDEX,
+                                             KeyConditionExpression=key_condition))
+            app.logger.info("Customers found by name/surname: %s %s | Count: %d", name, surname, len(customers))
 
-            if filter_expression:
-                response = customer_table.scan(FilterExpression=filter_expression)
-                customers = response.get("Items", []) if response else []
-                app.logger.info("Customers found by name/surname: %s %s | Count: %d", name, surname, len(customers))
+        elif name:
+            # the index is keyed by surname, so a name alone still needs a scan
+            customers = list(scan_all_items(customer_table, FilterExpression=Attr("name").eq(name)))
+            app.logger.info("Customers found by name: %s | Count: %d", name, len(customers))
 
         if not customers:
             return jsonify({"error": "Customer not found"}), 404
 
-        for customer in customers:
-            try:
-                purchase_response = purchase_table.query(
-                    KeyConditionExpression=Key("customer_email").eq(customer["email"])
-                )
-                customer["purchases"] = purchase_response.get("Items", []) if purchase_response else []
-                app.logger.info("Fetched purchases for customer: %s", customer["email"])
-            except KeyError:
-                app.logger.error("KeyError: Unexpected response format while fetching purchases for customer: %s", customer["email"])
-                return jsonify({"error": "Unexpected response format from purchase database"}), 500
+        try:
+            attach_purchases(customers, view, latest)
+        except ClientError as e:
+            app.logger.error("AWS Client Error while fetching purchases: %s", str(e))
+            return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+        app.logger.info("Fetched purchases for %d customers", len(customers))
 
         return jsonify({"customers": customers}), 200
 
@@ -202,6 +553,7 @@ def add_customer() -> tuple[Response, int]:
         }
 
         customer_table.put_item(Item=new_customer)
+        bump_version(customer_table)
 
         return jsonify({"success": True, "customer": new_customer}), 201
 
@@ -211,9 +563,59 @@ def add_customer() -> tuple[Response, int]:
         return jsonify({"error": f"Missing expected data: {str(e)}"}), 500
 
 
+def stocked_product(product_name: str, amount: int, fresh: bool = False) -> dict[str, Any] | None:
+    '''Return a product from the cache, or None when it does not exist; with fresh, from the
+    table. The cached stock may be old, so the product is read again when it is missing or its
+    stock does not cover amount: a refusal is only given from a fresh read.'''
+    product = None if fresh else product_cache.get(product_name, read_product)
+    if not product or int(product["available_amount"]) < amount:
+        product = read_product(product_name)
+    return product
+
+def purchase_amount(amount: Any) -> int | str:
+    '''Validate the amount of a purchase, an integer or a string of one; return it as an
+    integer or an error message. Booleans, floats and other JSON values are refused.'''
+    if isinstance(amount, bool) or not isinstance(amount, (int, str)):
+        return "Amount must be an integer"
+    try:
+        value = int(amount)
+    except ValueError:
+        return "Amount must be an integer"
+    if value < 1:
+        return "Amount must be at least 1"
+    return value
+
+def buy_product(customer_email: str, product_name: str, amount: int) -> tuple[str, dict[str, Any], dict[str, int | None]]:
+    '''Price a purchase of amount pieces of a product and write it with commit_purchase. Return
+    the outcome and the refused lines of commit_purchase, with the purchase; a purchase that the
+    product read already refuses is answered "refused" without a write. The cached price may be
+    old: the transaction checks it, and a purchase it refuses for the price alone is priced once
+    more from a fresh read.'''
+    purchase: dict[str, Any] = {}
+    outcome = "repriced"
+    refused: dict[str, int | None] = {}
+    for fresh in (False, True):
+        product = stocked_product(product_name, amount, fresh)
+        # answered without a write; the transaction checks the stock again
+        if not product or int(product["available_amount"]) < amount:
+            return "refused", purchase, {product_name: int(product["available_amount"]) if product else None}
+        purchase = {
+            "purchase_id": str(uuid.uuid4()),
+            "customer_email": customer_email,
+            "products": [{"product_name": product_name, "amount": amount}],
+            "total_price": round((int(product["price"])*amount), 2),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        outcome, refused = commit_purchase(purchase, [(product_name, amount)], {product_name: product["price"]})
+        if outcome != "repriced":
+            break
+        product_cache.invalidate(product_name)
+    return outcome, purchase, refused
+
 @app.route('/make-purchase', methods=['POST'])
 def make_purchase() -> tuple[Response, int]:
-    '''Check if customer exist and product amount is available. Add a new purchase.'''
+    '''Add a new purchase if the customer exists and the product amount is available.
+    The checks, the stock decrease and the purchase are written in one transaction.'''
     try:
         data = request.get_json()
         customer_email = data.get("customer_email")
@@ -222,56 +624,33 @@ def make_purchase() -> tuple[Response, int]:
 
         if not customer_email or product_name is None or amount_to_purchase is None:
             return jsonify({"error": "All fields (email, product_name, amount) are required"}), 400
-        try:
-            amount_to_purchase = int(amount_to_purchase)
-        except ValueError:
-            return jsonify({"error": "Amount must be an integer"}), 400
-
-        try:
-            response_customer = customer_table.get_item(Key={"email": customer_email})
-            customer = response_customer.get("Item")
-
-            if not customer:
-                return jsonify({"error": "Customer not found"}), 404
-        except ClientError as e:
-            return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
-
-        try:
-            response = product_table.get_item(Key={"product_name": product_name})
-            product_in_stock = response.get("Item")
+        amount_to_purchase = purchase_amount(amount_to_purchase)
+        if isinstance(amount_to_purchase, str):
+            return jsonify({"error": amount_to_purchase}), 400
 
-            if not product_in_stock:
+        outcome, purchase, refused = buy_product(customer_email, product_name, amount_to_purchase)
+        if outcome == "customer_not_found":
+            return jsonify({"error": "Customer not found"}), 404
+        if outcome == "refused":
+            product_cache.invalidate(product_name)
+            if refused[product_name] is None:
                 return jsonify({"error": "Product not found"}), 404
+            return jsonify({"error": f"The maximum amount you can purchase is {refused[product_name]}"}), 400
+        if outcome in ("conflict", "repriced"):
+            return jsonify({"error": "The purchase conflicted with another one, please retry"}), 409
+        product_cache.invalidate(product_name)
+        total = purchase["total_price"]
+        try:
+            add_to_revenue(total)
+            bump_version(purchase_table, product_table)
         except ClientError as e:
-            return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
-
-        available_amount = int(product_in_stock["available_amount"])
-
-        if available_amount < amount_to_purchase:
-            return jsonify({"error": f"The maximum amount you can purchase is {available_amount}"}), 400
-        price = int(product_in_stock["price"])
-        purchase_id = str(uuid.uuid4())
-        products = [{"product_name": product_name, "amount": amount_to_purchase}]
-        total = round((price*amount_to_purchase), 2)
-        new_purchase = {
-            "purchase_id": purchase_id,
-            "customer_email": customer_email,
-            "products": products,
-            "total_price": total
-        }
-
-        purchase_table.put_item(Item=new_purchase)
-
-        product_table.update_item(
-            Key={"product_name": product_name},
-        UpdateExpression="SET available_amount = :a",
-        ExpressionAttributeValues={
-            ":a": (available_amount - amount_to_purchase)
-            }
-        )
+            app.logger.error("Purchase %s written, counters not updated: %s", purchase["purchase_id"], str(e))
 
         return jsonify({"message": f"You successfully purchased {amount_to_purchase} pieces of {product_name} for a total price of {total}"}), 201
 
+    except ClientError as e:
+        return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+
     except Boto3Error as e:
         return jsonify({"error": f"Boto3 error: {str(e)}"}), 500
 
@@ -281,6 +660,255 @@ def make_purchase() -> tuple[Response, int]:
     except RuntimeError as e:
         return jsonify({"error": f"Unexpected runtime error: {str(e)}"}), 500
 
+def cart_lines(items: Any) -> list[tuple[str, int]] | str:
+    '''Validate the items of a cart; return its (product_name, amount) lines or an error message.'''
+    if not isinstance(items, list) or not items:
+        return "A non-empty items list is required"
+    if len(items) > MAX_CART_ITEMS:
+        return f"A cart holds at most {MAX_CART_ITEMS} items"
+    lines = []
+    for item in items:
+        product_name = item.get("product_name") if isinstance(item, dict) else None
+        amount = item.get("amount") if isinstance(item, dict) else None
+        if not isinstance(product_name, str) or not product_name:
+            return "Every item needs a product_name"
+        if isinstance(amount, bool) or not isinstance(amount, int) or amount < 1:
+            return f"The amount of {product_name} must be a positive integer"
+        lines.append((product_name, amount))
+    if len({product_name for product_name, _ in lines}) < len(lines):
+        return "Every product may appear only once"
+    return lines
+
+def cart_products(lines: list[tuple[str, int]], fresh: bool = False) -> dict[str, dict[str, Any]]:
+    '''Return the products of cart lines keyed by name, from the cache unless fresh. The cached
+    stock may be old, so the products are read again when a line is missing or its stock does
+    not cover the amount: a refusal is only given from a fresh read.'''
+    product_names = [product_name for product_name, _ in lines]
+    if not fresh:
+        products = product_cache.get_many(product_names, read_products)
+        if all(product_name in products and int(products[product_name]["available_amount"]) >= amount
+               for product_name, amount in lines):
+            return products
+    return read_products(product_names)
+
+def cart_purchase(customer_email: str, lines: list[tuple[str, int]], products: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    '''Return the purchase record of cart lines, priced with the given products.'''
+    prices = {product_name: Decimal(str(products[product_name]["price"])) for product_name, _ in lines}
+    return {
+        "purchase_id": str(uuid.uuid4()),
+        "customer_email": customer_email,
+        "products": [{"product_name": product_name, "amount": amount, "price": prices[product_name]}
+                     for product_name, amount in lines],
+        "total_price": sum((prices[product_name] * amount for product_name, amount in lines), Decimal(0)),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+def line_result(product_name: str, amount: int, product: dict[str, Any] | None) -> dict[str, Any]:
+    '''Return the result of a cart line: not_found, insufficient_stock with the available amount,
+    or ok with the price and the line total.'''
+    result: dict[str, Any] = {"product_name": product_name, "amount": amount}
+    if not product:
+        result["status"] = "not_found"
+    elif int(product["available_amount"]) < amount:
+        result.update(status="insufficient_stock", available_amount=int(product["available_amount"]))
+    else:
+        price = Decimal(str(product["price"]))
+        result.update(status="ok", price=float(price), line_total=float(price * amount))
+    return result
+
+@app.route('/checkout', methods=['POST'])
+def checkout() -> tuple[Response, int]:
+    '''Buy a cart of products as one purchase. The body is {"customer_email": ...,
+    "items": [{"product_name": ..., "amount": ...}, ...]}. The products are read with one
+    BatchGetItem and priced; the stock decrements and the purchase record are written in one
+    transaction, so either every line is bought or none. Every answer lists the result per line.'''
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("customer_email"), str) or not data["customer_email"]:
+        return jsonify({"error": "customer_email and items are required"}), 400
+    lines = cart_lines(data.get("items"))
+    if isinstance(lines, str):
+        return jsonify({"error": lines}), 400
+
+    product_names = [product_name for product_name, _ in lines]
+    # the cached prices may be old: the transaction checks them, and a checkout it refuses
+    # for prices alone is priced once more from a fresh read
+    for fresh in (False, True):
+        try:
+            products = cart_products(lines, fresh)
+        except ClientError as e:
+            return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+        except RuntimeError as e:
+            return jsonify({"error": f"Unexpected runtime error: {str(e)}"}), 500
+
+        results = [line_result(product_name, amount, products.get(product_name)) for product_name, amount in lines]
+        if any(result["status"] != "ok" for result in results):
+            return jsonify({"error": "Some items cannot be purchased", "lines": results}), 400
+
+        purchase = cart_purchase(data["customer_email"], lines, products)
+        try:
+            outcome, refused = commit_purchase(purchase, lines, {product_name: products[product_name]["price"]
+                                                                 for product_name in product_names})
+        except ClientError as e:
+            return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+        if outcome != "repriced":
+            break
+        product_cache.invalidate(*product_names)
+    if outcome == "customer_not_found":
+        return jsonify({"error": "Customer not found"}), 404
+    if outcome == "refused":
+        # the stock of some lines changed since they were read
+        product_cache.invalidate(*product_names)
+        for index, (product_name, amount) in enumerate(lines):
+            if product_name in refused:
+                available_amount = refused[product_name]
+                results[index] = line_result(product_name, amount, None if available_amount is None
+                                             else {"available_amount": available_amount})
+        return jsonify({"error": "Some items cannot be purchased", "lines": results}), 400
+    if outcome in ("conflict", "repriced"):
+        return jsonify({"error": "The checkout conflicted with another purchase, please retry"}), 409
+    product_cache.invalidate(*product_names)
+    try:
+        add_to_revenue(purchase["total_price"])
+        bump_version(purchase_table, product_table)
+    except ClientError as e:
+        app.logger.error("Checkout %s written, counters not updated: %s", purchase["purchase_id"], str(e))
+
+    return jsonify({
+        "purchase_id": purchase["purchase_id"],
+        "total_price": float(purchase["total_price"]),
+        "lines": results
+    }), 201
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats() -> tuple[Response, int]:
+    '''Return the hit and miss counters of the product cache.'''
+    return jsonify({"products": product_cache.stats()}), 200
+
+@app.route('/purchases-total', methods=['GET'])
+def purchases_total() -> tuple[Response, int]:
+    '''Return the running revenue total of all purchases without scanning the purchases table.'''
+    try:
+        response = counter_table.get_item(Key={"counter_name": REVENUE_COUNTER})
+        counter = response.get("Item") or {}
+        return jsonify({
+            "total_price": round(float(counter.get("total_price", 0)), 2),
+            "purchase_count": int(counter.get("purchase_count", 0))
+        }), 200
+    except ClientError as e:
+        return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+
+def customer_from_row(row: Any) -> dict[str, Any]:
+    '''Return the customer item of an import row; raise ValueError for an invalid row.'''
+    if not isinstance(row, dict):
+        raise ValueError("a row must be an object")
+    customer = {field: str(row.get(field) or "").strip() for field in ("name", "surname", "email")}
+    missing = [field for field, value in customer.items() if not value]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    return customer
+
+def product_from_row(row: Any) -> dict[str, Any]:
+    '''Return the product item of an import row; raise ValueError for an invalid row.'''
+    if not isinstance(row, dict):
+        raise ValueError("a row must be an object")
+    product_name = str(row.get("product_name") or "").strip()
+    if not product_name:
+        raise ValueError("missing fields: product_name")
+    try:
+        price = Decimal(str(row.get("price")).strip())
+        available_amount = int(str(row.get("available_amount")).strip())
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError("price must be a number and available_amount an integer") from e
+    if not price.is_finite() or price < 0 or available_amount < 0:
+        raise ValueError("price and available_amount must not be negative")
+    return {"product_name": product_name, "price": price, "available_amount": available_amount}
+
+IMPORTS = {
+    "customers": (customer_table, ("email",), customer_from_row),
+    "products": (product_table, ("product_name",), product_from_row)
+}
+
+def run_import(
+    kind: str,
+    stream: Any,
+    data_format: str,
+    on_progress: Callable[[dict[str, Any]], None] | None = None
+) -> dict[str, Any]:
+    '''Import the rows of an upload into the customers or products table and return the report.'''
+    table, key_names, to_item = IMPORTS[kind]
+    writer = BatchWriter(dynamodb.meta.client, table.name, key_names)
+    rows = read_rows(stream, data_format)
+    try:
+        report = import_rows(rows, to_item, writer, IMPORT_PROGRESS_ROWS, on_progress)
+    finally:
+        if writer.written:
+            if table is product_table:
+                product_cache.invalidate()
+            bump_version(table)
+    IMPORT_ROWS.inc(table.name, 'imported', amount=report["imported"])
+    IMPORT_ROWS.inc(table.name, 'rejected', amount=report["rejected"])
+    return report
+
+def import_upload(kind: str) -> tuple[Response, int]:
+    '''Stream-parse the request body into a table; the Content-Type picks NDJSON or CSV.
+    Rows are upserted, invalid rows are skipped and reported with their line numbers.'''
+    data_format = IMPORT_FORMATS.get(request.mimetype)
+    if data_format is None:
+        return jsonify({"error": f"Content-Type must be one of: {', '.join(IMPORT_FORMATS)}"}), 415
+
+    def log_progress(report: dict[str, Any]) -> None:
+        app.logger.info("Import of %s: %d rows, %d imported, %d rejected, %d rows/s",
+                        kind, report["rows"], report["imported"], report["rejected"], report["rows_per_second"])
+    try:
+        report = run_import(kind, request.stream, data_format, log_progress)
+    except ClientError as e:
+        return jsonify({"error": f"AWS Client Error: {e.response['Error']['Message']}"}), 500
+    except (RuntimeError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Import failed: {str(e)}"}), 500
+    log_progress(report)
+    return jsonify(report), 200
+
+@app.route('/import-customers', methods=['POST'])
+def import_customers() -> tuple[Response, int]:
+    '''Bulk import customers from an NDJSON or CSV body (name, surname, email)'''
+    return import_upload("customers")
+
+@app.route('/import-products', methods=['POST'])
+def import_products() -> tuple[Response, int]:
+    '''Bulk import products from an NDJSON or CSV body (product_name, price, available_amount)'''
+    return import_upload("products")
+
+@app.cli.command('import-rows')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_file(kind: str, path: str) -> None:
+    '''Bulk import customers or products from an NDJSON or CSV file (by its extension),
+    printing progress, e.g. flask --app db_app import-rows products catalog.csv'''
+    data_format = "csv" if path.endswith(".csv") else "ndjson"
+    with open(path, "rb") as stream:
+        report = run_import(kind, stream, data_format, lambda report: print(
+            f"{report['rows']} rows, {report['imported']} imported, {report['rejected']} rejected, "
+            f"{report['rows_per_second']} rows/s", flush=True))
+    print(json.dumps(report, indent=2))
+
+@app.cli.command('rebuild-revenue')
+def rebuild_revenue() -> None:
+    '''Recompute the running revenue total from a full scan of the purchases table.
+    Run it while no purchases are being made, e.g. flask --app db_app rebuild-revenue'''
+    total_price = Decimal(0)
+    purchase_count = 0
+    for purchase in read_all_items(purchase_table, ProjectionExpression="total_price"):
+        total_price += Decimal(str(purchase.get("total_price", 0)))
+        purchase_count += 1
+    counter_table.put_item(Item={
+        "counter_name": REVENUE_COUNTER,
+        "total_price": total_price,
+        "purchase_count": purchase_count
+    })
+    app.logger.info("Revenue rebuilt: total_price=%s, purchase_count=%d", total_price, purchase_count)
+    print(f"Revenue rebuilt from {purchase_count} purchases: total_price={total_price}")
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5001')),
+            debug=os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true'))
@@ -3,6 +3,7 @@ import boto3
 import random
 from faker import Faker
 from decimal import Decimal
+from datetime import timezone
 
 # Initialize Faker
 fake = Faker()
@@ -81,7 +82,8 @@ def create_fake_purchase(customers, products):
         'purchase_id': fake.uuid4(),
         'customer_email': customer['email'],
         'products': product_items, 
-        'total_price': total_price
+        'total_price': total_price,
+        'created_at': fake.date_time_this_year(tzinfo=timezone.utc).isoformat()
     }
 
 def insert_fake_data(num_customers=50, num_purchases=70):
@@ -0,0 +1,143 @@
+'''This module provides the read-through product cache of db_app.
+Products are read on every purchase and product lookup, but the catalog is
+small and changes rarely, so items are kept in process for a time to live.
+Products that do not exist are cached too, so unknown names do not reach
+DynamoDB on every lookup.
+
+Every write to a product invalidates it. Invalidations reach the other worker
+processes when the cache has a directory shared by them (gunicorn.conf.py sets
+PRODUCT_CACHE_DIR): invalidating replaces a stamp file per product, and an
+entry is used only while the stamp it was loaded under is still the current
+one. Processes on other hosts see a change after at most the time to live.
+
+The cache only saves reads. Stock is still checked by the conditional writes
+on DynamoDB, which never use cached values.'''
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Hashable, NamedTuple
+
+ALL_PRODUCTS = ''
+
+
+class CachedProduct(NamedTuple):
+    '''A product item (None when it does not exist), its expiry time and stamp.'''
+    item: dict[str, Any] | None
+    expires_at: float
+    stamp: Hashable
+
+
+class ProductCache:
+    '''A thread-safe cache of product items keyed by product_name.'''
+    def __init__(self, ttl: float, directory: str | None = None) -> None:
+        '''Create an empty cache. With a directory, invalidations are shared with the
+        processes that use the same directory.'''
+        self.ttl = ttl
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, CachedProduct] = {}
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_many(
+        self,
+        product_names: list[str],
+        load: Callable[[list[str]], dict[str, dict[str, Any]]]
+    ) -> dict[str, dict[str, Any]]:
+        '''Return the existing products among product_names, keyed by name. Names that
+        are not cached are read with load, which returns the products it found.'''
+        products: dict[str, dict[str, Any]] = {}
+        missing: dict[str, Hashable] = {}
+        now = time.monotonic()
+        with self._lock:
+            for product_name in product_names:
+                stamp = self._stamp(product_name)
+                entry = self._entries.get(product_name)
+                if entry is not None and entry.expires_at > now and entry.stamp == stamp:
+                    self.hits += 1
+                    if entry.item is not None:
+                        products[product_name] = entry.item
+                else:
+                    self.misses += 1
+                    # stamped before the read, so a write during the read makes the entry stale
+                    missing[product_name] = stamp
+        if not missing:
+            return products
+        loaded = load(list(missing))
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for product_name, stamp in missing.items():
+                item = loaded.get(product_name)
+                self._entries[product_name] = CachedProduct(item, expires_at, stamp)
+                if item is not None:
+                    products[product_name] = item
+        return products
+
+    def get(self, product_name: str, load: Callable[[str], dict[str, Any] | None]) -> dict[str, Any] | None:
+        '''Return a product, or None when it does not exist, reading it with load on a miss.'''
+        def load_many(product_names: list[str]) -> dict[str, dict[str, Any]]:
+            item = load(product_names[0])
+            return {product_names[0]: item} if item is not None else {}
+        return self.get_many([product_name], load_many).get(product_name)
+
+    def invalidate(self, *product_names: str) -> None:
+        '''Drop the given products, or every product when none is given, in this
+        process and, with a shared directory, in the others.'''
+        names = product_names or (ALL_PRODUCTS,)
+        with self._lock:
+            for product_name in names:
+                self._generations[product_name] = self._generations.get(product_name, 0) + 1
+                if product_name == ALL_PRODUCTS:
+                    self._entries.clear()
+                else:
+                    self._entries.pop(product_name, None)
+        if self.directory:
+            for product_name in names:
+                self._touch(self._stamp_path(product_name))
+
+    def clear(self) -> None:
+        '''Drop every entry of this process and reset the counters.'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        '''Return the hit and miss counters and the number of entries.'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def _stamp(self, product_name: str) -> Hashable:
+        '''Return what identifies the current version of a product for this cache:
+        the local invalidation counts and the shared stamp files. The caller must hold the lock.'''
+        local = (self._generations.get(ALL_PRODUCTS, 0), self._generations.get(product_name, 0))
+        if not self.directory:
+            return local
+        return local + (self._file_stamp(ALL_PRODUCTS), self._file_stamp(product_name))
+
+    def _stamp_path(self, product_name: str) -> str:
+        '''Return the stamp file of a product, or of the whole catalog for ALL_PRODUCTS.'''
+        assert self.directory is not None
+        digest = hashlib.sha256(product_name.encode()).hexdigest()[:32] if product_name else 'all'
+        return os.path.join(self.directory, f'product-{digest}.stamp')
+
+    def _file_stamp(self, product_name: str) -> tuple[int, int] | None:
+        '''Return the inode and modification time of a stamp file, None if it was never written.'''
+        try:
+            stat = os.stat(self._stamp_path(product_name))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        '''Replace a stamp file with a new one, which gets a new inode.'''
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(descriptor)
+        os.replace(temporary, path)
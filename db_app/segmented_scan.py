@@ -0,0 +1,106 @@
+'''This module provides the parallel (segmented) scan engine of db_app.
+A table is split into TotalSegments segments that DynamoDB scans independently;
+each segment is read page by page, following LastEvaluatedKey, by one of a
+configurable number of worker threads. Every scan starts its own workers, so a
+reader that stalls only holds its own scan. Pages are handed to the reader through a
+bounded queue, so the segments merge into one stream of items (in no particular
+order) while memory stays bounded by a few pages. When the reader stops early,
+the workers stop after their current page.
+
+A DynamoDB client is used because clients are thread-safe, unlike boto3
+resources. Items are yielded as the client returns them: the client of a boto3
+resource (table.meta.client) converts them to Python types, as Table.scan does.'''
+import queue
+import threading
+import contextvars
+from typing import Any, Iterator
+
+_SEGMENT_DONE = object()
+
+
+class SegmentedScanner:
+    '''Runs DynamoDB parallel scans, each on worker threads of its own.'''
+    def __init__(self, total_segments: int, workers: int, queued_pages: int | None = None) -> None:
+        '''Create a scanner that splits every scan into total_segments segments,
+        read by at most workers threads per scan, with at most queued_pages pages waiting.'''
+        if total_segments < 1 or workers < 1:
+            raise ValueError("total_segments and workers must be at least 1")
+        self.total_segments = total_segments
+        self.workers = workers
+        self.queued_pages = queued_pages or 2 * workers
+
+    def scan(self, client: Any, table_name: str, **scan_kwargs: Any) -> Iterator[dict[str, Any]]:
+        '''Yield every item of a table. scan_kwargs are passed to every Scan call
+        (e.g. ProjectionExpression, ExpressionAttributeNames).'''
+        pages: queue.Queue[Any] = queue.Queue(maxsize=self.queued_pages)
+        stop = threading.Event()
+        segments: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for segment in range(self.total_segments):
+            segments.put(segment)
+        for worker in range(min(self.workers, self.total_segments)):
+            # a copy of the caller's context per worker, so the calls join the caller's trace
+            threading.Thread(target=contextvars.copy_context().run, name=f'scan-{table_name}-{worker}', daemon=True,
+                             args=(self._scan_segments, client, table_name, segments, scan_kwargs, pages, stop)).start()
+        remaining = self.total_segments
+        try:
+            while remaining:
+                page = pages.get()
+                if page is _SEGMENT_DONE:
+                    remaining -= 1
+                elif isinstance(page, BaseException):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            stop.set()
+
+    def _scan_segments(
+        self,
+        client: Any,
+        table_name: str,
+        segments: "queue.SimpleQueue[int]",
+        scan_kwargs: dict[str, Any],
+        pages: "queue.Queue[Any]",
+        stop: threading.Event
+    ) -> None:
+        '''Read segments of the scan one after another until none are left.'''
+        while not stop.is_set():
+            try:
+                segment = segments.get_nowait()
+            except queue.Empty:
+                return
+            self._scan_segment(client, table_name, segment, scan_kwargs, pages, stop)
+
+    def _scan_segment(
+        self,
+        client: Any,
+        table_name: str,
+        segment: int,
+        scan_kwargs: dict[str, Any],
+        pages: "queue.Queue[Any]",
+        stop: threading.Event
+    ) -> None:
+        '''Read one segment page by page and queue its pages, then a done marker.'''
+        kwargs = dict(scan_kwargs, TableName=table_name, Segment=segment, TotalSegments=self.total_segments)
+        try:
+            while not stop.is_set():
+                response = client.scan(**kwargs)
+                self._put(pages, response.get('Items', []), stop)
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    break
+                kwargs['ExclusiveStartKey'] = last_key
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._put(pages, e, stop)
+        finally:
+            self._put(pages, _SEGMENT_DONE, stop)
+
+    @staticmethod
+    def _put(pages: "queue.Queue[Any]", value: Any, stop: threading.Event) -> None:
+        '''Queue a value, giving up once the reader has stopped.'''
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
@@ -11,7 +11,19 @@ def mock_dynamodb_setup():
         dynamodb.create_table(
             TableName='customers',
             KeySchema=[{'AttributeName': 'email', 'KeyType': 'HASH'}],
-            AttributeDefinitions=[{'AttributeName': 'email', 'AttributeType': 'S'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'email', 'AttributeType': 'S'},
+                {'AttributeName': 'surname', 'AttributeType': 'S'},
+                {'AttributeName': 'name', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'surname-name-index',
+                'KeySchema': [
+                    {'AttributeName': 'surname', 'KeyType': 'HASH'},
+                    {'AttributeName': 'name', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
             BillingMode='PAY_PER_REQUEST'
         )
 
@@ -30,8 +42,24 @@ def mock_dynamodb_setup():
             ],
             AttributeDefinitions=[
                 {'AttributeName': 'customer_email', 'AttributeType': 'S'},
-                {'AttributeName': 'purchase_id', 'AttributeType': 'S'}
+                {'AttributeName': 'purchase_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}
             ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'customer-created-index',
+                'KeySchema': [
+                    {'AttributeName': 'customer_email', 'KeyType': 'HASH'},
+                    {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        dynamodb.create_table(
+            TableName='counters',
+            KeySchema=[{'AttributeName': 'counter_name', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'counter_name', 'AttributeType': 'S'}],
             BillingMode='PAY_PER_REQUEST'
         )
 
@@ -41,6 +69,7 @@ def mock_dynamodb_setup():
 def test_client(mock_dynamodb_setup):
     '''Create a test client for Flask application.'''
     import db_app
+    db_app.product_cache.clear()
     db_app.app.config.update({
         "TESTING": True,
         "DEBUG": True,
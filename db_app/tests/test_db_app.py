@@ -1,3 +1,6 @@
+import gzip
+import json
+from decimal import Decimal
 import pytest
 
 def test_list_all_customers(test_client, mock_dynamodb_setup):
@@ -69,6 +72,38 @@ def test_list_all_purchases(test_client, mock_dynamodb_setup):
     assert returned_id == expected_id
 
 
+def test_list_customers_paginated(test_client, mock_dynamodb_setup):
+    '''Test walking the customers table page by page with the next token.'''
+
+    customer_table = mock_dynamodb_setup.Table("customers")
+    emails = {f'customer{i}@gmail.com' for i in range(7)}
+    for email in emails:
+        customer_table.put_item(Item={'email': email, 'name': 'Name', 'surname': 'Surname'})
+
+    returned = []
+    pages = 0
+    url = '/all-customers?limit=3'
+    while url:
+        response = test_client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['items']) <= 3
+        returned.extend(customer['email'] for customer in page['items'])
+        pages += 1
+        url = f"/all-customers?limit=3&next={page['next']}" if page['next'] else None
+
+    assert sorted(returned) == sorted(emails)
+    assert pages >= 3
+
+
+def test_list_paginated_rejects_bad_parameters(test_client, mock_dynamodb_setup):
+    '''Test that an invalid limit or next token is answered with 400.'''
+
+    assert test_client.get('/all-products?limit=0').status_code == 400
+    assert test_client.get('/all-products?limit=abc').status_code == 400
+    assert test_client.get('/all-products?next=not-a-token').status_code == 400
+
+
 def test_add_product(test_client, mock_dynamodb_setup):
     '''Test adding and updating a product from the database.'''
 
@@ -288,7 +323,554 @@ def test_make_purchase(test_client, mock_dynamodb_setup):
     assert "error" in response.json
     assert response.json["error"] == "Amount must be an integer"
 
+    for amount in (1.9, True, [1], {"amount": 1}, "1.5"):
+        invalid_data["amount_to_purchase"] = amount
+        response = test_client.post('/make-purchase', json=invalid_data)
+        assert response.status_code == 400
+        assert response.json["error"] == "Amount must be an integer"
+
+    for amount in (0, -2):
+        invalid_data["amount_to_purchase"] = amount
+        response = test_client.post('/make-purchase', json=invalid_data)
+        assert response.status_code == 400
+        assert response.json["error"] == "Amount must be at least 1"
+    assert product_table.get_item(Key={"product_name": "Spiced Latte"})["Item"]["available_amount"] == 3
+
     from botocore.exceptions import ClientError
     error_response = {"Error": {"Code": "500", "Message": "AWS Internal Error"}}
     with pytest.raises(ClientError):
-        raise ClientError(error_response, "PutItem")
\ No newline at end of file
+        raise ClientError(error_response, "PutItem")
+
+def test_purchase_survives_counter_update_failure(test_client, mock_dynamodb_setup, monkeypatch):
+    """Test that a purchase already written is reported as made when the counters cannot be updated."""
+    from botocore.exceptions import ClientError
+    import db_app
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "a@example.com", "name": "A", "surname": "B"})
+    mock_dynamodb_setup.Table('products').put_item(Item={"product_name": "Tea", "price": 2, "available_amount": 5})
+
+    def failing_update(*args, **kwargs):
+        raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "slow down"}},
+                          "UpdateItem")
+    monkeypatch.setattr(db_app, "add_to_revenue", failing_update)
+
+    response = test_client.post('/make-purchase', json={
+        "customer_email": "a@example.com", "product_name": "Tea", "amount_to_purchase": 2
+    })
+    assert response.status_code == 201
+    assert len(mock_dynamodb_setup.Table('purchases').scan()["Items"]) == 1
+
+def test_purchases_total(test_client, mock_dynamodb_setup):
+    """Test that purchases update the running revenue total returned by /purchases-total."""
+    customer_table = mock_dynamodb_setup.Table('customers')
+    product_table = mock_dynamodb_setup.Table('products')
+
+    customer_table.put_item(Item={"email": "john.doe@example.com", "name": "John", "surname": "Doe"})
+    product_table.put_item(Item={"product_name": "Spiced Latte", "price": 300, "available_amount": 5})
+    product_table.put_item(Item={"product_name": "Morning Joy", "price": 473, "available_amount": 5})
+
+    response = test_client.get('/purchases-total')
+    assert response.status_code == 200
+    assert response.json == {"total_price": 0, "purchase_count": 0}
+
+    for product_name, amount in (("Spiced Latte", 2), ("Morning Joy", 1)):
+        response = test_client.post('/make-purchase', json={
+            "customer_email": "john.doe@example.com",
+            "product_name": product_name,
+            "amount_to_purchase": amount
+        })
+        assert response.status_code == 201
+
+    response = test_client.get('/purchases-total')
+    assert response.status_code == 200
+    assert response.json == {"total_price": 1073, "purchase_count": 2}
+
+def test_rebuild_revenue(test_client, mock_dynamodb_setup):
+    """Test that the rebuild command recomputes the revenue total from a full scan."""
+    import db_app
+    purchase_table = mock_dynamodb_setup.Table('purchases')
+    counter_table = mock_dynamodb_setup.Table('counters')
+
+    counter_table.put_item(Item={"counter_name": "purchases_revenue", "total_price": 5, "purchase_count": 1})
+    for index, price in enumerate(("999.99", "499.50", "250.51")):
+        purchase_table.put_item(Item={
+            "customer_email": f"customer{index}@example.com",
+            "purchase_id": str(index),
+            "total_price": Decimal(price)
+        })
+
+    result = db_app.app.test_cli_runner().invoke(args=["rebuild-revenue"])
+    assert result.exit_code == 0
+    assert "3 purchases" in result.output
+
+    response = test_client.get('/purchases-total')
+    assert response.json == {"total_price": 1750.0, "purchase_count": 3}
+
+def test_spent_budget_stops_dynamodb_calls(test_client, mock_dynamodb_setup):
+    """Test that no DynamoDB call is sent once the request budget from the gateway is spent."""
+    response = test_client.get('/purchases-total', headers={"X-Request-Budget-Ms": "0"})
+    assert response.status_code == 504
+    assert response.json["error"] == "Request budget spent before calling dynamodb"
+
+    response = test_client.get('/purchases-total', headers={"X-Request-Budget-Ms": "5000"})
+    assert response.status_code == 200
+
+def test_metrics_endpoint(test_client, mock_dynamodb_setup):
+    """Test that route latencies and DynamoDB call timings are exposed on /metrics."""
+    test_client.get('/all-customers')
+
+    response = test_client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'service="db_app",method="GET",route="/all-customers",status="200"' in text
+    assert 'system="dynamodb",operation="Scan",outcome="success"' in text
+
+def test_search_reports_server_timing(test_client, mock_dynamodb_setup):
+    """Test that the caller's trace ID is kept and the DynamoDB calls are reported in Server-Timing."""
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "a@example.com", "name": "Ann", "surname": "Lee"})
+
+    response = test_client.get('/search-customers?surname=Lee',
+                               headers={"X-Trace-Id": "trace-1234", "X-Trace-Dump": "1"})
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] == "trace-1234"
+    server_timing = response.headers["Server-Timing"]
+    assert server_timing.startswith("total;dur=")
+    assert "dynamodb.Query;" in server_timing
+    assert "dynamodb.Scan" not in server_timing
+    spans = json.loads(response.headers["X-Trace-Spans"])["spans"]
+    assert [span["name"] for span in spans] == ["dynamodb.Query", "dynamodb.Query"]
+
+def test_list_and_lookup_honor_if_none_match(test_client, mock_dynamodb_setup):
+    """Test that a current ETag gets a 304 and that writes change the ETag."""
+    first = test_client.get('/all-products')
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = test_client.get('/all-products', headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.data == b""
+
+    paged = test_client.get('/all-products?limit=5')
+    assert paged.headers["ETag"] != etag
+
+    test_client.post('/add-product', json={"product_name": "Tea", "price": 3, "available_amount": 5})
+    changed = test_client.get('/all-products', headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+    lookup = test_client.get('/add-product?product_name=Tea')
+    assert test_client.get('/add-product?product_name=Tea',
+                           headers={"If-None-Match": lookup.headers["ETag"]}).status_code == 304
+
+    customers_etag = test_client.get('/all-customers').headers["ETag"]
+    test_client.post('/add-customer', json={"name": "Ann", "surname": "Lee", "email": "ann@example.com"})
+    assert test_client.get('/all-customers', headers={"If-None-Match": customers_etag}).status_code == 200
+
+def test_large_list_is_compressed_and_revalidates(test_client, mock_dynamodb_setup):
+    """Test that a large list is gzip-encoded with a weak ETag that still gets a 304."""
+    customer_table = mock_dynamodb_setup.Table("customers")
+    for index in range(100):
+        customer_table.put_item(Item={"email": f"user{index}@example.com", "name": "Name", "surname": "Surname"})
+
+    response = test_client.get('/all-customers', headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(response.data))) == 100
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    again = test_client.get('/all-customers', headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+
+def test_scan_all_items_follows_last_evaluated_key():
+    """Test that every scan page is read, not only the first one."""
+    import db_app
+
+    class PagedTable:
+        '''Answers scans in pages of two items, like DynamoDB past its 1 MB page limit.'''
+        def __init__(self):
+            self.calls = []
+
+        def scan(self, **kwargs):
+            self.calls.append(dict(kwargs))
+            start = int(kwargs.get("ExclusiveStartKey", {}).get("id", "0"))
+            page = {"Items": [{"id": str(i)} for i in range(start, min(start + 2, 5))]}
+            if start + 2 < 5:
+                page["LastEvaluatedKey"] = {"id": str(start + 2)}
+            return page
+
+    table = PagedTable()
+    items = list(db_app.scan_all_items(table, ProjectionExpression="id"))
+
+    assert [item["id"] for item in items] == ["0", "1", "2", "3", "4"]
+    assert len(table.calls) == 3
+    assert all(call["ProjectionExpression"] == "id" for call in table.calls)
+
+
+def test_list_as_ndjson(test_client, mock_dynamodb_setup):
+    """Test that format=ndjson streams one JSON document per line."""
+    product_table = mock_dynamodb_setup.Table("products")
+    for index in range(3):
+        product_table.put_item(Item={"product_name": f"Product {index}", "price": Decimal("2.5"), "available_amount": 1})
+
+    response = test_client.get('/all-products?format=ndjson')
+
+    assert response.status_code == 200
+    assert response.content_type == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 3
+    assert {json.loads(line)["product_name"] for line in lines} == {"Product 0", "Product 1", "Product 2"}
+    assert json.loads(lines[0])["price"] == "2.5"
+
+def test_segmented_scan_reads_every_segment(test_client, mock_dynamodb_setup, monkeypatch):
+    """Test that a parallel scan merges all segments and pages into one stream."""
+    import db_app
+    from segmented_scan import SegmentedScanner
+
+    purchase_table = mock_dynamodb_setup.Table("purchases")
+    for index in range(40):
+        purchase_table.put_item(Item={"customer_email": f"c{index % 7}@example.com",
+                                      "purchase_id": str(index), "total_price": Decimal(index)})
+
+    scanner = SegmentedScanner(total_segments=4, workers=2, queued_pages=1)
+    items = list(scanner.scan(purchase_table.meta.client, "purchases", Limit=3))
+    assert sorted(int(item["purchase_id"]) for item in items) == list(range(40))
+    assert all(isinstance(item["total_price"], Decimal) for item in items)
+
+    early = scanner.scan(purchase_table.meta.client, "purchases", Limit=3)
+    assert next(early)["purchase_id"]
+    early.close()
+
+    monkeypatch.setattr(db_app, "scanner", scanner)
+    response = test_client.get('/all-purchases')
+    assert len(response.get_json()) == 40
+    result = db_app.app.test_cli_runner().invoke(args=["rebuild-revenue"])
+    assert "40 purchases" in result.output
+
+def test_segmented_scan_is_not_held_up_by_stalled_reader():
+    """Test that a reader that stops consuming its scan does not starve a concurrent scan."""
+    import threading
+    from segmented_scan import SegmentedScanner
+
+    class PagedClient:
+        """Answers every segment with five one-item pages"""
+        def scan(self, Segment, ExclusiveStartKey=None, **_kwargs):
+            page = ExclusiveStartKey["page"] + 1 if ExclusiveStartKey else 0
+            response = {"Items": [{"id": Segment * 100 + page}]}
+            if page < 4:
+                response["LastEvaluatedKey"] = {"page": page}
+            return response
+
+    scanner = SegmentedScanner(total_segments=2, workers=2, queued_pages=1)
+    stalled = scanner.scan(PagedClient(), "purchases")
+    assert next(stalled)["id"] is not None
+
+    items = []
+    reader = threading.Thread(target=lambda: items.extend(scanner.scan(PagedClient(), "purchases")), daemon=True)
+    reader.start()
+    reader.join(timeout=5)
+    stalled.close()
+
+    assert not reader.is_alive()
+    assert sorted(item["id"] for item in items) == [0, 1, 2, 3, 4, 100, 101, 102, 103, 104]
+
+def test_search_fetches_purchases_of_every_customer(test_client, mock_dynamodb_setup):
+    """Test that purchases are fetched for every match, in full, as counts or as the latest ones."""
+    customer_table = mock_dynamodb_setup.Table('customers')
+    purchase_table = mock_dynamodb_setup.Table('purchases')
+    for index in range(12):
+        email = f"lee{index}@example.com"
+        customer_table.put_item(Item={"email": email, "name": f"Name{index}", "surname": "Lee"})
+        for day in range(index % 4):
+            purchase_table.put_item(Item={"customer_email": email, "purchase_id": f"{index}-{day}",
+                                          "created_at": f"2024-01-0{day + 1}T00:00:00+00:00"})
+
+    response = test_client.get('/search-customers?surname=Lee')
+    assert response.status_code == 200
+    customers = {customer["email"]: customer for customer in response.json["customers"]}
+    assert len(customers) == 12
+    assert all(len(customers[f"lee{index}@example.com"]["purchases"]) == index % 4 for index in range(12))
+
+    response = test_client.get('/search-customers?surname=Lee&purchases=count')
+    customers = {customer["email"]: customer for customer in response.json["customers"]}
+    assert customers["lee3@example.com"]["purchase_count"] == 3
+    assert "purchases" not in customers["lee3@example.com"]
+
+    response = test_client.get('/search-customers?surname=Lee&name=Name7&purchases=latest&latest=2')
+    customer = response.json["customers"][0]
+    assert customer["purchase_count"] == 3
+    assert [purchase["purchase_id"] for purchase in customer["purchases"]] == ["7-2", "7-1"]
+
+    # a purchase written before created_at was recorded counts, but has no place among the latest
+    purchase_table.put_item(Item={"customer_email": "lee7@example.com", "purchase_id": "7-legacy"})
+    response = test_client.get('/search-customers?surname=Lee&name=Name7&purchases=latest&latest=5')
+    customer = response.json["customers"][0]
+    assert customer["purchase_count"] == 4
+    assert [purchase["purchase_id"] for purchase in customer["purchases"]] == ["7-2", "7-1", "7-0"]
+
+    assert test_client.get('/search-customers?surname=Lee&purchases=some').status_code == 400
+    assert test_client.get('/search-customers?surname=Lee&purchases=latest&latest=0').status_code == 400
+    # latest only matters to purchases=latest
+    assert test_client.get('/search-customers?surname=Lee&purchases=count&latest=x').status_code == 200
+
+def test_concurrent_purchases_do_not_oversell(test_client, mock_dynamodb_setup, monkeypatch):
+    """Test that parallel purchases of the same product never sell more than the stock."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from moto.core.botocore_stubber import BotocoreStubber
+
+    # DynamoDB applies every request atomically; moto does not across threads unless serialized
+    process_request = BotocoreStubber.process_request
+    lock = threading.Lock()
+
+    def atomic_process_request(self, request):
+        with lock:
+            return process_request(self, request)
+    monkeypatch.setattr(BotocoreStubber, "process_request", atomic_process_request)
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "john.doe@example.com", "name": "John", "surname": "Doe"})
+    product_table = mock_dynamodb_setup.Table('products')
+    product_table.put_item(Item={"product_name": "Spiced Latte", "price": 300, "available_amount": 10})
+
+    def purchase(_):
+        return test_client.post('/make-purchase', json={
+            "customer_email": "john.doe@example.com",
+            "product_name": "Spiced Latte",
+            "amount_to_purchase": 1
+        }).status_code
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        statuses = list(executor.map(purchase, range(64)))
+
+    assert statuses.count(201) == 10
+    assert set(statuses) <= {201, 400, 409}
+    assert product_table.get_item(Key={"product_name": "Spiced Latte"})["Item"]["available_amount"] == 0
+    assert len(mock_dynamodb_setup.Table('purchases').scan()["Items"]) == 10
+
+def test_checkout(test_client, mock_dynamodb_setup):
+    """Test that a cart is bought as one purchase, and that a cart with a bad line buys nothing."""
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "john.doe@example.com", "name": "John", "surname": "Doe"})
+    product_table = mock_dynamodb_setup.Table('products')
+    product_table.put_item(Item={"product_name": "Spiced Latte", "price": 300, "available_amount": 5})
+    product_table.put_item(Item={"product_name": "Morning Joy", "price": Decimal("4.5"), "available_amount": 2})
+    purchase_table = mock_dynamodb_setup.Table('purchases')
+
+    response = test_client.post('/checkout', json={"customer_email": "john.doe@example.com", "items": [
+        {"product_name": "Spiced Latte", "amount": 2},
+        {"product_name": "Morning Joy", "amount": 2}
+    ]})
+    assert response.status_code == 201
+    assert response.json["total_price"] == 609
+    assert [line["status"] for line in response.json["lines"]] == ["ok", "ok"]
+    assert response.json["lines"][1]["line_total"] == 9
+    purchases = purchase_table.scan()["Items"]
+    assert len(purchases) == 1
+    assert [product["product_name"] for product in purchases[0]["products"]] == ["Spiced Latte", "Morning Joy"]
+    assert product_table.get_item(Key={"product_name": "Morning Joy"})["Item"]["available_amount"] == 0
+    assert test_client.get('/purchases-total').json == {"total_price": 609, "purchase_count": 1}
+
+    response = test_client.post('/checkout', json={"customer_email": "john.doe@example.com", "items": [
+        {"product_name": "Spiced Latte", "amount": 1},
+        {"product_name": "Morning Joy", "amount": 1},
+        {"product_name": "Unknown", "amount": 1}
+    ]})
+    assert response.status_code == 400
+    assert [line["status"] for line in response.json["lines"]] == ["ok", "insufficient_stock", "not_found"]
+    assert response.json["lines"][1]["available_amount"] == 0
+    assert len(purchase_table.scan()["Items"]) == 1
+    assert product_table.get_item(Key={"product_name": "Spiced Latte"})["Item"]["available_amount"] == 3
+
+    response = test_client.post('/checkout', json={"customer_email": "nobody@example.com",
+                                                  "items": [{"product_name": "Spiced Latte", "amount": 1}]})
+    assert response.status_code == 404
+    assert product_table.get_item(Key={"product_name": "Spiced Latte"})["Item"]["available_amount"] == 3
+
+    for items in ([], [{"product_name": "Spiced Latte", "amount": 0}],
+                  [{"product_name": "Spiced Latte", "amount": 1}, {"product_name": "Spiced Latte", "amount": 1}]):
+        response = test_client.post('/checkout', json={"customer_email": "john.doe@example.com", "items": items})
+        assert response.status_code == 400
+
+    for items in ({"product_name": "Spiced Latte", "amount": 1}, "Spiced Latte", 1, None):
+        response = test_client.post('/checkout', json={"customer_email": "john.doe@example.com", "items": items})
+        assert response.status_code == 400
+        assert response.json["error"] == "A non-empty items list is required"
+
+    for customer_email in ("", None, 5, ["john.doe@example.com"], {"email": "john.doe@example.com"}):
+        response = test_client.post('/checkout', json={"customer_email": customer_email,
+                                                      "items": [{"product_name": "Spiced Latte", "amount": 1}]})
+        assert response.status_code == 400
+        assert response.json["error"] == "customer_email and items are required"
+    assert product_table.get_item(Key={"product_name": "Spiced Latte"})["Item"]["available_amount"] == 3
+
+def test_read_products_backs_off_on_unprocessed_keys(monkeypatch):
+    """Test that unprocessed keys are read again after a growing delay, up to BATCH_GET_ATTEMPTS calls."""
+    import db_app
+    delays = []
+    monkeypatch.setattr(db_app.time, "sleep", delays.append)
+    monkeypatch.setattr(db_app, "BATCH_GET_BASE_DELAY", 0.1)
+
+    class ThrottledResource:
+        """Stand-in resource that leaves the last key unprocessed while throttled."""
+        def __init__(self, throttled_calls):
+            self.throttled_calls = throttled_calls
+            self.calls = 0
+
+        def batch_get_item(self, RequestItems):
+            self.calls += 1
+            keys = RequestItems["products"]["Keys"]
+            if self.calls > self.throttled_calls:
+                return {"Responses": {"products": keys}}
+            return {"Responses": {"products": keys[:-1]}, "UnprocessedKeys": {"products": {"Keys": keys[-1:]}}}
+
+    monkeypatch.setattr(db_app, "dynamodb", ThrottledResource(throttled_calls=2))
+    assert sorted(db_app.read_products(["Tea", "Coffee", "Cocoa"])) == ["Cocoa", "Coffee", "Tea"]
+    assert db_app.dynamodb.calls == 3
+    assert 0.05 <= delays[0] <= 0.1 and 0.1 <= delays[1] <= 0.2
+
+    monkeypatch.setattr(db_app, "dynamodb", ThrottledResource(throttled_calls=100))
+    with pytest.raises(RuntimeError):
+        db_app.read_products(["Tea"])
+    assert db_app.dynamodb.calls == db_app.BATCH_GET_ATTEMPTS
+
+def test_import_customers_and_products(test_client, mock_dynamodb_setup):
+    """Test that NDJSON and CSV uploads are imported in batches and invalid rows are reported."""
+    customers = [json.dumps({"name": f"Name{i}", "surname": "Lee", "email": f"lee{i}@example.com"}) for i in range(60)]
+    customers.insert(10, "{not json")
+    customers.insert(20, json.dumps({"name": "No", "surname": "Email"}))
+    customers.append(json.dumps({"name": "Renamed", "surname": "Lee", "email": "lee0@example.com"}))
+    response = test_client.post('/import-customers', data="\n".join(customers) + "\n",
+                                content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.json["rows"] == 63
+    assert response.json["rejected"] == 2
+    assert [error["line"] for error in response.json["errors"]] == [11, 21]
+    assert "missing fields: email" in response.json["errors"][1]["error"]
+    customer_table = mock_dynamodb_setup.Table('customers')
+    assert len(customer_table.scan()["Items"]) == 60
+    assert customer_table.get_item(Key={"email": "lee0@example.com"})["Item"]["name"] == "Renamed"
+
+    csv_body = "product_name,price,available_amount\nSpiced Latte,3.5,10\nMorning Joy,abc,1\nArabica Bliss,4,0\n"
+    response = test_client.post('/import-products', data=csv_body, content_type="text/csv")
+    assert response.status_code == 200
+    assert response.json["imported"] == 2
+    assert response.json["errors"][0]["line"] == 3
+    product = mock_dynamodb_setup.Table('products').get_item(Key={"product_name": "Spiced Latte"})["Item"]
+    assert product["price"] == Decimal("3.5")
+    assert product["available_amount"] == 10
+
+    response = test_client.post('/import-products', data="{}", content_type="application/json")
+    assert response.status_code == 415
+
+def test_batch_writer_retries_unprocessed_items(monkeypatch):
+    """Test that unprocessed items are sent again after a growing delay, 25 items per call."""
+    import bulk_import
+    delays = []
+    monkeypatch.setattr(bulk_import.time, "sleep", delays.append)
+
+    class ThrottledClient:
+        """Stand-in client that leaves the last 10 items of the first two calls unprocessed."""
+        def __init__(self):
+            self.calls = []
+
+        def batch_write_item(self, RequestItems):
+            requests = RequestItems["customers"]
+            self.calls.append(len(requests))
+            if len(self.calls) <= 2:
+                return {"UnprocessedItems": {"customers": requests[-10:]}}
+            return {"UnprocessedItems": {}}
+
+    client = ThrottledClient()
+    writer = bulk_import.BatchWriter(client, "customers", ("email",), base_delay=0.1)
+    for index in range(30):
+        writer.put({"email": f"user{index}@example.com"})
+    writer.flush()
+
+    assert client.calls == [25, 10, 10, 5]
+    assert writer.written == 30
+    assert writer.retries == 2
+    assert 0.05 <= delays[0] <= 0.1 and 0.1 <= delays[1] <= 0.2
+
+def test_product_cache_reads_through_and_invalidates(test_client, mock_dynamodb_setup):
+    """Test that product lookups are cached, writes invalidate them and stock checks stay on DynamoDB."""
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "john.doe@example.com", "name": "John", "surname": "Doe"})
+    product_table = mock_dynamodb_setup.Table('products')
+    product_table.put_item(Item={"product_name": "Spiced Latte", "price": 300, "available_amount": 5})
+
+    for _ in range(3):
+        assert int(test_client.get('/add-product?product_name=Spiced Latte').json["price"]) == 300
+    assert test_client.get('/cache-stats').json["products"]["hits"] == 2
+
+    assert test_client.post('/add-product', json={"product_name": "Spiced Latte", "price": 350,
+                                                  "available_amount": 1}).status_code == 200
+    assert int(test_client.get('/add-product?product_name=Spiced Latte').json["price"]) == 350
+
+    # another host sells out behind the cache: the transaction still refuses with the real stock
+    product_table.update_item(Key={"product_name": "Spiced Latte"}, UpdateExpression="SET available_amount = :a",
+                              ExpressionAttributeValues={":a": 1})
+    purchase = {"customer_email": "john.doe@example.com", "product_name": "Spiced Latte", "amount_to_purchase": 3}
+    response = test_client.post('/make-purchase', json=purchase)
+    assert response.status_code == 400
+    assert response.json["error"] == "The maximum amount you can purchase is 1"
+
+    # and restocks behind the cache: a cached shortage is checked again before refusing
+    test_client.get('/add-product?product_name=Spiced Latte')
+    product_table.update_item(Key={"product_name": "Spiced Latte"}, UpdateExpression="SET available_amount = :a",
+                              ExpressionAttributeValues={":a": 10})
+    assert test_client.post('/make-purchase', json=purchase).status_code == 201
+    assert int(test_client.get('/add-product?product_name=Spiced Latte').json["available_amount"]) == 7
+
+def test_purchases_are_priced_at_the_current_price(test_client, mock_dynamodb_setup):
+    """Test that a price changed behind the product cache is not charged at the cached price."""
+    mock_dynamodb_setup.Table('customers').put_item(Item={"email": "john.doe@example.com", "name": "John", "surname": "Doe"})
+    product_table = mock_dynamodb_setup.Table('products')
+    product_table.put_item(Item={"product_name": "Spiced Latte", "price": 300, "available_amount": 10})
+    product_table.put_item(Item={"product_name": "Morning Joy", "price": 473, "available_amount": 10})
+    test_client.get('/add-product?product_name=Spiced Latte')
+    test_client.get('/add-product?product_name=Morning Joy')
+
+    # another host changes the prices behind the cache
+    for product_name, price in (("Spiced Latte", 320), ("Morning Joy", 500)):
+        product_table.update_item(Key={"product_name": product_name}, UpdateExpression="SET price = :p",
+                                  ExpressionAttributeValues={":p": price})
+
+    response = test_client.post('/make-purchase', json={"customer_email": "john.doe@example.com",
+                                                        "product_name": "Spiced Latte", "amount_to_purchase": 2})
+    assert response.status_code == 201
+    assert "total price of 640" in response.json["message"]
+
+    response = test_client.post('/checkout', json={"customer_email": "john.doe@example.com", "items": [
+        {"product_name": "Morning Joy", "amount": 1}
+    ]})
+    assert response.status_code == 201
+    assert response.json["total_price"] == 500
+    assert response.json["lines"][0]["price"] == 500
+    assert test_client.get('/purchases-total').json == {"total_price": 1140, "purchase_count": 2}
+
+def test_product_cache_shares_invalidations(tmp_path):
+    """Test that an invalidation in one process makes the entries of the others stale."""
+    from product_cache import ProductCache
+    reads = []
+
+    def load(product_names):
+        reads.extend(product_names)
+        return {name: {"product_name": name, "price": len(reads)} for name in product_names if name != "Unknown"}
+
+    worker_a = ProductCache(ttl=60, directory=str(tmp_path))
+    worker_b = ProductCache(ttl=60, directory=str(tmp_path))
+    assert set(worker_a.get_many(["Latte", "Mocha", "Unknown"], load)) == {"Latte", "Mocha"}
+    assert set(worker_a.get_many(["Latte", "Mocha", "Unknown"], load)) == {"Latte", "Mocha"}
+    assert reads == ["Latte", "Mocha", "Unknown"]
+
+    worker_b.invalidate("Latte")
+    assert worker_a.get_many(["Latte", "Mocha"], load)["Latte"]["price"] == 4
+    assert reads[3:] == ["Latte"]
+
+    worker_b.invalidate()
+    worker_a.get_many(["Latte", "Mocha"], load)
+    assert reads[4:] == ["Latte", "Mocha"]
+
+    def load_during_write(product_names):
+        worker_b.invalidate(*product_names)
+        return load(product_names)
+    worker_a.get_many(["Espresso"], load_during_write)
+    worker_a.get_many(["Espresso"], load)
+    assert reads[6:] == ["Espresso", "Espresso"]
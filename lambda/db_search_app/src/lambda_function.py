@@ -1,6 +1,7 @@
 '''Lambda function for handling data queries from DynamoDB.'''
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from pydantic import BaseModel, EmailStr, ValidationError
 import boto3
@@ -10,6 +11,9 @@ logger = logging.getLogger()
 logger.setLevel("INFO")
 dynamodb = boto3.resource("dynamodb")
 purchases_table = dynamodb.Table(os.environ.get("PURCHASES_TABLE_NAME"))
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", "1"))
+# clients are thread-safe, unlike table resources; the resource's client still returns Python types
+scan_executor = ThreadPoolExecutor(max_workers=SCAN_SEGMENTS)
 
 class EventModel(BaseModel):
     """Data model for validating incoming Lambda event structure."""
@@ -33,12 +37,25 @@ def get_purchase_details(event):
         logger.exception("Failed to query purchases")
         return str(e)
 
+def scan_segment(segment):
+    """Read every page of one segment of the purchases table."""
+    kwargs = {"TableName": purchases_table.name, "Segment": segment, "TotalSegments": SCAN_SEGMENTS}
+    items = []
+    while True:
+        response = dynamodb.meta.client.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
 def get_all_purchases(event):
-    """Retrieve all purchase records from the DynamoDB purchases table."""
+    """Retrieve all purchase records from the DynamoDB purchases table,
+    scanning SCAN_SEGMENTS segments in parallel."""
     logger.info(event)
     try:
-        response = purchases_table.scan()
-        purchases = response.get('Items', [])
+        purchases = []
+        for items in scan_executor.map(scan_segment, range(SCAN_SEGMENTS)):
+            purchases.extend(items)
         return purchases
     except Exception as e:
         logger.exception("Failed to scan purchases table")
@@ -0,0 +1,288 @@
+'''This module provides pooled HTTP clients for the backend services of main_app.
+Every backend (db_app, webcamera_app, wiki_app) gets its own requests session
+with keep-alive connections, a bounded connection pool, its own timeout and
+retry policy, and a circuit breaker. Identical concurrent GETs can be coalesced
+into one upstream call. Every call carries the trace ID of the current request
+and is recorded as a span, together with the Server-Timing entries the backend
+sends back. Pool statistics are collected so the pool size can be tuned.'''
+import os
+import json
+import time
+import threading
+import logging
+from typing import Any, Callable, NamedTuple, Self
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import BaseHTTPResponse
+from urllib3.util.retry import Retry
+from circuit_breaker import CircuitBreaker, DeadlineExceededError
+from singleflight import SingleFlight
+from metrics import observe_upstream
+from tracing import BUDGET_HEADER, current_trace, trace_headers
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.2
+RETRY_STATUSES = (502, 503, 504)
+# Backend response headers kept in a BufferedResponse, so the gateway can relay them
+RELAYED_HEADERS = ('ETag', 'Cache-Control')
+
+
+class BufferedResponse(NamedTuple):
+    '''A fully read backend response that can be shared between requests.'''
+    status_code: int
+    content_type: str
+    content: bytes
+    headers: tuple[tuple[str, str], ...] = ()
+
+    def json(self) -> Any:
+        '''Decode the body as JSON'''
+        return json.loads(self.content)
+
+
+class BudgetRetry(Retry):
+    '''A urllib3 retry policy that stays within the request budget. A retry is given up
+    when its backoff would end after the deadline, and a Retry-After wait is cut to
+    the time left.'''
+    def __init__(self, *args: Any, deadline: Callable[[], float | None] | None = None, **kwargs: Any) -> None:
+        '''Create the policy; deadline returns the time.monotonic() value of the current
+        request's deadline, or None.'''
+        super().__init__(*args, **kwargs)
+        self.deadline = deadline
+
+    def new(self, **kw: Any) -> Self:
+        '''Return the policy of the next attempt, bound to the same deadline.'''
+        kw.setdefault('deadline', self.deadline)
+        return super().new(**kw)
+
+    def remaining(self) -> float | None:
+        '''Return the seconds left before the deadline, or None without one.'''
+        deadline = self.deadline() if self.deadline else None
+        return None if deadline is None else deadline - time.monotonic()
+
+    def is_exhausted(self) -> bool:
+        '''Out of retries, or out of time for the backoff before the next one.'''
+        remaining = self.remaining()
+        return super().is_exhausted() or (remaining is not None and remaining <= self.get_backoff_time())
+
+    def get_retry_after(self, response: BaseHTTPResponse) -> float | None:
+        '''Return the Retry-After wait of a response, cut to the time left.'''
+        retry_after = super().get_retry_after(response)
+        remaining = self.remaining()
+        if retry_after is None or remaining is None:
+            return retry_after
+        return min(retry_after, max(0.0, remaining))
+
+
+class BackendClient:
+    '''A keep-alive HTTP client bound to one backend service.'''
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF,
+        breaker: CircuitBreaker | None = None,
+        deadline: Callable[[], float | None] | None = None
+    ) -> None:
+        '''Create a session with one connection pool for the backend.
+        Retries are applied only to idempotent methods (GET, HEAD, ...),
+        so a POST is never sent twice, and never past the deadline. deadline
+        returns the time.monotonic() value by which the current request must
+        be answered, or None.'''
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        retry = BudgetRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+            deadline=deadline
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+            pool_block=False
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.breaker = breaker or CircuitBreaker(name)
+        self.deadline = deadline
+        self.flight = SingleFlight(name)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._total_seconds = 0.0
+        LOGGER.info("Initialized %s client for %s (pool_size=%d, timeout=%s, retries=%d)",
+                    name, self.base_url, pool_size, timeout, retries)
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        default_url: str,
+        deadline: Callable[[], float | None] | None = None
+    ) -> "BackendClient":
+        '''Build a client from environment variables prefixed with the backend name,
+        e.g. DB_APP_URL, DB_APP_POOL_SIZE, DB_APP_TIMEOUT, DB_APP_RETRIES,
+        DB_APP_BREAKER_FAILURE_RATE, DB_APP_BREAKER_SLOW_CALL_SECONDS.'''
+        prefix = name.upper()
+        breaker = CircuitBreaker(
+            name=name,
+            window_seconds=float(os.getenv(f'{prefix}_BREAKER_WINDOW_SECONDS', '30')),
+            min_calls=int(os.getenv(f'{prefix}_BREAKER_MIN_CALLS', '10')),
+            failure_rate=float(os.getenv(f'{prefix}_BREAKER_FAILURE_RATE', '0.5')),
+            slow_call_seconds=float(os.getenv(f'{prefix}_BREAKER_SLOW_CALL_SECONDS', '5')),
+            slow_call_rate=float(os.getenv(f'{prefix}_BREAKER_SLOW_CALL_RATE', '0.8')),
+            reset_timeout=float(os.getenv(f'{prefix}_BREAKER_RESET_TIMEOUT', '15')),
+            half_open_calls=int(os.getenv(f'{prefix}_BREAKER_HALF_OPEN_CALLS', '1'))
+        )
+        return cls(
+            name=name,
+            base_url=os.getenv(f'{prefix}_URL', default_url),
+            pool_size=int(os.getenv(f'{prefix}_POOL_SIZE', str(DEFAULT_POOL_SIZE))),
+            timeout=float(os.getenv(f'{prefix}_TIMEOUT', str(DEFAULT_TIMEOUT))),
+            retries=int(os.getenv(f'{prefix}_RETRIES', str(DEFAULT_RETRIES))),
+            backoff_factor=float(os.getenv(f'{prefix}_BACKOFF', str(DEFAULT_BACKOFF))),
+            breaker=breaker,
+            deadline=deadline
+        )
+
+    def url(self, path: str) -> str:
+        '''Return the full URL of a backend path.'''
+        return f'{self.base_url}/{path.lstrip("/")}'
+
+    def get(self, path: str, **kwargs: Any) -> requests.Response:
+        '''Send a GET request to the backend through the pooled session.'''
+        return self._send(self.session.get, path, **kwargs)
+
+    def get_shared(self, path: str, params: dict[str, str] | None = None, **kwargs: Any) -> BufferedResponse:
+        '''GET a path and read the whole body. Concurrent calls with the same
+        path, params and headers share one upstream request and its response,
+        each within its own request budget.'''
+        params = params or {}
+        key = (path, tuple(sorted(params.items())), tuple(sorted((kwargs.get('headers') or {}).items())))
+
+        def fetch() -> BufferedResponse:
+            response = self.get(path, params=params, **kwargs)
+            try:
+                return BufferedResponse(
+                    status_code=response.status_code,
+                    content_type=response.headers.get('Content-Type', 'application/json'),
+                    content=response.content,
+                    headers=tuple((name, response.headers[name]) for name in RELAYED_HEADERS
+                                  if name in response.headers)
+                )
+            finally:
+                response.close()
+
+        # a waiter waits no longer than its own deadline, and a leader that ran out of
+        # its own budget does not fail the waiters that still have time
+        deadline = self.deadline() if self.deadline else None
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return self.flight.do(key, fetch, timeout=timeout, private_errors=(DeadlineExceededError,))
+
+    def post(self, path: str, **kwargs: Any) -> requests.Response:
+        '''Send a POST request to the backend through the pooled session.'''
+        return self._send(self.session.post, path, **kwargs)
+
+    def _send(self, method: Any, path: str, **kwargs: Any) -> requests.Response:
+        '''Call a session method through the circuit breaker, within the request
+        budget, and record the request in the client statistics. A timeout of a
+        call cut short to fit the budget is raised as DeadlineExceededError and is
+        not counted by the circuit breaker.'''
+        timeout = kwargs.pop('timeout', self.timeout)
+        headers = {**(kwargs.get('headers') or {}), **trace_headers()}
+        deadline = self.deadline() if self.deadline else None
+        budget_cut = False
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Request budget spent before calling {self.name}")
+            budget_cut = remaining < timeout
+            timeout = min(timeout, remaining)
+            headers[BUDGET_HEADER] = str(int(remaining * 1000))
+        if headers:
+            kwargs['headers'] = headers
+        trace = current_trace()
+        self.breaker.before_call()
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        start = time.perf_counter()
+        # None marks a call that failed on the request budget rather than on the backend
+        success: bool | None = False
+        try:
+            response: requests.Response = method(self.url(path), timeout=timeout, **kwargs)
+            success = response.status_code < 500
+            if trace is not None and response.headers.get('Server-Timing'):
+                trace.add_remote(self.name, start, response.headers['Server-Timing'])
+            return response
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                self._errors += 1
+            # a timeout that only the request budget made this short belongs to this request
+            if budget_cut and isinstance(e, requests.exceptions.Timeout):
+                success = None
+                raise DeadlineExceededError(f"Request budget ran out while calling {self.name}") from e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if success is None:
+                self.breaker.release()
+            else:
+                self.breaker.record(success, elapsed)
+            observe_upstream('http', self.name, elapsed, bool(success))
+            if trace is not None:
+                trace.add(f'http.{self.name}', start, elapsed, **({} if success else {'error': True}))
+            with self._lock:
+                self._in_flight -= 1
+                self._total_seconds += elapsed
+
+    def stats(self) -> dict[str, Any]:
+        '''Return request counters and the state of the underlying connection pools.'''
+        pools = []
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            idle = pool.pool.qsize() if pool.pool is not None else 0
+            pools.append({
+                'host': f'{key.key_scheme}://{key.key_host}:{key.key_port}',
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle_connections': idle,
+                'max_size': self.pool_size
+            })
+        with self._lock:
+            average_ms = (self._total_seconds / self._requests * 1000) if self._requests else 0.0
+            return {
+                'name': self.name,
+                'base_url': self.base_url,
+                'pool_size': self.pool_size,
+                'timeout': self.timeout,
+                'retries': self.retries,
+                'requests': self._requests,
+                'errors': self._errors,
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'average_ms': round(average_ms, 3),
+                'pools': pools
+            }
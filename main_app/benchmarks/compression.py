@@ -0,0 +1,103 @@
+'''Benchmark of response compression by encoding and payload size.
+
+Customer lists like those returned by db_app's /all-customers are built at
+several sizes and compressed with every available encoding (gzip, br, zstd)
+at the levels the services use, both in one shot and streamed in 64 KiB
+flushed chunks the way passthrough responses are. Bytes on the wire, the
+compression ratio and the CPU time to compress and decompress are reported
+per payload. Run from main_app/:
+
+    python benchmarks/compression.py --sizes 1 10 100 1000 --repeat 20
+
+br and zstd need the brotli and zstandard packages.
+'''
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Callable
+
+MAIN_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN_APP_DIR)
+
+# pylint: disable=wrong-import-position
+from response_compression import LEVELS, Compressor, compress, compress_stream
+
+CHUNK_SIZE = 65536
+
+
+def payload(kilobytes: int) -> bytes:
+    '''Return a JSON customer list of about the given size.'''
+    customers = []
+    size = 2
+    index = 0
+    while size < kilobytes * 1024:
+        customer = {'email': f'customer{index}@example.com', 'name': f'Name{index % 97}',
+                    'surname': f'Surname{index % 193}', 'purchases': index % 7}
+        size += len(json.dumps(customer)) + 2
+        customers.append(customer)
+        index += 1
+    return json.dumps(customers).encode()
+
+
+def decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    '''Return a function that decodes a whole body in the given encoding.'''
+    if encoding == 'br':
+        import brotli  # pylint: disable=import-outside-toplevel
+        return brotli.decompress  # type: ignore[no-any-return]
+    if encoding == 'zstd':
+        import zstandard  # pylint: disable=import-outside-toplevel
+        # streamed frames carry no content size, so a decompressobj is needed per body
+        return lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)  # type: ignore[no-any-return]
+    return gzip.decompress
+
+
+def timed(function: Callable[[], bytes], repeat: int) -> tuple[bytes, float]:
+    '''Run function repeat times; return its result and the median seconds per run.'''
+    durations = []
+    result = b''
+    for _ in range(repeat):
+        start = time.process_time()
+        result = function()
+        durations.append(time.process_time() - start)
+    durations.sort()
+    return result, durations[len(durations) // 2]
+
+
+def main_cli() -> None:
+    '''Parse arguments and print a table of size and CPU cost per encoding and payload.'''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 100, 1000], help='payload sizes in KiB')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per measurement')
+    args = parser.parse_args()
+
+    encodings = []
+    for encoding in ('gzip', 'br', 'zstd'):
+        try:
+            Compressor(encoding)
+            encodings.append(encoding)
+        except ValueError:
+            print(f'{encoding}: encoder not installed, skipped')
+
+    print(f'{"payload":>9} {"encoding":<8} {"level":>5} {"wire_bytes":>11} {"ratio":>6} '
+          f'{"stream_bytes":>12} {"compress_ms":>11} {"stream_ms":>9} {"decompress_ms":>13} {"MB/s":>7}')
+    for kilobytes in args.sizes:
+        body = payload(kilobytes)
+        chunks = [body[start:start + CHUNK_SIZE] for start in range(0, len(body), CHUNK_SIZE)]
+        print(f'{len(body):>9} {"identity":<8} {"-":>5} {len(body):>11} {1.0:>6.2f}')
+        for encoding in encodings:
+            compressed, compress_seconds = timed(lambda e=encoding: compress(body, e), args.repeat)
+            streamed, stream_seconds = timed(
+                lambda e=encoding: b''.join(compress_stream(iter(chunks), e)), args.repeat)
+            decode = decompressor(encoding)
+            _, decompress_seconds = timed(lambda c=compressed, d=decode: d(c), args.repeat)
+            throughput = len(body) / compress_seconds / 1e6 if compress_seconds else float('inf')
+            print(f'{len(body):>9} {encoding:<8} {LEVELS[encoding]:>5} {len(compressed):>11} '
+                  f'{len(body) / len(compressed):>6.2f} {len(streamed):>12} {compress_seconds * 1000:>11.3f} '
+                  f'{stream_seconds * 1000:>9.3f} {decompress_seconds * 1000:>13.3f} {throughput:>7.1f}')
+
+
+if __name__ == '__main__':
+    main_cli()
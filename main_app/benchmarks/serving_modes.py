@@ -0,0 +1,160 @@
+'''Benchmark of gateway throughput under each serving mode.
+
+main_app is started under the Werkzeug development server and under Gunicorn
+with sync, gthread and gevent workers. Its /all-customers route proxies to a
+local stand-in for db_app that answers after a fixed latency, and concurrent
+clients hammer the route for a fixed duration. Requests per second and latency
+percentiles are reported per mode. Run from main_app/:
+
+    python benchmarks/serving_modes.py --workers 2 --threads 8 --concurrency 32
+
+Gunicorn (and gevent for the gevent mode) must be installed.
+'''
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+MAIN_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('werkzeug', 'sync', 'gthread', 'gevent')
+CUSTOMERS = json.dumps([{'name': f'Name {i}', 'surname': f'Surname {i}'} for i in range(20)]).encode()
+
+
+class SlowBackendHandler(BaseHTTPRequestHandler):
+    '''Stand-in for db_app that answers every GET after a fixed latency.'''
+    protocol_version = 'HTTP/1.1'
+    latency = 0.05
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        '''Wait, then return a small customer list.'''
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(CUSTOMERS)))
+        self.end_headers()
+        self.wfile.write(CUSTOMERS)
+
+    def log_message(self, *args: object) -> None:
+        '''Silence request logging.'''
+
+
+def free_port() -> int:
+    '''Return a free local TCP port.'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return int(sock.getsockname()[1])
+
+
+def start_gateway(mode: str, port: int, backend_url: str, workers: int, threads: int) -> subprocess.Popen:  # type: ignore[type-arg]
+    '''Start main_app in the given serving mode.'''
+    env = dict(
+        os.environ,
+        DB_APP_URL=backend_url,
+        MAIL_QUEUE_DIR=tempfile.mkdtemp(prefix='mail_queue_'),
+        PORT=str(port),
+        FLASK_DEBUG='false',
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_WORKER_CLASS=mode,
+        GUNICORN_THREADS=str(threads if mode == 'gthread' else 1),
+        GUNICORN_ACCESS_LOG='',
+        GUNICORN_LOG_LEVEL='warning'
+    )
+    if mode == 'werkzeug':
+        args = [sys.executable, 'main.py']
+    else:
+        args = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'main:app']
+    return subprocess.Popen(args, env=env, cwd=MAIN_APP_DIR,  # pylint: disable=consider-using-with
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url: str) -> None:
+    '''Poll the gateway until it answers.'''
+    for _ in range(200):
+        try:
+            requests.get(f'{base_url}/pool-stats', timeout=5)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f'Gateway at {base_url} did not start')
+
+
+def load(base_url: str, concurrency: int, duration: float) -> tuple[int, int, list[float]]:
+    '''Send requests from concurrency clients for duration seconds.
+    Returns (successful requests, failed requests, latencies in seconds).'''
+    stop_at = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies: list[float] = []
+    failures = [0]
+
+    def client(_: int) -> None:
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok = session.get(f'{base_url}/all-customers', timeout=30).status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    failures[0] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return len(latencies), failures[0], latencies
+
+
+def percentile(values: list[float], share: float) -> float:
+    '''Return the given percentile (0..1) of values.'''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def main_cli() -> None:
+    '''Parse arguments and print a table of throughput per serving mode.'''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='serving modes')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per mode')
+    parser.add_argument('--latency', type=float, default=50.0, help='backend latency in ms')
+    args = parser.parse_args()
+
+    SlowBackendHandler.latency = args.latency / 1000
+    backend = ThreadingHTTPServer(('127.0.0.1', 0), SlowBackendHandler)
+    backend.daemon_threads = True
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+    backend_url = f'http://127.0.0.1:{backend.server_address[1]}'
+
+    print(f'{"mode":<10} {"requests":>9} {"errors":>7} {"req/s":>8} {"p50_ms":>8} {"p99_ms":>8}')
+    for mode in args.modes:
+        port = free_port()
+        gateway = start_gateway(mode, port, backend_url, args.workers, args.threads)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            wait_until_ready(base_url)
+            ok, failed, latencies = load(base_url, args.concurrency, args.duration)
+        finally:
+            gateway.terminate()
+            gateway.wait()
+        print(f'{mode:<10} {ok:>9} {failed:>7} {ok / args.duration:>8.1f} '
+              f'{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}')
+    backend.shutdown()
+
+
+if __name__ == '__main__':
+    main_cli()
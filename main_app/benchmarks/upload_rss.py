@@ -0,0 +1,155 @@
+'''Benchmark of peak gateway memory while forwarding /upload requests.
+
+For every image size and concurrency level a fresh main_app process is started,
+images are uploaded through it to a local sink that stands in for webcamera_app,
+and the peak RSS of the gateway process is reported. Run from main_app/:
+
+    python benchmarks/upload_rss.py --sizes 1 16 64 --concurrency 1 4 8
+
+Add --buffered to compare with the old behaviour, which read the whole image
+into memory and rebuilt the multipart body with requests.
+'''
+import argparse
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+MAIN_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    '''Stand-in for webcamera_app that reads and discards the uploaded body.'''
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        '''Drain the request body in chunks and answer like webcamera_app.'''
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 65536)))
+        body = b'{"url": "https://example.com/image.jpg"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        '''Silence request logging.'''
+
+
+def free_port() -> int:
+    '''Return a free local TCP port.'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return int(sock.getsockname()[1])
+
+
+def peak_rss_kb() -> int:
+    '''Return the peak resident set size of this process in KB.
+    VmHWM is read on Linux because ru_maxrss keeps the parent's peak across exec.'''
+    try:
+        with open('/proc/self/status', encoding='utf-8') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def serve_gateway(port: int, buffered: bool) -> None:
+    '''Run main_app in this process with an extra route reporting peak RSS.'''
+    sys.path.insert(0, MAIN_APP_DIR)
+    from werkzeug.serving import make_server  # pylint: disable=import-outside-toplevel
+    import main  # pylint: disable=import-outside-toplevel
+
+    if buffered:
+        def buffered_upload():  # type: ignore[no-untyped-def]
+            image = main.request.files['image']
+            files = {'image': (image.filename, image.read(), 'image/jpeg')}
+            response = main.webcamera_client.post('/upload', files=files)
+            return main.jsonify(response.json()), response.status_code
+        main.app.view_functions['upload_photo'] = buffered_upload
+
+    @main.app.route('/__peak-rss')
+    def peak_rss():  # type: ignore[no-untyped-def]
+        return main.jsonify({'peak_rss_kb': peak_rss_kb()})
+
+    make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+
+
+def run_case(size_mb: int, concurrency: int, sink_url: str, buffered: bool) -> int:
+    '''Upload concurrency images of size_mb through a fresh gateway and return its peak RSS in KB.'''
+    port = free_port()
+    env = dict(os.environ, WEBCAMERA_APP_URL=sink_url, PYTHONPATH=MAIN_APP_DIR)
+    args = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+    if buffered:
+        args.append('--buffered')
+    gateway = subprocess.Popen(args, env=env, cwd=MAIN_APP_DIR)  # pylint: disable=consider-using-with
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f'{base_url}/__peak-rss', timeout=1)
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+
+        with tempfile.NamedTemporaryFile() as image:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                image.write(chunk)
+            image.flush()
+
+            def upload(_: int) -> int:
+                with open(image.name, 'rb') as image_file:
+                    files = {'image': ('image.jpg', image_file, 'image/jpeg')}
+                    response = requests.post(f'{base_url}/upload', files=files, timeout=300)
+                    return response.status_code
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                statuses = list(executor.map(upload, range(concurrency)))
+        assert all(status == 200 for status in statuses), statuses
+        peak: int = requests.get(f'{base_url}/__peak-rss', timeout=5).json()['peak_rss_kb']
+        return peak
+    finally:
+        gateway.terminate()
+        gateway.wait()
+
+
+def main_cli() -> None:
+    '''Parse arguments and print a table of peak RSS per image size and concurrency.'''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 64], help='image sizes in MB')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='concurrent uploads')
+    parser.add_argument('--buffered', action='store_true', help='benchmark the old read-everything upload')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_gateway(args.serve, args.buffered)
+        return
+
+    sink = ThreadingHTTPServer(('127.0.0.1', 0), SinkHandler)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    sink_url = f'http://127.0.0.1:{sink.server_address[1]}'
+
+    mode = 'buffered' if args.buffered else 'streaming'
+    print(f'{"mode":<10} {"size_mb":>8} {"concurrency":>12} {"peak_rss_mb":>12}')
+    for size_mb in args.sizes:
+        for concurrency in args.concurrency:
+            peak_kb = run_case(size_mb, concurrency, sink_url, args.buffered)
+            print(f'{mode:<10} {size_mb:>8} {concurrency:>12} {peak_kb / 1024:>12.1f}')
+    sink.shutdown()
+
+
+if __name__ == '__main__':
+    main_cli()
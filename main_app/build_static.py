@@ -0,0 +1,275 @@
+'''This module builds the production static assets of main_app.
+Every file under static/ is copied to the build directory under a content-hashed
+name (css/main.css -> css/main.<hash>.css), url() references inside CSS files are
+rewritten to the hashed names, the icon fonts are subset to the glyphs used by the
+templates and stylesheets, and text assets get precompressed .gz and .br variants.
+A manifest.json maps every logical name to its hashed name; static_assets.py uses
+it to build URLs and to serve the files.
+To build the assets, use:
+python build_static.py
+fontTools (font subsetting) and brotli (.br variants) are optional; the build
+skips that step when the package is not installed.'''
+import os
+import io
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import posixpath
+from typing import Any
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the build environment
+    brotli = None
+
+try:
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # pragma: no cover - depends on the build environment
+    font_subset = None
+
+LOGGER = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE_DIR = os.path.join(BASE_DIR, 'static')
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, 'static_build')
+DEFAULT_TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+MANIFEST_NAME = 'manifest.json'
+
+HASH_LENGTH = 12
+FONT_DIR = 'webfonts/'
+EXCLUDED_DIRS = ('sass',)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.eot', '.json', '.txt', '.html', '.map', '.ico')
+SUBSET_FONT_FLAVORS = {'.ttf': None, '.woff': 'woff', '.woff2': 'woff2'}
+
+HTML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+ICON_CLASS_RE = re.compile(r'\bfa-([a-z0-9-]+)')
+ICON_RULE_RE = re.compile(r'\.fa-([a-z0-9-]+):before\{content:"\\([0-9a-f]+)"\}')
+CSS_CONTENT_RE = re.compile(r'content:\s*[\'"]\\(f[0-9a-f]{3})[\'"]')
+SVG_GLYPH_RE = re.compile(rb'\s*<glyph\b[^>]*/>')
+SVG_UNICODE_RE = re.compile(rb'unicode="&#x([0-9a-f]+);"')
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def content_hash(data: bytes) -> str:
+    '''Return the short content hash used in file names'''
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(relative_path: str, data: bytes) -> str:
+    '''Insert the content hash before the extension: js/main.js -> js/main.<hash>.js'''
+    root, extension = posixpath.splitext(relative_path)
+    return f'{root}.{content_hash(data)}{extension}'
+
+
+def collect_files(source_dir: str) -> list[str]:
+    '''Return the static files to build as sorted POSIX paths relative to source_dir'''
+    files = []
+    for directory, subdirectories, names in os.walk(source_dir):
+        relative_dir = os.path.relpath(directory, source_dir)
+        if relative_dir == '.':
+            subdirectories[:] = [name for name in subdirectories if name not in EXCLUDED_DIRS]
+        for name in names:
+            files.append(posixpath.normpath(posixpath.join(relative_dir.replace(os.sep, '/'), name)))
+    return sorted(files)
+
+
+def used_codepoints(source_dir: str, template_dir: str) -> set[int]:
+    '''Return the icon font codepoints referenced by the templates (fa-* classes)
+    and by the stylesheets (content: '\\fxxx' rules)'''
+    icon_rules: dict[str, int] = {}
+    codepoints: set[int] = set()
+    for relative_path in collect_files(source_dir):
+        if not relative_path.endswith('.css'):
+            continue
+        with open(os.path.join(source_dir, relative_path), encoding='utf-8') as css_file:
+            css = css_file.read()
+        rules = ICON_RULE_RE.findall(css)
+        if rules:
+            icon_rules.update((icon, int(codepoint, 16)) for icon, codepoint in rules)
+        else:
+            codepoints.update(int(codepoint, 16) for codepoint in CSS_CONTENT_RE.findall(css))
+
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), encoding='utf-8') as template_file:
+            markup = HTML_COMMENT_RE.sub('', template_file.read())
+            for icon in ICON_CLASS_RE.findall(markup):
+                if icon in icon_rules:
+                    codepoints.add(icon_rules[icon])
+                elif icon not in ('brands', 'solid', 'regular'):
+                    LOGGER.warning("Icon fa-%s used in %s has no glyph in the stylesheets", icon, name)
+    return codepoints
+
+
+def subset_font(data: bytes, extension: str, codepoints: set[int]) -> bytes:
+    '''Return the font reduced to the given codepoints in the same format'''
+    font = TTFont(io.BytesIO(data))
+    options = font_subset.Options()
+    options.flavor = SUBSET_FONT_FLAVORS[extension]
+    subsetter = font_subset.Subsetter(options=options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    output = io.BytesIO()
+    font.flavor = options.flavor
+    font.save(output)
+    return output.getvalue()
+
+
+def subset_svg_font(data: bytes, codepoints: set[int]) -> bytes:
+    '''Return an SVG font without the glyphs outside the given codepoints.
+    SVG fonts are only loaded by legacy browsers, but they are the largest files.'''
+    def keep(match: re.Match[bytes]) -> bytes:
+        unicode = SVG_UNICODE_RE.search(match.group(0))
+        if unicode is None or int(unicode.group(1), 16) in codepoints:
+            return match.group(0)
+        return b''
+
+    return SVG_GLYPH_RE.sub(keep, data)
+
+
+def rewrite_css_urls(css: str, relative_path: str, manifest: dict[str, str]) -> str:
+    '''Point relative url() references of a stylesheet at the hashed file names'''
+    css_dir = posixpath.dirname(relative_path)
+
+    def replace(match: re.Match[str]) -> str:
+        quote, target = match.group(1), match.group(2).strip()
+        if target.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', target).groups()  # type: ignore[union-attr]
+        resolved = posixpath.normpath(posixpath.join(css_dir, path))
+        if resolved not in manifest:
+            return match.group(0)
+        hashed_path = posixpath.join(posixpath.dirname(path), posixpath.basename(manifest[resolved]))
+        return f'url({quote}{hashed_path}{suffix}{quote})'
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def css_dependencies(css: str, relative_path: str) -> list[str]:
+    '''Return the stylesheets a stylesheet references with url()'''
+    css_dir = posixpath.dirname(relative_path)
+    dependencies = []
+    for _, target in CSS_URL_RE.findall(css):
+        path = re.split(r'[?#]', target.strip(), maxsplit=1)[0]
+        if path.endswith('.css') and not path.startswith(('http:', 'https:', '//', '/')):
+            dependencies.append(posixpath.normpath(posixpath.join(css_dir, path)))
+    return dependencies
+
+
+def write_variants(output_dir: str, relative_path: str, data: bytes) -> list[str]:
+    '''Write a built file and, for text assets, its .gz and .br variants.
+    A variant is only kept when it is smaller than the file itself.
+    Returns the encodings that were written.'''
+    path = os.path.join(output_dir, *relative_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as output_file:
+        output_file.write(data)
+    if not relative_path.endswith(COMPRESSIBLE_EXTENSIONS):
+        return []
+
+    encodings = []
+    variants = [('gzip', '.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', '.br', brotli.compress(data, quality=11)))
+    for encoding, suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as output_file:
+                output_file.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build(
+    source_dir: str = DEFAULT_SOURCE_DIR,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    template_dir: str = DEFAULT_TEMPLATE_DIR,
+    subset_fonts: bool = True
+) -> dict[str, str]:
+    '''Build the static assets into output_dir and return the manifest'''
+    if os.path.abspath(source_dir) == os.path.abspath(output_dir):
+        raise ValueError("The output directory must differ from the source directory")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    codepoints: set[int] = set()
+    if subset_fonts:
+        codepoints = used_codepoints(source_dir, template_dir)
+        LOGGER.info("Subsetting icon fonts to %d glyphs", len(codepoints))
+        if font_subset is None:
+            LOGGER.warning("fontTools is not installed, only SVG fonts are subset")
+    if brotli is None:
+        LOGGER.warning("brotli is not installed, only .gz variants are written")
+
+    manifest: dict[str, str] = {}
+    stats: dict[str, Any] = {'files': 0, 'source_bytes': 0, 'built_bytes': 0}
+    files = collect_files(source_dir)
+
+    def emit(relative_path: str, data: bytes) -> None:
+        '''Store one built file under its hashed name'''
+        manifest[relative_path] = hashed_name(relative_path, data)
+        write_variants(output_dir, manifest[relative_path], data)
+        stats['files'] += 1
+        stats['built_bytes'] += len(data)
+
+    def read(relative_path: str) -> bytes:
+        '''Read a source file and count its size'''
+        with open(os.path.join(source_dir, *relative_path.split('/')), 'rb') as source_file:
+            data = source_file.read()
+        stats['source_bytes'] += len(data)
+        return data
+
+    for relative_path in files:
+        if relative_path.endswith('.css'):
+            continue
+        data = read(relative_path)
+        extension = posixpath.splitext(relative_path)[1]
+        if codepoints and extension == '.svg' and relative_path.startswith(FONT_DIR):
+            data = subset_svg_font(data, codepoints)
+        elif codepoints and font_subset is not None and extension in SUBSET_FONT_FLAVORS:
+            data = subset_font(data, extension, codepoints)
+        emit(relative_path, data)
+
+    def emit_css(relative_path: str, seen: tuple[str, ...] = ()) -> None:
+        '''Build a stylesheet after the stylesheets it imports'''
+        if relative_path in manifest or relative_path in seen:
+            return
+        css = read(relative_path).decode('utf-8')
+        for dependency in css_dependencies(css, relative_path):
+            if dependency in files:
+                emit_css(dependency, seen + (relative_path,))
+        emit(relative_path, rewrite_css_urls(css, relative_path, manifest).encode('utf-8'))
+
+    for relative_path in files:
+        if relative_path.endswith('.css'):
+            emit_css(relative_path)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    LOGGER.info("Built %d static files: %d bytes -> %d bytes",
+                stats['files'], stats['source_bytes'], stats['built_bytes'])
+    return manifest
+
+
+def main(argv: list[str] | None = None) -> int:
+    '''Command line entry point'''
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets")
+    parser.add_argument('--source', default=DEFAULT_SOURCE_DIR, help="static source directory")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="build output directory")
+    parser.add_argument('--templates', default=DEFAULT_TEMPLATE_DIR, help="templates scanned for icons")
+    parser.add_argument('--no-subset', action='store_true', help="copy fonts without subsetting")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    logging.getLogger('fontTools').setLevel(logging.ERROR)
+    build(args.source, args.output, args.templates, subset_fonts=not args.no_subset)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+'''This module provides a circuit breaker for the backend clients of main_app.
+The breaker keeps a rolling window of call outcomes and latencies. When too many
+calls fail or are slow it opens and rejects calls immediately, so a struggling
+backend does not hold every gateway worker in a long timeout. After a cool-down
+it lets a limited number of probe calls through (half-open) and closes again
+if they succeed.'''
+import time
+import threading
+from collections import deque
+from typing import Any
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    '''Raised instead of calling a backend whose circuit is open.'''
+
+
+class DeadlineExceededError(requests.exceptions.Timeout):
+    '''Raised when the request budget is spent before or during a backend call.
+    It is the caller's failure, not the backend's, so the breaker does not count it.'''
+
+
+class CircuitBreaker:
+    '''A rolling-window circuit breaker for one backend.'''
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        reset_timeout: float = 15.0,
+        half_open_calls: int = 1
+    ) -> None:
+        '''Create a closed breaker. The breaker opens when at least min_calls
+        were made within window_seconds and the share of failed calls reaches
+        failure_rate or the share of calls slower than slow_call_seconds
+        reaches slow_call_rate.'''
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._rejected = 0
+        self._times_opened = 0
+
+    def before_call(self) -> None:
+        '''Reserve a call or raise CircuitOpenError when calls are not allowed.'''
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} is open")
+                self._state = HALF_OPEN
+                self._probes_in_flight = 0
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open and probing")
+                self._probes_in_flight += 1
+
+    def record(self, success: bool, seconds: float) -> None:
+        '''Record the outcome and latency of a call reserved with before_call.'''
+        slow = seconds >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight -= 1
+                if success and not slow:
+                    if self._probes_in_flight <= 0:
+                        self._state = CLOSED
+                        self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if self._state == OPEN:
+                return
+            self._calls.append((now, success, slow))
+            self._trim(now)
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+                self._open(now)
+
+    def release(self) -> None:
+        '''Give back a call reserved with before_call without recording an outcome,
+        for calls that ended for a reason that says nothing about the backend.'''
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight -= 1
+
+    def state(self) -> str:
+        '''Return the current state, moving from open to half-open once the cool-down is over.'''
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def reset(self) -> None:
+        '''Close the circuit and forget the rolling window and counters.'''
+        with self._lock:
+            self._state = CLOSED
+            self._probes_in_flight = 0
+            self._calls.clear()
+            self._rejected = 0
+            self._times_opened = 0
+
+    def _open(self, now: float) -> None:
+        '''Open the circuit. The caller must hold the lock.'''
+        self._state = OPEN
+        self._opened_at = now
+        self._times_opened += 1
+        self._calls.clear()
+
+    def _trim(self, now: float) -> None:
+        '''Drop calls that fell out of the rolling window. The caller must hold the lock.'''
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def stats(self) -> dict[str, Any]:
+        '''Return the breaker state and the contents of its rolling window.'''
+        state = self.state()
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            return {
+                'name': self.name,
+                'state': state,
+                'window_calls': calls,
+                'window_failures': failures,
+                'window_slow_calls': slow_calls,
+                'rejected': self._rejected,
+                'times_opened': self._times_opened,
+                'window_seconds': self.window_seconds,
+                'failure_rate': self.failure_rate,
+                'slow_call_seconds': self.slow_call_seconds,
+                'reset_timeout': self.reset_timeout
+            }
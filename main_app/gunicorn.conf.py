@@ -0,0 +1,46 @@
+'''Gunicorn configuration of main_app, read from the environment.
+The gateway spends most of its time waiting on the backends, so the default
+worker class is gthread; GUNICORN_WORKER_CLASS=gevent runs green threads instead.
+To run the production server, use:
+gunicorn --config gunicorn.conf.py main:app
+To reload the code and settings gracefully, send SIGHUP to the master process.'''
+import os
+import shutil
+import multiprocessing
+from typing import Any
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Workers add up their metrics through snapshot files in this directory (see metrics.py)
+os.environ.setdefault('METRICS_DIR', '/tmp/main_app_metrics')
+
+
+def on_starting(_server: object) -> None:
+    '''Remove the metric snapshots of a previous run'''
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def child_exit(_server: object, worker: Any) -> None:
+    '''Fold the metric snapshot of a worker that exited into the retired one, so its
+    counts are kept and no file is left behind for a recycled process ID'''
+    from metrics import mark_process_dead  # pylint: disable=import-outside-toplevel
+    mark_process_dead(worker.pid)
+
+
+def post_worker_init(_worker: object) -> None:
+    '''Start the mail queue sender of a new worker, so messages spooled before a
+    restart or left by a recycled worker are sent without waiting for a new one'''
+    from main import mail_queue  # pylint: disable=import-outside-toplevel
+    mail_queue.start()
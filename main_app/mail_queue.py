@@ -0,0 +1,236 @@
+'''This module provides a durable outbound email queue for main_app.
+Messages are written as JSON files to a spool directory, so a submission is
+not lost if the process restarts before it is sent. A background thread drains
+the spool: it opens one SMTP connection, sends every pending message through
+it in batches, and backs off exponentially when the SMTP server fails.'''
+import os
+import json
+import time
+import uuid
+import logging
+import smtplib
+import threading
+from typing import Any
+from flask import Flask
+from flask_mail import Mail, Message
+
+LOGGER = logging.getLogger(__name__)
+
+PENDING_SUFFIX = '.json'
+CLAIMED_SUFFIX = '.sending'
+
+
+class MailQueue:
+    '''A spool-directory email queue with a background sender thread.'''
+    def __init__(
+        self,
+        app: Flask,
+        mail: Mail,
+        directory: str,
+        batch_size: int = 20,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+        max_backoff_seconds: float = 300.0,
+        poll_seconds: float = 5.0,
+        stale_seconds: float = 300.0
+    ) -> None:
+        '''Create the queue. The sender thread is started by start(), which every
+        worker process of a pre-fork server calls once it is ready (see gunicorn.conf.py),
+        or by the first enqueue().'''
+        self.app = app
+        self.mail = mail
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, 'failed')
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        os.makedirs(self.failed_directory, exist_ok=True)
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._thread_pid = 0
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._failed = 0
+        self._connections = 0
+        self._consecutive_failures = 0
+
+    def enqueue(self, subject: str, sender: str, recipients: list[str], body: str) -> str:
+        '''Write a message to the spool and wake the sender. Returns the message id.'''
+        message_id = f'{time.time_ns()}-{uuid.uuid4().hex}'
+        record = {
+            'id': message_id,
+            'subject': subject,
+            'sender': sender,
+            'recipients': recipients,
+            'body': body,
+            'attempts': 0
+        }
+        path = os.path.join(self.directory, message_id + PENDING_SUFFIX)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as spool_file:
+            json.dump(record, spool_file)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(tmp_path, path)
+        LOGGER.info("Queued email %s from %s", message_id, sender)
+        self.start()
+        self._wakeup.set()
+        return message_id
+
+    def start(self) -> None:
+        '''Start the sender thread in this process if it is not running.'''
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='mail-queue-sender', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        '''Ask the sender thread to finish its current batch and exit.'''
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def pending(self) -> list[str]:
+        '''Return the paths of queued messages, oldest first.'''
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(PENDING_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def drain(self) -> int:
+        '''Send every pending message over one SMTP connection and return how many were sent.
+        Raises the SMTP or socket error that stopped the drain.'''
+        self._requeue_stale_claims()
+        sent = 0
+        with self.app.app_context():
+            batch = self._claim_batch()
+            if not batch:
+                return 0
+            try:
+                with self.mail.connect() as connection:
+                    with self._lock:
+                        self._connections += 1
+                    while batch:
+                        while batch:
+                            sent += self._send_one(connection, batch.pop(0))
+                        batch = self._claim_batch()
+            except (smtplib.SMTPException, OSError):
+                for claimed_path in batch:
+                    self._unclaim(claimed_path)
+                raise
+        return sent
+
+    def _send_one(self, connection: Any, claimed_path: str) -> int:
+        '''Send one claimed message. Failures are recorded on the message and re-raised;
+        a spool file that cannot be read as a message is moved to failed/.'''
+        try:
+            with open(claimed_path, encoding='utf-8') as spool_file:
+                record = json.load(spool_file)
+            message = Message(
+                subject=record['subject'],
+                sender=record['sender'],
+                recipients=record['recipients'],
+                body=record['body']
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            message_id = os.path.basename(claimed_path)[:-len(CLAIMED_SUFFIX)]
+            LOGGER.error("Queued email %s is corrupt (%s)", message_id, e)
+            self._fail_permanently(claimed_path, {'id': message_id, 'attempts': 0})
+            return 0
+        try:
+            connection.send(message)
+        except smtplib.SMTPRecipientsRefused:
+            self._fail_permanently(claimed_path, record)
+            return 0
+        except (smtplib.SMTPException, OSError):
+            self._release(claimed_path, record)
+            raise
+        os.remove(claimed_path)
+        with self._lock:
+            self._sent += 1
+        LOGGER.info("Sent queued email %s", record['id'])
+        return 1
+
+    def _claim_batch(self) -> list[str]:
+        '''Claim up to batch_size pending messages by renaming them.
+        The rename is atomic, so two workers never send the same message.'''
+        claimed = []
+        for path in self.pending():
+            claimed_path = path[:-len(PENDING_SUFFIX)] + CLAIMED_SUFFIX
+            try:
+                os.rename(path, claimed_path)
+                os.utime(claimed_path)
+            except FileNotFoundError:
+                continue
+            claimed.append(claimed_path)
+            if len(claimed) >= self.batch_size:
+                break
+        return claimed
+
+    def _release(self, claimed_path: str, record: dict[str, Any]) -> None:
+        '''Count a failed attempt and return the message to the queue, or move it
+        to failed/ after max_attempts.'''
+        record['attempts'] += 1
+        if record['attempts'] >= self.max_attempts:
+            self._fail_permanently(claimed_path, record)
+            return
+        with open(claimed_path, 'w', encoding='utf-8') as spool_file:
+            json.dump(record, spool_file)
+        self._unclaim(claimed_path)
+
+    def _unclaim(self, claimed_path: str) -> None:
+        '''Return a claimed message to the queue without counting an attempt.'''
+        os.rename(claimed_path, claimed_path[:-len(CLAIMED_SUFFIX)] + PENDING_SUFFIX)
+
+    def _fail_permanently(self, claimed_path: str, record: dict[str, Any]) -> None:
+        '''Move a message that cannot be delivered to the failed/ directory.'''
+        os.replace(claimed_path, os.path.join(self.failed_directory, record['id'] + PENDING_SUFFIX))
+        with self._lock:
+            self._failed += 1
+        LOGGER.error("Giving up on queued email %s after %d attempts", record['id'], record['attempts'])
+
+    def _requeue_stale_claims(self) -> None:
+        '''Return messages claimed by a worker that died before sending them.'''
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(CLAIMED_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.stale_seconds:
+                    os.rename(path, path[:-len(CLAIMED_SUFFIX)] + PENDING_SUFFIX)
+            except FileNotFoundError:
+                continue
+
+    def _run(self) -> None:
+        '''Sender loop: drain the spool, then wait for new messages or the next retry.'''
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                self.drain()
+                self._consecutive_failures = 0
+            except (smtplib.SMTPException, OSError, ValueError) as e:
+                self._consecutive_failures += 1
+                backoff = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (self._consecutive_failures - 1))
+                LOGGER.warning("Email sending failed (%s), retrying in %.1f s", e, backoff)
+                self._stopping.wait(backoff)
+                continue
+            self._wakeup.wait(self.poll_seconds)
+
+    def stats(self) -> dict[str, Any]:
+        '''Return queue length and sender counters.'''
+        with self._lock:
+            return {
+                'pending': len(self.pending()),
+                'failed_permanently': self._failed,
+                'sent': self._sent,
+                'smtp_connections': self._connections,
+                'consecutive_failures': self._consecutive_failures
+            }
@@ -3,21 +3,104 @@ To build and run this in Docker container, use:
 docker compose up --build -d
 """
 import os
-import smtplib
-from flask import Flask, render_template, redirect, request, jsonify, Response
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any
+from flask import Flask, render_template, redirect, request, jsonify, Response, g, has_request_context
 from dotenv import load_dotenv
 import requests
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from flask_cors import CORS
+from werkzeug.wrappers import Response as WerkzeugResponse
+from backend_client import BackendClient, BufferedResponse, RELAYED_HEADERS
+from circuit_breaker import CircuitOpenError
+from streaming_multipart import MultipartFileStream
+from ttl_cache import TTLCache
+from mail_queue import MailQueue
+from static_assets import StaticAssets
+from metrics import instrument_app
+from tracing import BUDGET_HEADER, trace_app
+from response_compression import compress_app
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-
-DB_APP_URL = os.getenv('DB_APP_URL', 'http://db_app:5001')
-WEBCAMERA_APP_URL = os.getenv('WEBCAMERA_APP_URL', 'http://webcamera_app:5454')
-WIKI_APP_URL = os.getenv('WIKI_APP_URL', 'http://wiki_app:8000')
+instrument_app(app, 'main_app')
+trace_app(app, 'main_app')
+compress_app(app)
+
+static_assets = StaticAssets(os.getenv('STATIC_BUILD_DIR', os.path.join(app.root_path, 'static_build')))
+static_assets.init_app(app)
+
+REQUEST_BUDGET_SECONDS = float(os.getenv('GATEWAY_REQUEST_BUDGET', '10'))
+
+def request_deadline() -> float | None:
+    '''Return the monotonic deadline of the request being handled, if any'''
+    if not has_request_context():
+        return None
+    deadline: float | None = g.get('deadline')
+    return deadline
+
+db_client = BackendClient.from_env('db_app', 'http://db_app:5001', deadline=request_deadline)
+webcamera_client = BackendClient.from_env('webcamera_app', 'http://webcamera_app:5454', deadline=request_deadline)
+wiki_client = BackendClient.from_env('wiki_app', 'http://wiki_app:8000', deadline=request_deadline)
+
+DB_APP_URL = db_client.base_url
+WEBCAMERA_APP_URL = webcamera_client.base_url
+WIKI_APP_URL = wiki_client.base_url
+
+PASSTHROUGH_PROXY = os.getenv('PASSTHROUGH_PROXY', 'true').lower() == 'true'
+PASSTHROUGH_CHUNK_SIZE = int(os.getenv('PASSTHROUGH_CHUNK_SIZE', '65536'))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', '65536'))
+
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '10'))
+batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_WORKERS', '8')), thread_name_prefix='batch')
+# Gateway GET routes that may be used in a /batch request, and the backend path each one reads
+BATCH_ROUTES = {
+    '/all-customers': (db_client, '/all-customers'),
+    '/all-products': (db_client, '/all-products'),
+    '/all-purchases': (db_client, '/all-purchases'),
+    '/all-purchases-price': (db_client, '/purchases-total'),
+    '/add-product': (db_client, '/add-product'),
+    '/search-customers': (db_client, '/search-customers')
+}
+
+wiki_cache = TTLCache(
+    name='wiki',
+    ttl=float(os.getenv('WIKI_CACHE_TTL', '3600')),
+    negative_ttl=float(os.getenv('WIKI_CACHE_NEGATIVE_TTL', '300')),
+    max_entries=int(os.getenv('WIKI_CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.getenv('WIKI_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+)
+
+# Presigned download URLs are kept until DOWNLOAD_URL_MARGIN seconds before they expire
+DOWNLOAD_URL_MARGIN = float(os.getenv('DOWNLOAD_URL_MARGIN', '300'))
+download_cache = TTLCache(
+    name='download_urls',
+    ttl=float(os.getenv('DOWNLOAD_CACHE_TTL', '3300')),
+    max_entries=int(os.getenv('DOWNLOAD_CACHE_MAX_ENTRIES', '4096')),
+    max_bytes=int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+)
+
+def cache_download_url(filename: str, data: dict[str, Any]) -> None:
+    '''Keep a presigned URL answered by webcamera_app until shortly before it expires'''
+    url = data.get('url')
+    if not isinstance(url, str):
+        return
+    expires_in = data.get('expires_in')
+    ttl = float(expires_in) - DOWNLOAD_URL_MARGIN if isinstance(expires_in, (int, float)) else None
+    download_cache.set(filename, url, size=len(url), ttl=ttl)
+
+def unavailable_status(error: requests.exceptions.RequestException) -> int:
+    '''Return the status answering a failed backend call: 503 for an open circuit, 504 for a timeout'''
+    if isinstance(error, CircuitOpenError):
+        return 503
+    if isinstance(error, requests.exceptions.Timeout):
+        return 504
+    return 500
 
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
 app.config['MAIL_PORT'] = 587
@@ -27,6 +110,78 @@ app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 
 mail = Mail(app)
+mail_queue = MailQueue(
+    app,
+    mail,
+    directory=os.getenv('MAIL_QUEUE_DIR', os.path.join(app.instance_path, 'mail_queue')),
+    batch_size=int(os.getenv('MAIL_QUEUE_BATCH_SIZE', '20')),
+    max_attempts=int(os.getenv('MAIL_QUEUE_MAX_ATTEMPTS', '5')),
+    backoff_seconds=float(os.getenv('MAIL_QUEUE_BACKOFF', '2')),
+    max_backoff_seconds=float(os.getenv('MAIL_QUEUE_MAX_BACKOFF', '300'))
+)
+
+def relay_response(upstream: requests.Response, passthrough: bool = False) -> tuple[Response, int]:
+    '''Stream the backend body and status to the client without decoding it, with its ETag.
+    With PASSTHROUGH_PROXY disabled the body is parsed and serialized again,
+    unless passthrough is set (for bodies that are not one JSON document).'''
+    if upstream.status_code == 304:
+        upstream.close()
+        response = Response(status=304)
+    elif not PASSTHROUGH_PROXY and not passthrough:
+        response = jsonify(upstream.json())
+    else:
+        response = Response(
+            upstream.iter_content(chunk_size=PASSTHROUGH_CHUNK_SIZE),
+            status=upstream.status_code,
+            content_type=upstream.headers.get('Content-Type', 'application/json')
+        )
+        response.call_on_close(upstream.close)
+    response.headers.update({name: upstream.headers[name] for name in RELAYED_HEADERS if name in upstream.headers})
+    return response, upstream.status_code
+
+def conditional_headers() -> dict[str, str]:
+    '''Return the If-None-Match header of the request, to forward to db_app'''
+    return {key: request.headers[key] for key in ('If-None-Match',) if key in request.headers}
+
+def list_params() -> dict[str, str]:
+    '''Return the list parameters of the request (limit and next for cursor
+    pagination, format=ndjson for a streamed export), to forward to db_app'''
+    return {key: request.args[key] for key in ('limit', 'next', 'format') if key in request.args}
+
+def relay_list(path: str) -> tuple[Response, int]:
+    '''Relay a db_app list. NDJSON exports and whole-table lists are streamed through
+    as db_app sends them, so the gateway never holds a table; pages (limit or next)
+    are small, so they are buffered and shared by identical concurrent requests.'''
+    params = list_params()
+    if params.get('format') == 'ndjson':
+        upstream = db_client.get(path, params=params, headers=conditional_headers(), stream=True)
+        return relay_response(upstream, passthrough=True)
+    if 'limit' not in params and 'next' not in params:
+        upstream = db_client.get(path, params=params, headers=conditional_headers(), stream=PASSTHROUGH_PROXY)
+        return relay_response(upstream)
+    return relay_shared(db_client.get_shared(path, params=params, headers=conditional_headers(),
+                                             stream=PASSTHROUGH_PROXY))
+
+def relay_shared(upstream: BufferedResponse) -> tuple[Response, int]:
+    '''Send a buffered, possibly shared, backend response to the client, with its ETag.
+    With PASSTHROUGH_PROXY disabled the body is parsed and serialized again.'''
+    if upstream.status_code == 304:
+        response = Response(status=304)
+    elif not PASSTHROUGH_PROXY:
+        response = jsonify(upstream.json())
+    else:
+        response = Response(upstream.content, content_type=upstream.content_type)
+    response.headers.update(upstream.headers)
+    return response, upstream.status_code
+
+@app.before_request
+def start_request_budget() -> None:
+    '''Give every request a deadline; a smaller budget sent by the caller is honored'''
+    budget = REQUEST_BUDGET_SECONDS
+    caller_budget = request.headers.get(BUDGET_HEADER, '')
+    if caller_budget.isdigit():
+        budget = min(budget, int(caller_budget) / 1000)
+    g.deadline = time.monotonic() + budget
 
 @app.route('/')
 def home() -> str:
@@ -46,18 +201,16 @@ def send_email() -> tuple[Response, int]:
             app.logger.warning("Missing form fields in email request")
             return jsonify({'error': 'Missing form fields'}), 400
         recipient_email: str = os.getenv('MAIL_USERNAME') or ""
-        msg = Message(
+        mail_queue.enqueue(
             subject=f"New Contact Form Submission from {name}",
             sender=sender_email,
             recipients=[recipient_email] if recipient_email else [],
             body=f"Name: {name}\nEmail: {sender_email}\n\nMessage:\n{message_text}"
         )
-
-        mail.send(msg)
-        app.logger.info("Email sent successfully from %s", sender_email)
-        return jsonify({'success': 'Email sent successfully!'}), 200
-    except (ValueError, requests.exceptions.RequestException, smtplib.SMTPException) as e:
-        app.logger.error("Failed to send email: %s", str(e), exc_info=True)
+        app.logger.info("Email from %s queued for sending", sender_email)
+        return jsonify({'success': 'Email queued for sending!'}), 202
+    except (ValueError, OSError) as e:
+        app.logger.error("Failed to queue email: %s", str(e), exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/webcamera-app')
@@ -74,26 +227,43 @@ def upload_photo() -> tuple[Response, int]:
         if 'image' not in request.files:
             app.logger.warning("No image file provided in request")
             return jsonify({'error': 'No image file provided'}), 400
-        files = {'image': (request.files['image'].filename, request.files['image'].read(), 'image/jpeg')}
-        response = requests.post(f'{WEBCAMERA_APP_URL}/upload', files=files, timeout=30)
+        image = request.files['image']
+        body = MultipartFileStream('image', image.filename or 'image.jpg', image.stream, 'image/jpeg', UPLOAD_CHUNK_SIZE)
         app.logger.info("Forwarding image to WebCamera service at %s", WEBCAMERA_APP_URL)
-        return jsonify(response.json()), response.status_code
+        response = webcamera_client.post('/upload', data=body, headers={'Content-Type': body.content_type})
+        data = response.json()
+        if response.status_code == 200 and isinstance(data.get('object_name'), str):
+            cache_download_url(data['object_name'], data)
+        return jsonify(data), response.status_code
 
     except requests.exceptions.RequestException as e:
         app.logger.error("WebCamera service unavailable: %s", str(e), exc_info=True)
         return jsonify({'error': 'Webcamera service unavailable', 'details': str(e)}), 500
 
 @app.route('/download/<filename>', methods=['GET'])
-def download(filename: str) -> Response:
+def download(filename: str) -> WerkzeugResponse | tuple[Response, int]:
     '''Download image from server by URL'''
     app.logger.info("Attempting to download image: %s", filename)
-    response = requests.get(f'{WEBCAMERA_APP_URL}/download/{filename}', timeout=20)
+    cached = download_cache.get(filename)
+    if cached is not None:
+        return redirect(cached.value)
+    try:
+        response = webcamera_client.get(f'/download/{filename}')
+    except requests.exceptions.RequestException as e:
+        app.logger.error("WebCamera service unavailable: %s", str(e), exc_info=True)
+        return jsonify({'error': 'Webcamera service unavailable', 'details': str(e)}), unavailable_status(e)
     if response.status_code == 200:
-        url = response.json().get('url')
+        data = response.json()
+        url = data.get('url')
+        cache_download_url(filename, data)
         app.logger.info("Redirecting to image URL: %s", url)
         return redirect(url)
     app.logger.warning("File not found or already deleted: %s", filename)
-    return jsonify({'error': 'File not found or already deleted.'})
+    return jsonify({'error': 'File not found or already deleted.'}), response.status_code
+
+def normalize_wiki_query(query: str) -> str:
+    '''Return the cache key of a Wikipedia query: case-folded with collapsed whitespace'''
+    return ' '.join(query.split()).casefold()
 
 @app.route('/wiki-app', methods=['GET', 'POST'])
 def wiki_app() -> str:
@@ -101,16 +271,28 @@ def wiki_app() -> str:
     try:
         if request.method == 'POST':
             query = request.form['query']
+            cache_key = normalize_wiki_query(query)
+            cached = wiki_cache.get(cache_key)
+            if cached is not None:
+                app.logger.info("Wikipedia cache hit for query: %s", query)
+                if cached.negative:
+                    return render_template('wiki_app.html', error=cached.value)
+                return render_template('wiki_app.html', **cached.value)
+
             app.logger.info("Searching Wikipedia for query: %s", query)
-            response = requests.post(f"{WIKI_APP_URL}/query", json={'query': query}, timeout=30)
+            response = wiki_client.post('/query', json={'query': query})
 
-            if response.status_code == 200:
-                data = response.json()
+            data = response.json() if response.status_code in (200, 404) else {}
+            # an older wiki_app answers a missing article with 200 and an error
+            if response.status_code == 200 and 'title' in data:
                 app.logger.info("Wikipedia search successful for query: %s", query)
-                return render_template('wiki_app.html', title=data['title'], summary=data['summary'], url=data['url'], main_image=data['main_image'])
-            if response.status_code == 404:
-                error_message = response.json().get('error', 'Article nor found.')
+                article = {key: data[key] for key in ('title', 'summary', 'url', 'main_image')}
+                wiki_cache.set(cache_key, article, size=len(json.dumps(article)))
+                return render_template('wiki_app.html', **article)
+            if response.status_code == 404 or 'error' in data:
+                error_message = data.get('error', 'Article nor found.')
                 app.logger.warning("Wikipedia article not found: %s", query)
+                wiki_cache.set(cache_key, error_message, size=len(error_message), negative=True)
                 return render_template('wiki_app.html', error=error_message)
 
             app.logger.error("Wikipedia service error for query: %s", query)
@@ -130,8 +312,7 @@ def db_app() -> str:
 def list_all_customers() -> tuple[Response, int]:
     '''Route to connect frontend button with backend function'''
     try:
-        response = requests.get(f'{DB_APP_URL}/all-customers', timeout=30)
-        return jsonify(response.json()), response.status_code
+        return relay_list('/all-customers')
     except requests.exceptions.RequestException as e:
         app.logger.error("Database service unavailable: %s", str(e), exc_info=True)
         return jsonify({'error': 'Database service unavailable'}), 500
@@ -140,8 +321,7 @@ def list_all_customers() -> tuple[Response, int]:
 def list_all_products() -> tuple[Response, int]:
     '''Route to connect frontend button with backend function'''
     try:
-        response = requests.get(f'{DB_APP_URL}/all-products', timeout=30)
-        return jsonify(response.json()), response.status_code
+        return relay_list('/all-products')
     except requests.exceptions.RequestException as e:
         app.logger.error("Database service unavailable: %s", str(e), exc_info=True)
         return jsonify({'error': 'Database service unavailable'}), 500
@@ -150,8 +330,7 @@ def list_all_products() -> tuple[Response, int]:
 def list_all_purchases() -> tuple[Response, int]:
     '''Route to connect frontend button with backend function'''
     try:
-        response = requests.get(f'{DB_APP_URL}/all-purchases', timeout=30)
-        return jsonify(response.json()), response.status_code
+        return relay_list('/all-purchases')
     except requests.exceptions.RequestException as e:
         app.logger.error("Database service unavailable: %s", str(e), exc_info=True)
         return jsonify({'error': 'Database service unavailable'}), 500
@@ -160,12 +339,8 @@ def list_all_purchases() -> tuple[Response, int]:
 def total_price_all_purchases() -> tuple[Response, int]:
     '''Route to connect frontend button with backend function'''
     try:
-        response = requests.get(f'{DB_APP_URL}/all-purchases', timeout=30)
-        purchases = response.json()
-
-        total_price = round(sum(float(purchase["total_price"]) for purchase in purchases), 2)
-
-        return jsonify({"total_price": total_price}), 200
+        response = db_client.get_shared('/purchases-total', stream=PASSTHROUGH_PROXY)
+        return relay_shared(response)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': str(e)}), 500
 
@@ -178,12 +353,13 @@ def add_product() -> tuple[Response, int]:
             if not product_name:
                 return jsonify({"error": "Product name is required"}), 400
 
-            response = requests.get(f"{DB_APP_URL}/add-product", params={"product_name": product_name}, timeout=30)
-            return jsonify(response.json()), response.status_code
+            shared_response = db_client.get_shared('/add-product', params={"product_name": product_name},
+                                                   headers=conditional_headers(), stream=PASSTHROUGH_PROXY)
+            return relay_shared(shared_response)
 
         if request.method == "POST":
-            response = requests.post(f"{DB_APP_URL}/add-product", json=request.json, timeout=30)
-            return jsonify(response.json()), response.status_code
+            response = db_client.post('/add-product', json=request.json, stream=PASSTHROUGH_PROXY)
+            return relay_response(response)
 
         return jsonify({'error': "Unsupported method"}), 405
 
@@ -194,7 +370,7 @@ def add_product() -> tuple[Response, int]:
 def search_customers() -> tuple[Response, int]:
     '''Route to forward customer search request to the backend'''
     try:
-        response = requests.get(f"{DB_APP_URL}/search-customers", params=request.args, timeout=30)
+        response = db_client.get_shared('/search-customers', params=request.args.to_dict())
         data = response.json()
 
         if not isinstance(data, list):
@@ -207,8 +383,8 @@ def search_customers() -> tuple[Response, int]:
 def add_customer() -> tuple[Response, int]:
     '''Handling add customer function'''
     try:
-        response = requests.post(f"{DB_APP_URL}/add-customer", json=request.json, timeout=30)
-        return jsonify(response.json()), response.status_code
+        response = db_client.post('/add-customer', json=request.json, stream=PASSTHROUGH_PROXY)
+        return relay_response(response)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': str(e)}), 500
 
@@ -216,12 +392,110 @@ def add_customer() -> tuple[Response, int]:
 def make_purchase() -> tuple[Response, int]:
     '''Route to connect make purchase function'''
     try:
-        response = requests.post(f"{DB_APP_URL}/make-purchase", json=request.json, timeout=30)
-        return jsonify(response.json()), response.status_code
+        response = db_client.post('/make-purchase', json=request.json, stream=PASSTHROUGH_PROXY)
+        return relay_response(response)
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/checkout', methods=['POST'])
+def checkout() -> tuple[Response, int]:
+    '''Route to connect cart checkout function'''
+    try:
+        response = db_client.post('/checkout', json=request.json, stream=PASSTHROUGH_PROXY)
+        return relay_response(response)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': str(e)}), 500
 
+def run_batch_item(client: BackendClient, path: str, params: dict[str, str]) -> dict[str, Any]:
+    '''Call one backend route of a batch and return its status, timing and body'''
+    start = time.perf_counter()
+    try:
+        upstream = client.get_shared(path, params=params)
+        try:
+            body = upstream.json()
+        except ValueError:
+            body = upstream.content.decode('utf-8', errors='replace')
+        result = {'status': upstream.status_code, 'body': body}
+    except requests.exceptions.RequestException as e:
+        result = {'status': 502, 'error': f"{client.name} unavailable: {e}"}
+    result['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+@app.route('/batch', methods=['POST'])
+def batch() -> tuple[Response, int]:
+    '''Run several GET sub-requests to the backend routes concurrently and return all results.
+    The body is {"requests": [{"id": ..., "path": "/all-customers", "params": {...}}, ...]};
+    the answer has one entry with id, path, status, duration_ms and body (or error) per sub-request.'''
+    data = request.get_json(silent=True)
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'A non-empty "requests" list is required'}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests can be batched'}), 400
+
+    results: list[dict[str, Any]] = []
+    futures = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({'error': f'Request {index} must be an object'}), 400
+        path = item.get('path')
+        params = item.get('params') or {}
+        result: dict[str, Any] = {'id': item.get('id', str(index)), 'path': path}
+        results.append(result)
+        if path not in BATCH_ROUTES:
+            result.update(status=404, error='Unknown batch path', duration_ms=0.0)
+            continue
+        if not isinstance(params, dict):
+            result.update(status=400, error='params must be an object', duration_ms=0.0)
+            continue
+        client, backend_path = BATCH_ROUTES[path]
+        params = {str(key): str(value) for key, value in params.items()}
+        # each sub-request runs in a copy of this request's context, so it keeps its deadline and trace
+        future = batch_executor.submit(contextvars.copy_context().run, run_batch_item, client, backend_path, params)
+        futures[future] = result
+
+    timeout = max(0.0, g.deadline - time.monotonic())
+    done, _ = wait(futures, timeout=timeout)
+    for future, result in futures.items():
+        if future in done:
+            result.update(future.result())
+        else:
+            future.cancel()
+            result.update(status=504, error='Request budget exceeded', duration_ms=round(timeout * 1000, 3))
+    return jsonify({'responses': results}), 200
+
+@app.route('/pool-stats')
+def pool_stats() -> tuple[Response, int]:
+    '''Return connection pool statistics of every backend client'''
+    clients = (db_client, webcamera_client, wiki_client)
+    return jsonify({client.name: client.stats() for client in clients}), 200
+
+@app.route('/cache-stats')
+def cache_stats() -> tuple[Response, int]:
+    '''Return hit/miss counters and sizes of the gateway caches'''
+    caches = (wiki_cache, download_cache)
+    return jsonify({cache.name: cache.stats() for cache in caches}), 200
+
+@app.route('/mail-queue-stats')
+def mail_queue_stats() -> tuple[Response, int]:
+    '''Return the length of the outbound email queue and sender counters'''
+    return jsonify(mail_queue.stats()), 200
+
+@app.route('/coalescing-stats')
+def coalescing_stats() -> tuple[Response, int]:
+    '''Return how many identical backend GETs were collapsed into one call'''
+    clients = (db_client, webcamera_client, wiki_client)
+    return jsonify({client.name: client.flight.stats() for client in clients}), 200
+
+@app.route('/breakers')
+def breakers() -> tuple[Response, int]:
+    '''Return the circuit breaker state of every backend client'''
+    clients = (db_client, webcamera_client, wiki_client)
+    return jsonify({client.name: client.breaker.stats() for client in clients}), 200
+
 
 if __name__ == "__main__":
-    app.logger.info("Starting Flask server on port 5000")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    port = int(os.getenv('PORT', '5000'))
+    app.logger.info("Starting Flask development server on port %d", port)
+    mail_queue.start()
+    app.run(host="0.0.0.0", port=port, debug=os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true'))
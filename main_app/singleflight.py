@@ -0,0 +1,103 @@
+'''This module provides single-flight request coalescing for main_app.
+Concurrent calls with the same key share one execution: the first caller runs
+the function, and every caller arriving while that call is in flight waits for
+it and receives the same result or exception. Once the call finishes the key
+is released, so later callers start a fresh call and never see stale data.
+
+A waiter can bound its wait with its own timeout, and can name the errors that
+only concern the caller that got them (such as running out of its own time):
+when the wait times out or the shared call fails with such an error, the
+waiter makes its own call instead.'''
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    '''One in-flight execution and the callers waiting for it.'''
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    '''Collapses identical concurrent calls into one.'''
+    def __init__(self, name: str) -> None:
+        '''Create an empty group of in-flight calls.'''
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._requests = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._errors = 0
+        self._detached = 0
+        self._max_waiters = 0
+
+    def do(
+        self,
+        key: Hashable,
+        function: Callable[[], T],
+        timeout: float | None = None,
+        private_errors: tuple[type[BaseException], ...] = ()
+    ) -> T:
+        '''Return function(), sharing the call with concurrent callers of the same key.
+        An exception raised by the shared call is raised in every caller, except the
+        private_errors: a waiter calls function() itself after one of those, or when
+        the shared call is not done within its timeout.'''
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._executions += 1
+            else:
+                call.waiters += 1
+                self._coalesced += 1
+                self._max_waiters = max(self._max_waiters, call.waiters)
+
+        if not leader:
+            finished = call.done.wait(timeout)
+            if finished and not isinstance(call.error, private_errors):
+                if call.error is not None:
+                    raise call.error
+                result: T = call.result
+                return result
+            with self._lock:
+                self._detached += 1
+            return function()
+
+        try:
+            call.result = function()
+            return call.result  # type: ignore[no-any-return]
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict[str, Any]:
+        '''Return how many calls were made, executed and collapsed.'''
+        with self._lock:
+            return {
+                'name': self.name,
+                'requests': self._requests,
+                'executions': self._executions,
+                'coalesced': self._coalesced,
+                'errors': self._errors,
+                'detached': self._detached,
+                'in_flight': len(self._calls),
+                'max_waiters': self._max_waiters,
+                'coalesced_ratio': round(self._coalesced / self._requests, 4) if self._requests else 0.0
+            }
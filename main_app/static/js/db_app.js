@@ -1,7 +1,73 @@
 document.addEventListener("DOMContentLoaded", function() {
 
+    // Number of items requested per page by the list buttons
+    const PAGE_SIZE = 25;
+    // How long a first page prefetched from its button may be shown instead of fresh data
+    const PREFETCH_TTL_MS = 30000;
+    let activeList = null;
+    let prefetched = {};
+    // Answers with an ETag by URL, reused when the server answers 304 Not Modified
+    let validated = {};
+
+    // GET a URL with the ETag of the answer seen before, and reuse that answer on a 304
+    function fetchJson(url) {
+        let known = validated[url];
+        let headers = known ? { "If-None-Match": known.etag } : {};
+        return fetch(url, { headers: headers, cache: "no-store" }).then(response => {
+            if (response.status === 304 && known) return known.data;
+            return response.json().then(data => {
+                let etag = response.headers.get("ETag");
+                if (response.ok && etag) validated[url] = { etag: etag, data: data };
+                return data;
+            });
+        });
+    }
+
+    // Return the JSON of a GET request, using the prefetched answer once if it is fresh
+    function getJson(url, query) {
+        let entry = prefetched[url];
+        delete prefetched[url];
+        let direct = () => fetchJson(query ? `${url}?${query}` : url);
+        if (entry && Date.now() - entry.time < PREFETCH_TTL_MS) {
+            return entry.body.catch(direct);
+        }
+        return direct();
+    }
+
+    // Fetch the first page of a list, or the total, once the pointer or the focus reaches its
+    // button, so the click can show it without waiting; nothing is fetched on page load
+    function prefetch(path) {
+        let entry = prefetched[path];
+        if (entry && Date.now() - entry.time < PREFETCH_TTL_MS) return;
+        let url = path === "/all-purchases-price" ? path : `${path}?${new URLSearchParams({ limit: PAGE_SIZE })}`;
+        let body = fetchJson(url).then(data => {
+            if (data.error) throw new Error(`Prefetch of ${path} failed`);
+            return data;
+        });
+        // Avoid an unhandled rejection for entries that are never used
+        body.catch(() => {});
+        prefetched[path] = { body: body, time: Date.now() };
+    }
+
+    Object.entries({
+        fetchCustomers: "/all-customers",
+        fetchProducts: "/all-products",
+        fetchPurchases: "/all-purchases",
+        fetchTotal: "/all-purchases-price"
+    }).forEach(([id, path]) => {
+        let button = document.getElementById(id);
+        button.addEventListener("pointerenter", () => prefetch(path));
+        button.addEventListener("focus", () => prefetch(path));
+    });
+
+    // Anything submitted on the page may change the lists, so drop the prefetched answers
+    document.addEventListener("click", function(event) {
+        if (event.target.type === "submit") prefetched = {};
+    }, true);
+
     // Function to clear all result sections
     function clearAllResults() {
+        stopPagedList();
         document.getElementById("customerList").innerHTML = "";
         document.getElementById("listProducts").innerHTML = "";
         document.getElementById("listPurchases").innerHTML = "";
@@ -32,81 +98,101 @@ document.addEventListener("DOMContentLoaded", function() {
         });
     });
 
+    // Load a list page by page: the next page is requested from the server
+    // when the end of the list scrolls into view
+    function loadPagedList(url, container, renderItem, emptyMessage, errorMessage) {
+        stopPagedList();
+        let nextToken = null;
+        let loading = false;
+        let sentinel = document.createElement("div");
+        let observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadPage();
+            }
+        }, { rootMargin: "200px" });
+        let list = { stop: () => observer.disconnect() };
+        activeList = list;
+
+        function loadPage() {
+            if (loading || activeList !== list) return;
+            loading = true;
+            let params = new URLSearchParams({ limit: PAGE_SIZE });
+            if (nextToken) params.append("next", nextToken);
+            getJson(url, params.toString())
+                .then(data => {
+                    if (activeList !== list) return;
+                    if (data.error) throw new Error(data.error);
+                    data.items.forEach(item => container.insertBefore(renderItem(item), sentinel));
+                    nextToken = data.next;
+                    loading = false;
+                    if (!nextToken) {
+                        observer.disconnect();
+                        sentinel.remove();
+                        if (container.children.length === 0) {
+                            container.innerHTML = `<p>${emptyMessage}</p>`;
+                        }
+                        return;
+                    }
+                    // Observe again, so a sentinel that is still visible loads the next page
+                    observer.unobserve(sentinel);
+                    observer.observe(sentinel);
+                })
+                .catch(error => {
+                    console.error(`Error fetching ${url}:`, error);
+                    observer.disconnect();
+                    sentinel.remove();
+                    container.insertAdjacentHTML("beforeend", `<p>${errorMessage}</p>`);
+                });
+        }
+
+        container.appendChild(sentinel);
+        observer.observe(sentinel);
+    }
+
+    function stopPagedList() {
+        if (activeList) {
+            activeList.stop();
+            activeList = null;
+        }
+    }
+
+    function textItem(text) {
+        let item = document.createElement("p");
+        item.textContent = text;
+        return item;
+    }
+
     // Fetch customers functionality
     document.getElementById("fetchCustomers").addEventListener("click", function() {
         clearAllResults();
-        fetch("/all-customers")
-            .then(response => response.json())
-            .then(data => {
-                let customerList = document.getElementById("customerList");
-                if (data.length > 0) {
-                    data.forEach(customer => {
-                        let customerItem = document.createElement("p");
-                        customerItem.textContent = `Name: ${customer.name} ${customer.surname}, Email: ${customer.email}`;
-                        customerList.appendChild(customerItem);
-                    });
-                } else {
-                    customerList.innerHTML = "<p>No customers found.</p>";
-                }
-            })
-            .catch(error => {
-                console.error("Error fetching customers:", error);
-                document.getElementById("customerList").innerHTML = "<p>Error retrieving data.</p>";
-            });
+        loadPagedList("/all-customers", document.getElementById("customerList"),
+            customer => textItem(`Name: ${customer.name} ${customer.surname}, Email: ${customer.email}`),
+            "No customers found.", "Error retrieving data.");
     });
 
     // Fetch products functionality
     document.getElementById("fetchProducts").addEventListener("click", function() {
         clearAllResults();
-        fetch("/all-products")
-            .then(response => response.json())
-            .then(data => {
-                let productList = document.getElementById("listProducts");
-                if (data.length > 0) {
-                    data.forEach(product => {
-                        let productItem = document.createElement("p");
-                        productItem.textContent = `Product: ${product.product_name}, Price: ${product.price}, Amount: ${product.available_amount}`;
-                        productList.appendChild(productItem);
-                    });
-                } else {
-                    productList.innerHTML = "<p>No products found.</p>";
-                }
-            })
-            .catch(error => {
-                console.error("Error fetching products:", error);
-                document.getElementById("listProducts").innerHTML = "<p>Error retrieving products.</p>";
-            });
+        loadPagedList("/all-products", document.getElementById("listProducts"),
+            product => textItem(`Product: ${product.product_name}, Price: ${product.price}, Amount: ${product.available_amount}`),
+            "No products found.", "Error retrieving products.");
     });
 
     // Fetch purchases functionality
     document.getElementById("fetchPurchases").addEventListener("click", function() {
         clearAllResults();
-        fetch("/all-purchases")
-            .then(response => response.json())
-            .then(data => {
-                let purchaseList = document.getElementById("listPurchases");
-                if (data.length > 0) {
-                    data.forEach(purchase => {
-                        let productDetails = purchase.products.map(p => `${p.product_name} (x${p.amount})`).join(", ");
-                        let purchaseItem = document.createElement("p");
-                        purchaseItem.textContent = `Purchase ID: ${purchase.purchase_id}, Total price: ${purchase.total_price}, Products: ${productDetails}`;
-                        purchaseList.appendChild(purchaseItem);
-                    });
-                } else {
-                    purchaseList.innerHTML = "<p>No purchases found.</p>";
-                }
-            })
-            .catch(error => {
-                console.error("Error fetching purchases:", error);
-                document.getElementById("listPurchases").innerHTML = "<p>Error retrieving purchases.</p>";
-            });
+        loadPagedList("/all-purchases", document.getElementById("listPurchases"),
+            purchase => {
+                let productDetails = (purchase.products || []).map(p => `${p.product_name} (x${p.amount})`).join(", ");
+                return textItem(`Purchase ID: ${purchase.purchase_id}, Total price: ${purchase.total_price}, Products: ${productDetails}`);
+            },
+            "No purchases found.", "Error retrieving purchases.");
     });
 
     // Fetch total purchase price
     document.getElementById("fetchTotal").addEventListener("click", function() {
         clearAllResults();
-        fetch("/all-purchases-price")
-            .then(response => response.json())
+        getJson("/all-purchases-price")
             .then(data => {
                 let totalPriceElement = document.getElementById("totalPrice");
                 if (data.total_price !== undefined) {
@@ -0,0 +1,73 @@
+'''This module serves the static assets built by build_static.py.
+When the build manifest exists, url_for('static', filename=...) returns the
+content-hashed file name, and the static route serves hashed files with
+far-future immutable cache headers, choosing the precompressed .br or .gz
+variant that the browser accepts. Without a build, Flask's default static
+handling is left untouched.'''
+import os
+import json
+import logging
+import mimetypes
+from typing import Any
+from flask import Flask, Response, current_app, request, send_from_directory
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticAssets:
+    '''Fingerprinted, precompressed static files described by a build manifest.'''
+    def __init__(self, build_dir: str) -> None:
+        '''Load the manifest from build_dir, if a build exists there.'''
+        self.build_dir = build_dir
+        self.manifest: dict[str, str] = {}
+        self.encodings: dict[str, list[tuple[str, str]]] = {}
+        manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+        if not os.path.isfile(manifest_path):
+            return
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            self.manifest = json.load(manifest_file)
+        for hashed in self.manifest.values():
+            path = os.path.join(build_dir, *hashed.split('/'))
+            self.encodings[hashed] = [
+                (encoding, suffix) for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)
+            ]
+
+    @property
+    def enabled(self) -> bool:
+        '''Whether a built manifest was found'''
+        return bool(self.manifest)
+
+    def init_app(self, app: Flask) -> None:
+        '''Map static URLs to hashed names and replace the static view of the app.'''
+        if not self.enabled:
+            LOGGER.info("No static build in %s, serving static files unchanged", self.build_dir)
+            return
+        app.url_defaults(self.hashed_url_defaults)
+        app.view_functions['static'] = self.send_static
+        LOGGER.info("Serving %d fingerprinted static files from %s", len(self.manifest), self.build_dir)
+
+    def hashed_url_defaults(self, endpoint: str, values: dict[str, Any]) -> None:
+        '''Replace the logical file name of static URLs with its hashed name.'''
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static(self, filename: str) -> Response:
+        '''Serve a hashed file, precompressed when the client accepts it.
+        Unhashed names fall back to the source static folder.'''
+        if filename not in self.encodings:
+            return current_app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in self.encodings[filename]:
+            if request.accept_encodings.quality(encoding) > 0:
+                response = send_from_directory(self.build_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.build_dir, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
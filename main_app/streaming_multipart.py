@@ -0,0 +1,70 @@
+'''This module builds a multipart/form-data request body around an open file
+without loading the file into memory. The body is read in chunks by requests,
+so forwarding an upload holds at most one chunk of it at a time.'''
+import io
+import uuid
+from typing import IO, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartFileStream:
+    '''A file-like multipart body with a single file field.
+    It exposes its total length, so requests sends a Content-Length header
+    instead of chunked transfer encoding.'''
+    def __init__(
+        self,
+        field_name: str,
+        filename: str,
+        file_obj: IO[bytes],
+        content_type: str = 'application/octet-stream',
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+        '''Prepare the multipart head and tail around the file part.'''
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{_quote(field_name)}"; filename="{_quote(filename)}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+        start = file_obj.tell()
+        file_obj.seek(0, io.SEEK_END)
+        file_size = file_obj.tell() - start
+        file_obj.seek(start)
+
+        self.len = len(head) + file_size + len(tail)
+        self._parts: list[IO[bytes]] = [io.BytesIO(head), file_obj, io.BytesIO(tail)]
+
+    @property
+    def content_type(self) -> str:
+        '''Return the Content-Type header value including the boundary.'''
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return self.len
+
+    def read(self, size: int = -1) -> bytes:
+        '''Read up to size bytes of the body, moving through the parts in order.
+        A negative size reads one chunk at a time until everything is returned.'''
+        if size < 0:
+            return b''.join(iter(lambda: self.read(self.chunk_size), b''))
+        data = b''
+        while self._parts and len(data) < size:
+            chunk = self._parts[0].read(size - len(data))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            data += chunk
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        '''Yield the body in chunks of chunk_size bytes.'''
+        return iter(lambda: self.read(self.chunk_size), b'')
+
+
+def _quote(value: str) -> str:
+    '''Escape characters that would break a quoted Content-Disposition parameter.'''
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
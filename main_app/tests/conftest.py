@@ -1,10 +1,22 @@
+import os
+import json
+import tempfile
 import pytest
-from main_app.main import app
+
+os.environ.setdefault('MAIL_QUEUE_DIR', tempfile.mkdtemp(prefix='main_app_mail_queue_'))
+
+from main_app.main import app, wiki_cache, download_cache, mail_queue, db_client, webcamera_client, wiki_client
 
 @pytest.fixture
 def flask_test_client():
     """Fixture to set up a Flask test client"""
     app.config['TESTING'] = True
+    wiki_cache.clear()
+    download_cache.clear()
+    for path in mail_queue.pending():
+        os.remove(path)
+    for client in (db_client, webcamera_client, wiki_client):
+        client.breaker.reset()
     with app.test_client() as client:
         yield client
 
@@ -13,10 +25,24 @@ class MockResponse:
     def __init__(self, json_data=None, status_code=200):
         self.json_data = json_data or {}
         self.status_code = status_code
+        self.headers = {'Content-Type': 'application/json'}
+        self.closed = False
 
     def json(self):
         return self.json_data
 
+    @property
+    def content(self):
+        return json.dumps(self.json_data).encode()
+
+    def iter_content(self, chunk_size=1):
+        body = json.dumps(self.json_data).encode()
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
 @pytest.fixture
 def mock_response():
     """Fixture that returns a reusable MockResponse class"""
@@ -0,0 +1,123 @@
+"""
+It is a module which tests pooled backend clients from backend_client.py
+"""
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from backend_client import BackendClient
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Small HTTP/1.1 handler that keeps connections open"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Silence request logging"""
+
+
+@pytest.fixture
+def local_backend():
+    """Run a local keep-alive HTTP server for the duration of a test"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_reuses_connections(local_backend):
+    """Sequential requests share one keep-alive connection"""
+    client = BackendClient("test_app", local_backend, pool_size=2, timeout=5)
+
+    for _ in range(5):
+        response = client.get("/anything")
+        assert response.json() == {"ok": True}
+
+    stats = client.stats()
+    assert stats["requests"] == 5
+    assert stats["errors"] == 0
+    assert stats["in_flight"] == 0
+    assert len(stats["pools"]) == 1
+    assert stats["pools"][0]["connections_opened"] == 1
+    assert stats["pools"][0]["requests_sent"] == 5
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 handler that always answers 503 and counts the requests"""
+    protocol_version = "HTTP/1.1"
+    requests = 0
+
+    def do_GET(self):
+        UnavailableHandler.requests += 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        """Silence request logging"""
+
+
+def test_retries_stay_within_the_deadline():
+    """A retry whose backoff would end after the deadline is not made"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 0.5
+    client = BackendClient("test_app", f"http://127.0.0.1:{server.server_address[1]}",
+                           retries=3, backoff_factor=1.0, deadline=lambda: deadline)
+    try:
+        start = time.monotonic()
+        response = client.get("/")
+        elapsed = time.monotonic() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 503
+    # the first retry is immediate, the second would wait 2 s
+    assert UnavailableHandler.requests == 2
+    assert elapsed < 0.5
+
+
+def test_client_counts_errors():
+    """Connection failures are counted and re-raised"""
+    client = BackendClient("down_app", "http://127.0.0.1:1", timeout=1, retries=0)
+
+    with pytest.raises(Exception):
+        client.get("/all-customers")
+
+    assert client.stats()["errors"] == 1
+
+
+def test_client_from_env(monkeypatch):
+    """Pool size, timeout and retries are read from prefixed environment variables"""
+    monkeypatch.setenv("SOME_APP_URL", "http://some_app:9000/")
+    monkeypatch.setenv("SOME_APP_POOL_SIZE", "25")
+    monkeypatch.setenv("SOME_APP_TIMEOUT", "2.5")
+    monkeypatch.setenv("SOME_APP_RETRIES", "0")
+
+    client = BackendClient.from_env("some_app", "http://default:1")
+
+    assert client.base_url == "http://some_app:9000"
+    assert client.url("/query") == "http://some_app:9000/query"
+    assert client.pool_size == 25
+    assert client.timeout == 2.5
+    assert client.retries == 0
+
+
+def test_pool_stats_route(flask_test_client):
+    """Pool statistics of all backends are exposed by the gateway"""
+    response = flask_test_client.get("/pool-stats")
+
+    assert response.status_code == 200
+    assert set(response.json) == {"db_app", "webcamera_app", "wiki_app"}
+    assert "pools" in response.json["db_app"]
@@ -0,0 +1,168 @@
+"""
+It is a module which tests circuit breakers and request budgets of backend clients
+"""
+import time
+import pytest
+import circuit_breaker
+from backend_client import BackendClient
+from circuit_breaker import CircuitBreaker, CircuitOpenError, DeadlineExceededError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time.monotonic in circuit_breaker with a controllable clock"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_on_failure_rate(clock):
+    """The breaker opens once the failure share in the window reaches the threshold"""
+    breaker = CircuitBreaker("test", min_calls=4, failure_rate=0.5)
+
+    for success in (True, True, False):
+        breaker.before_call()
+        breaker.record(success, 0.01)
+    assert breaker.state() == "closed"
+
+    breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state() == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_opens_on_slow_calls(clock):
+    """Calls slower than slow_call_seconds count against the breaker"""
+    breaker = CircuitBreaker("test", min_calls=2, slow_call_seconds=1, slow_call_rate=1.0)
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record(True, 2.5)
+
+    assert breaker.state() == "open"
+
+
+def test_breaker_half_open_probe(clock):
+    """After the cool-down one probe is allowed; its outcome closes or reopens the circuit"""
+    breaker = CircuitBreaker("test", min_calls=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record(False, 0.01)
+
+    clock[0] += 11
+    assert breaker.state() == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state() == "open"
+
+    clock[0] += 11
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state() == "closed"
+
+
+def test_breaker_window_forgets_old_calls(clock):
+    """Calls older than the rolling window are not counted"""
+    breaker = CircuitBreaker("test", window_seconds=30, min_calls=2, failure_rate=0.5)
+    breaker.before_call()
+    breaker.record(False, 0.01)
+
+    clock[0] += 31
+    breaker.before_call()
+    breaker.record(True, 0.01)
+
+    assert breaker.state() == "closed"
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_client_fails_fast_when_open(monkeypatch):
+    """An open breaker rejects calls without touching the network"""
+    client = BackendClient("test_app", "http://test_app", breaker=CircuitBreaker("test_app", min_calls=1))
+    calls = []
+
+    def mock_get(url, **kwargs):
+        calls.append(url)
+        raise circuit_breaker.requests.exceptions.ConnectionError("down")
+
+    monkeypatch.setattr(client.session, "get", mock_get)
+
+    with pytest.raises(circuit_breaker.requests.exceptions.ConnectionError):
+        client.get("/all-products")
+    with pytest.raises(CircuitOpenError):
+        client.get("/all-products")
+    assert len(calls) == 1
+
+
+def test_client_passes_request_budget(monkeypatch, mock_response):
+    """The remaining budget caps the timeout and is sent to the backend"""
+    deadline = [time.monotonic() + 2]
+    client = BackendClient("test_app", "http://test_app", timeout=30, deadline=lambda: deadline[0])
+    sent = {}
+
+    def mock_get(_url, timeout, headers, **_kwargs):
+        sent.update(timeout=timeout, headers=headers)
+        return mock_response({}, 200)
+
+    monkeypatch.setattr(client.session, "get", mock_get)
+    client.get("/all-products")
+
+    assert sent["timeout"] <= 2
+    assert 0 < int(sent["headers"]["X-Request-Budget-Ms"]) <= 2000
+
+    deadline[0] = time.monotonic() - 1
+    with pytest.raises(DeadlineExceededError):
+        client.get("/all-products")
+
+
+def test_budget_timeouts_do_not_open_breaker(monkeypatch):
+    """Timeouts of calls cut short by the request budget are not held against the backend"""
+    breaker = CircuitBreaker("test_app", min_calls=2, failure_rate=0.5)
+    client = BackendClient("test_app", "http://test_app", timeout=30, breaker=breaker,
+                           deadline=lambda: time.monotonic() + 0.05)
+
+    def mock_get(_url, **_kwargs):
+        raise circuit_breaker.requests.exceptions.ReadTimeout("read timed out")
+
+    monkeypatch.setattr(client.session, "get", mock_get)
+
+    for _ in range(5):
+        with pytest.raises(DeadlineExceededError):
+            client.get("/all-products")
+
+    assert breaker.state() == "closed"
+    assert breaker.stats()["window_calls"] == 0
+
+    client.deadline = None
+    for _ in range(2):
+        with pytest.raises(circuit_breaker.requests.exceptions.ReadTimeout):
+            client.get("/all-products")
+    assert breaker.state() == "open"
+
+
+def test_breaker_release_frees_half_open_probe(clock):
+    """A released probe lets the next call probe without closing or reopening the circuit"""
+    breaker = CircuitBreaker("test", min_calls=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record(False, 0.01)
+
+    clock[0] += 11
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state() == "half_open"
+
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state() == "closed"
+
+
+def test_breakers_route(flask_test_client):
+    """Breaker state of all backends is exposed by the gateway"""
+    response = flask_test_client.get("/breakers")
+
+    assert response.status_code == 200
+    assert response.json["db_app"]["state"] == "closed"
+    assert set(response.json) == {"db_app", "webcamera_app", "wiki_app"}
@@ -0,0 +1,188 @@
+"""
+It is a module which tests the outbound email queue from mail_queue.py
+against a local SMTP stand-in
+"""
+import os
+import time
+import socketserver
+import threading
+import pytest
+from flask import Flask
+from flask_mail import Mail
+from mail_queue import MailQueue
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib.sendmail"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line.split(" ", 1)[0].upper()
+            if not line or command == "QUIT":
+                self.reply("221 Bye")
+                return
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command == "MAIL":
+                if server.failures_left > 0:
+                    server.failures_left -= 1
+                    self.reply("451 Try again later")
+                else:
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    lines.append(data_line)
+                server.messages.append(b"".join(lines).decode())
+                self.reply("250 OK")
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Local SMTP server recording messages and connections"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStandInHandler)
+        self.messages = []
+        self.connections = 0
+        self.failures_left = 0
+
+
+@pytest.fixture
+def smtp_server():
+    """Run the SMTP stand-in for the duration of a test"""
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_queue(smtp_server, tmp_path):
+    """Build a MailQueue whose Flask-Mail points at the SMTP stand-in"""
+    queues = []
+
+    def factory(**kwargs):
+        app = Flask("mail_queue_test")
+        app.config.update(
+            MAIL_SERVER="127.0.0.1",
+            MAIL_PORT=smtp_server.server_address[1],
+            MAIL_USE_TLS=False,
+            MAIL_USE_SSL=False,
+            MAIL_DEFAULT_SENDER="gateway@example.com"
+        )
+        queue = MailQueue(app, Mail(app), directory=str(tmp_path / "spool"), **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield factory
+    for queue in queues:
+        queue.stop()
+
+
+def enqueue_messages(queue, count):
+    """Queue count contact-form messages without waking a sender thread"""
+    queue.start = lambda: None
+    for index in range(count):
+        queue.enqueue(f"Subject {index}", "user@example.com", ["owner@example.com"], f"Message {index}")
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition until it is true or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_enqueue_is_durable(make_queue):
+    """Queued messages are files on disk until they are sent"""
+    queue = make_queue()
+    enqueue_messages(queue, 2)
+
+    assert len(queue.pending()) == 2
+    assert all(os.path.exists(path) for path in queue.pending())
+
+
+def test_drain_reuses_one_connection(make_queue, smtp_server):
+    """All pending messages are sent in batches over a single SMTP connection"""
+    queue = make_queue(batch_size=2)
+    enqueue_messages(queue, 5)
+
+    assert queue.drain() == 5
+
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 5
+    assert "Message 0" in smtp_server.messages[0]
+    assert queue.pending() == []
+    assert queue.stats()["sent"] == 5
+
+
+def test_sender_thread_backs_off_and_retries(make_queue, smtp_server):
+    """A temporary SMTP failure is retried by the background sender after a back-off"""
+    queue = make_queue(backoff_seconds=0.05, poll_seconds=0.05)
+    smtp_server.failures_left = 1
+
+    queue.enqueue("Hello", "user@example.com", ["owner@example.com"], "Retry me")
+
+    assert wait_for(lambda: queue.stats()["sent"] == 1)
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.connections == 2
+    assert queue.pending() == []
+
+
+def test_message_given_up_after_max_attempts(make_queue, smtp_server):
+    """A message that keeps failing is moved to the failed directory"""
+    queue = make_queue(max_attempts=2)
+    smtp_server.failures_left = 10
+    enqueue_messages(queue, 1)
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            queue.drain()
+
+    assert queue.pending() == []
+    assert len(os.listdir(queue.failed_directory)) == 1
+    assert queue.stats()["failed_permanently"] == 1
+
+
+def test_corrupt_spool_file_moved_to_failed(make_queue, smtp_server):
+    """A spool file that is not a valid message is set aside and the others are still sent"""
+    queue = make_queue()
+    enqueue_messages(queue, 1)
+    with open(os.path.join(queue.directory, "0-corrupt.json"), "w", encoding="utf-8") as spool_file:
+        spool_file.write("{not json")
+
+    assert queue.drain() == 1
+
+    assert len(smtp_server.messages) == 1
+    assert queue.pending() == []
+    assert os.listdir(queue.failed_directory) == ["0-corrupt.json"]
+
+
+def test_spooled_messages_sent_after_start(make_queue, smtp_server):
+    """Messages left in the spool by an earlier process are sent once the sender starts"""
+    enqueue_messages(make_queue(), 2)
+    queue = make_queue(poll_seconds=0.05)
+
+    queue.start()
+
+    assert wait_for(lambda: queue.stats()["sent"] == 2)
+    assert len(smtp_server.messages) == 2
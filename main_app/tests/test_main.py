@@ -1,24 +1,18 @@
 """
 It is a module which make a simple test of main.py from main_app directory
 """
-import smtplib
 import io
+import json
 import requests
-from flask_mail import Message
-from main_app.main import mail, WEBCAMERA_APP_URL
+from main_app import main
+from circuit_breaker import CircuitOpenError
+from main_app.main import mail_queue, db_client, webcamera_client, wiki_client, WEBCAMERA_APP_URL
 
 def test_send_email_success(flask_test_client, monkeypatch):
-    """Test successful email sending by mocking Flask-Mail"""
+    """Test that a contact form submission is queued and answered right away"""
 
     monkeypatch.setenv('MAIL_USERNAME', 'test@example.com')
-
-    sent_messages = []
-
-    def mock_send(msg):
-        """Mock send function to simulate email sending"""
-        sent_messages.append(msg)
-
-    monkeypatch.setattr(mail, 'send', mock_send)
+    monkeypatch.setattr(mail_queue, 'start', lambda: None)
 
     data = {
         'name': 'Test User',
@@ -28,27 +22,29 @@ def test_send_email_success(flask_test_client, monkeypatch):
 
     response = flask_test_client.post('/send-email', data=data)
 
-    assert response.status_code == 200
-    assert response.json == {'success': 'Email sent successfully!'}
+    assert response.status_code == 202
+    assert response.json == {'success': 'Email queued for sending!'}
 
-    assert len(sent_messages) == 1
+    pending = mail_queue.pending()
+    assert len(pending) == 1
 
-    email: Message = sent_messages[0]
-    assert email.subject == "New Contact Form Submission from Test User"
-    assert email.sender == "user@example.com"
-    assert email.recipients == ["test@example.com"]
-    assert "This is a test message." in email.body
+    with open(pending[0], encoding='utf-8') as spool_file:
+        email = json.load(spool_file)
+    assert email['subject'] == "New Contact Form Submission from Test User"
+    assert email['sender'] == "user@example.com"
+    assert email['recipients'] == ["test@example.com"]
+    assert "This is a test message." in email['body']
 
 
 def test_send_email_failure(flask_test_client, monkeypatch):
-    """Test email sending failure due to an exception"""
+    """Test email submission failure when the message cannot be queued"""
 
     monkeypatch.setenv('MAIL_USERNAME', 'test@example.com')
-    def mock_failed_email_send(msg):
-        """Mock function to simulate email sendinf failure"""
-        raise smtplib.SMTPException("SMTP Error: Unable to send email")
+    def mock_failed_enqueue(**kwargs):
+        """Mock function to simulate a failing mail spool"""
+        raise OSError("No space left on device")
 
-    monkeypatch.setattr(mail, 'send', mock_failed_email_send)
+    monkeypatch.setattr(mail_queue, 'enqueue', mock_failed_enqueue)
 
     data = {
         'name': 'Test User',
@@ -60,7 +56,7 @@ def test_send_email_failure(flask_test_client, monkeypatch):
 
     assert response.status_code == 500
     assert 'error' in response.json
-    assert "SMTP Error: Unable to send email" in response.json['error']
+    assert "No space left on device" in response.json['error']
 
 
 def test_send_email_missing_fields(flask_test_client):
@@ -83,13 +79,17 @@ def test_get_webcamera_pic(flask_test_client):
 def test_upload_photo_success(flask_test_client, monkeypatch, mock_response):
     """Test successful image upload and forwarding to the WebCamera service"""
 
-    def mock_post(url, files, timeout):
+    def mock_post(url, data, headers, **_kwargs):
         """Mock function to simulate a successful request to WebCamera service"""
         assert url == f"{WEBCAMERA_APP_URL}/upload"
-        assert 'image' in files
+        assert headers['Content-Type'] == data.content_type
+        body = data.read()
+        assert len(body) == len(data)
+        assert b'name="image"; filename="test.jpg"' in body
+        assert b"fake_image_data" in body
         return mock_response({'success': 'Image uploaded'}, 200)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(webcamera_client.session, "post", mock_post)
 
     fake_image = (io.BytesIO(b"fake_image_data"), "test.jpg")
 
@@ -114,7 +114,7 @@ def test_upload_photo_service_unavailable(flask_test_client, monkeypatch):
     def mock_post(*args, **kwargs):
         raise requests.exceptions.RequestException("Service Unavailable")
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(webcamera_client.session, "post", mock_post)
 
     fake_image = (io.BytesIO(b"fake_image_data"), "test.jpg")
 
@@ -126,10 +126,10 @@ def test_upload_photo_service_unavailable(flask_test_client, monkeypatch):
 def test_download_photo_success(flask_test_client, monkeypatch, mock_response):
     """Test successful image download with redirection"""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         return mock_response({'url': 'https://example.com/test.jpg'}, 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(webcamera_client.session, "get", mock_get)
 
     response = flask_test_client.get('/download/test.jpg')
 
@@ -140,16 +140,85 @@ def test_download_photo_success(flask_test_client, monkeypatch, mock_response):
 def test_download_photo_not_found(flask_test_client, monkeypatch, mock_response):
     """Test failure when trying to download a missing file"""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         return mock_response({}, 404)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(webcamera_client.session, "get", mock_get)
 
     response = flask_test_client.get('/download/missing.jpg')
 
-    assert response.status_code == 200
+    assert response.status_code == 404
     assert response.json == {'error': 'File not found or already deleted.'}
 
+
+def test_download_photo_service_unavailable(flask_test_client, monkeypatch):
+    """Test that a failed webcamera call answers 503 for an open circuit and 504 for a timeout"""
+
+    errors = iter([requests.exceptions.ReadTimeout("slow"), requests.exceptions.ConnectionError("refused")])
+
+    def mock_get(_url, **_kwargs):
+        raise next(errors)
+
+    monkeypatch.setattr(webcamera_client.session, "get", mock_get)
+
+    statuses = [flask_test_client.get(f'/download/{name}.jpg').status_code for name in ('a', 'b')]
+    assert statuses == [504, 500]
+
+    def open_circuit():
+        raise CircuitOpenError("webcamera_app circuit is open")
+
+    monkeypatch.setattr(webcamera_client.breaker, "before_call", open_circuit)
+    response = flask_test_client.get('/download/c.jpg')
+    assert response.status_code == 503
+    assert "Webcamera service unavailable" in response.json['error']
+
+
+def test_download_photo_caches_presigned_url(flask_test_client, monkeypatch, mock_response):
+    """Test that a presigned URL is reused until shortly before it expires"""
+
+    calls = []
+
+    def mock_get(url, **_kwargs):
+        calls.append(url)
+        return mock_response({'url': f'https://example.com/signed-{len(calls)}.jpg', 'expires_in': 3600}, 200)
+
+    monkeypatch.setattr(webcamera_client.session, "get", mock_get)
+
+    first = flask_test_client.get('/download/test.jpg')
+    second = flask_test_client.get('/download/test.jpg')
+
+    assert len(calls) == 1
+    assert first.location == second.location == "https://example.com/signed-1.jpg"
+    stats = flask_test_client.get('/cache-stats').json['download_urls']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    monkeypatch.setattr(main, "DOWNLOAD_URL_MARGIN", 3600)
+    flask_test_client.get('/download/other.jpg')
+    flask_test_client.get('/download/other.jpg')
+    assert len(calls) == 3
+
+
+def test_upload_photo_seeds_download_cache(flask_test_client, monkeypatch, mock_response):
+    """Test that the URL returned by an upload is served by /download without a backend call"""
+
+    def mock_post(_url, **_kwargs):
+        return mock_response({'url': 'https://example.com/new.jpg', 'object_name': 'image_1.jpg',
+                              'expires_in': 3600}, 200)
+
+    def mock_get(_url, **_kwargs):
+        raise AssertionError("webcamera_app must not be called")
+
+    monkeypatch.setattr(webcamera_client.session, "post", mock_post)
+    monkeypatch.setattr(webcamera_client.session, "get", mock_get)
+
+    flask_test_client.post('/upload', data={'image': (io.BytesIO(b"data"), 'test.jpg')},
+                           content_type='multipart/form-data')
+    response = flask_test_client.get('/download/image_1.jpg')
+
+    assert response.status_code == 302
+    assert response.location == "https://example.com/new.jpg"
+
 def test_wiki_app_get(flask_test_client):
     """Test if the Wiki app page renders correctly"""
     response = flask_test_client.get('/wiki-app')
@@ -160,7 +229,7 @@ def test_wiki_app_get(flask_test_client):
 def test_wiki_app_post_success(flask_test_client, monkeypatch, mock_response):
     """Test successful Wikipedia search (POST request)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         """Mock Wikipedia API returning a successful search result."""
         assert json == {'query': 'Python'}
         return mock_response({
@@ -170,7 +239,7 @@ def test_wiki_app_post_success(flask_test_client, monkeypatch, mock_response):
             'main_image': 'https://example.com/python.jpg'
         }, 200)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
 
     response = flask_test_client.post('/wiki-app', data={'query': 'Python'})
 
@@ -184,10 +253,10 @@ def test_wiki_app_post_success(flask_test_client, monkeypatch, mock_response):
 def test_wiki_app_post_not_found(flask_test_client, monkeypatch, mock_response):
     """Test Wikipedia search returning 404 (article not found)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         return mock_response({'error': 'Article not found.'}, 404)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
 
     response = flask_test_client.post('/wiki-app', data={'query': 'Nonexistent'})
 
@@ -198,10 +267,10 @@ def test_wiki_app_post_not_found(flask_test_client, monkeypatch, mock_response):
 def test_wiki_app_post_service_error(flask_test_client, monkeypatch):
     """Test Wikipedia search service failure (500 or timeout)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         raise requests.exceptions.RequestException("Service unavailable")
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
 
     response = flask_test_client.post('/wiki-app', data={'query': 'Python'})
 
@@ -217,14 +286,14 @@ def test_db_app(flask_test_client):
 def test_list_all_customers_success(flask_test_client, monkeypatch, mock_response):
     """Test successful retrieval of all customers."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         """Mock function simulating a successful DB API call."""
         return mock_response([
             {"email": "alice@example.com", "name": "Alice", "surname": "White"},
             {"email": "bob@example.com", "name": "Bob", "surname": "Black"}
         ], 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-customers')
 
@@ -237,10 +306,10 @@ def test_list_all_customers_success(flask_test_client, monkeypatch, mock_respons
 def test_list_all_customers_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-customers')
 
@@ -250,14 +319,14 @@ def test_list_all_customers_service_error(flask_test_client, monkeypatch):
 def test_list_all_products_success(flask_test_client, monkeypatch, mock_response):
     """Test successful retrieval of all products."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         """Mock function simulating a successful DB API call."""
         return mock_response([
             {'product_name': 'Spiced Latte', 'available_amount': '18', 'price': '265'},
             {'product_name': 'Espresso Shot', 'available_amount': '45', 'price': '315'}
         ], 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-products')
 
@@ -271,10 +340,10 @@ def test_list_all_products_success(flask_test_client, monkeypatch, mock_response
 def test_list_all_products_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-products')
 
@@ -284,14 +353,14 @@ def test_list_all_products_service_error(flask_test_client, monkeypatch):
 def test_list_all_purchases_success(flask_test_client, monkeypatch, mock_response):
     """Test successful retrieval of all purchases."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         """Mock function simulating a successful DB API call."""
         return mock_response([
             {'customer_email': 'cash@gmail.com', 'purchase_id': '12345'},
             {'customer_email': 'smith@gmail.com', 'purchase_id': '98765'}
         ], 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-purchases')
 
@@ -305,10 +374,10 @@ def test_list_all_purchases_success(flask_test_client, monkeypatch, mock_respons
 def test_list_all_purchases_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-purchases')
 
@@ -318,29 +387,26 @@ def test_list_all_purchases_service_error(flask_test_client, monkeypatch):
 def test_total_price_all_purchases_success(flask_test_client, monkeypatch, mock_response):
     """Test successful calculation of total price for all purchases."""
 
-    def mock_get(_url, timeout):
+    def mock_get(url, **_kwargs):
         """Mock function simulating a successful DB API call."""
-        return mock_response([
-            {'customer_email': 'cash@gmail.com', 'purchase_id': '12345', "total_price": "999.99"},
-            {'customer_email': 'smith@gmail.com', 'purchase_id': '98765', "total_price": "499.50"},
-            {'customer_email': 'charles@gmail.com', 'purchase_id': '34567', "total_price": "250.51"}
-        ], 200)
+        assert url.endswith('/purchases-total')
+        return mock_response({"total_price": 1750.0, "purchase_count": 3}, 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-purchases-price')
 
     assert response.status_code == 200
-    assert response.json == {"total_price": 1750.0}
+    assert response.json["total_price"] == 1750.0
 
 
 def test_total_price_all_purchases_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable."""
 
-    def mock_get(_url, timeout):
+    def mock_get(_url, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/all-purchases-price')
 
@@ -351,12 +417,12 @@ def test_total_price_all_purchases_service_error(flask_test_client, monkeypatch)
 def test_add_product_get_success(flask_test_client, monkeypatch, mock_response):
     """Test successful retrieval of product details (GET request)."""
 
-    def mock_get(_url, params, timeout):
+    def mock_get(_url, params, **_kwargs):
         """Mock function simulating a successful product lookup."""
         assert params == {"product_name": "Spiced Latte"}
         return mock_response({"available_amount": "18", "price": "265"}, 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/add-product', query_string={"product_name": "Spiced Latte"})
 
@@ -376,10 +442,10 @@ def test_add_product_get_missing_name(flask_test_client):
 def test_add_product_get_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable during GET request."""
 
-    def mock_get(_url, params, timeout):
+    def mock_get(_url, params, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/add-product', query_string={"product_name": "Spiced Latte"})
 
@@ -391,7 +457,7 @@ def test_add_product_get_service_error(flask_test_client, monkeypatch):
 def test_add_product_post_success(flask_test_client, monkeypatch, mock_response):
     """Test successful product addition (POST request)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         """Mock function simulating a successful product addition."""
         assert json == {
             'product_name': 'Spiced Latte',
@@ -400,7 +466,7 @@ def test_add_product_post_success(flask_test_client, monkeypatch, mock_response)
         }
         return mock_response({"message": "Product added successfully"}, 201)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/add-product', json={'product_name': 'Spiced Latte', 'price': 265, 'available_amount': '18'})
 
@@ -411,10 +477,10 @@ def test_add_product_post_success(flask_test_client, monkeypatch, mock_response)
 def test_add_product_post_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable during POST request."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/add-product', json={'product_name': 'Spiced Latte', 'price': '265'})
 
@@ -425,14 +491,14 @@ def test_add_product_post_service_error(flask_test_client, monkeypatch):
 def test_search_customers_success(flask_test_client, monkeypatch, mock_response):
     """Test successful customer search (GET request)."""
 
-    def mock_get(_url, params, timeout):
+    def mock_get(_url, params, **_kwargs):
         """Mock function simulating a successful customer search."""
         assert dict(params) == {"name": "Alice"}
         return mock_response([
             {"email": "alice@example.com", "name": "Alice", "surname": "White"}
         ], 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/search-customers', query_string={"name": "Alice"})
 
@@ -445,10 +511,10 @@ def test_search_customers_success(flask_test_client, monkeypatch, mock_response)
 def test_search_customers_no_results(flask_test_client, monkeypatch, mock_response):
     """Test customer search returning no results (empty list)."""
 
-    def mock_get(_url, params, timeout):
+    def mock_get(_url, params, **_kwargs):
         return mock_response([], 200)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/search-customers', query_string={"name": "Unknown"})
 
@@ -459,10 +525,10 @@ def test_search_customers_no_results(flask_test_client, monkeypatch, mock_respon
 def test_search_customers_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable during search."""
 
-    def mock_get(_url, params, timeout):
+    def mock_get(_url, params, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(db_client.session, "get", mock_get)
 
     response = flask_test_client.get('/search-customers', query_string={"name": "Alice"})
 
@@ -473,12 +539,12 @@ def test_search_customers_service_error(flask_test_client, monkeypatch):
 def test_add_customer_success(flask_test_client, monkeypatch, mock_response):
     """Test successful customer addition (POST request)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         """Mock function simulating a successful customer addition."""
         assert json == {"name": "Alice", "email": "alice@example.com"}
         return mock_response({"message": "Customer added successfully"}, 201)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/add-customer', json={"name": "Alice", "email": "alice@example.com"})
 
@@ -489,10 +555,10 @@ def test_add_customer_success(flask_test_client, monkeypatch, mock_response):
 def test_add_customer_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable during customer addition."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/add-customer', json={"name": "Alice", "email": "alice@example.com"})
 
@@ -503,7 +569,7 @@ def test_add_customer_service_error(flask_test_client, monkeypatch):
 def test_make_purchase_success(flask_test_client, monkeypatch, mock_response):
     """Test successful purchase transaction (POST request)."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         """Mock function simulating a successful purchase transaction."""
         assert json == {
             "customer_email": "john.doe@example.com",
@@ -512,7 +578,7 @@ def test_make_purchase_success(flask_test_client, monkeypatch, mock_response):
         }
         return mock_response({"message": "Purchase completed successfully"}, 201)
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/make-purchase', json={
         "customer_email": "john.doe@example.com",
@@ -526,10 +592,10 @@ def test_make_purchase_success(flask_test_client, monkeypatch, mock_response):
 def test_make_purchase_service_error(flask_test_client, monkeypatch):
     """Test handling when database service is unavailable during purchase transaction."""
 
-    def mock_post(_url, json, timeout):
+    def mock_post(_url, json, **_kwargs):
         raise requests.exceptions.RequestException("Database service unavailable")
 
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr(db_client.session, "post", mock_post)
 
     response = flask_test_client.post('/make-purchase', json={
         "customer_email": "john.doe@example.com",
@@ -539,4 +605,290 @@ def test_make_purchase_service_error(flask_test_client, monkeypatch):
 
     assert response.status_code == 500
     assert "error" in response.json
-    assert response.json["error"] == "Database service unavailable"
\ No newline at end of file
+    assert response.json["error"] == "Database service unavailable"
+
+def test_checkout_relays_lines(flask_test_client, monkeypatch, mock_response):
+    """Test that a cart checkout is forwarded to db_app and its per-line answer relayed."""
+    cart = {"customer_email": "john.doe@example.com", "items": [{"product_name": "Spiced Latte", "amount": 2}]}
+    answer = {"error": "Some items cannot be purchased",
+              "lines": [{"product_name": "Spiced Latte", "amount": 2, "status": "insufficient_stock"}]}
+
+    def mock_post(url, json, **_kwargs):
+        assert url.endswith('/checkout')
+        assert json == cart
+        return mock_response(answer, 400)
+
+    monkeypatch.setattr(db_client.session, "post", mock_post)
+
+    response = flask_test_client.post('/checkout', json=cart)
+
+    assert response.status_code == 400
+    assert response.json == answer
+
+def test_list_all_products_passthrough_does_not_decode(flask_test_client, monkeypatch, mock_response):
+    """Test that list routes relay the upstream body and status without parsing it."""
+
+    upstream = mock_response([{'product_name': 'Spiced Latte'}], 206)
+
+    def fail_json():
+        raise AssertionError("Upstream body must not be decoded")
+
+    upstream.json = fail_json
+
+    def mock_get(_url, stream, **_kwargs):
+        assert stream is True
+        return upstream
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    response = flask_test_client.get('/all-products')
+
+    assert response.status_code == 206
+    assert response.content_type == 'application/json'
+    assert response.get_json() == [{'product_name': 'Spiced Latte'}]
+    response.close()
+    assert upstream.closed
+
+
+def test_list_all_customers_passthrough_disabled(flask_test_client, monkeypatch, mock_response):
+    """Test that the decoding proxy mode is used when passthrough is switched off."""
+
+    monkeypatch.setattr(main, "PASSTHROUGH_PROXY", False)
+
+    def mock_get(_url, stream, **_kwargs):
+        assert stream is False
+        return mock_response([{"email": "alice@example.com"}], 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    response = flask_test_client.get('/all-customers')
+
+    assert response.status_code == 200
+    assert response.json == [{"email": "alice@example.com"}]
+
+def test_whole_table_list_is_streamed_not_buffered(flask_test_client, monkeypatch, mock_response):
+    """Test that an unpaginated list is relayed chunk by chunk instead of being read whole."""
+
+    class StreamOnlyResponse(mock_response):
+        """Response whose body can only be iterated"""
+        @property
+        def content(self):
+            raise AssertionError("Whole-table lists must not be buffered")
+
+    chunk_sizes = []
+
+    def mock_get(_url, stream, **_kwargs):
+        assert stream is True
+        upstream = StreamOnlyResponse([{"email": f"user{index}@example.com"} for index in range(100)], 200)
+        upstream.headers['ETag'] = '"customers-1-abc"'
+        iter_content = upstream.iter_content
+        upstream.iter_content = lambda chunk_size=1: (chunk_sizes.append(chunk_size), iter_content(chunk_size))[1]
+        return upstream
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    response = flask_test_client.get('/all-customers')
+
+    assert response.status_code == 200
+    assert len(response.json) == 100
+    assert response.headers['ETag'] == '"customers-1-abc"'
+    assert chunk_sizes == [main.PASSTHROUGH_CHUNK_SIZE]
+
+def test_not_modified_list_without_passthrough(flask_test_client, monkeypatch, mock_response):
+    """Test that a 304 from db_app is relayed with an empty body when passthrough is off."""
+
+    monkeypatch.setattr(main, "PASSTHROUGH_PROXY", False)
+
+    def mock_get(_url, **_kwargs):
+        response = mock_response(None, 304)
+        response.headers['ETag'] = '"products-1-abc"'
+        return response
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    response = flask_test_client.get('/all-products', headers={'If-None-Match': '"products-1-abc"'})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == '"products-1-abc"'
+
+def test_list_all_customers_forwards_cursor(flask_test_client, monkeypatch, mock_response):
+    """Test that limit and next are forwarded to db_app and the page is relayed."""
+
+    def mock_get(_url, params, **_kwargs):
+        assert params == {"limit": "2", "next": "abc"}
+        return mock_response({"items": [{"email": "alice@example.com"}], "next": "def"}, 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    response = flask_test_client.get('/all-customers?limit=2&next=abc&other=1')
+
+    assert response.status_code == 200
+    assert response.json == {"items": [{"email": "alice@example.com"}], "next": "def"}
+
+def test_list_all_products_relays_not_modified(flask_test_client, monkeypatch, mock_response):
+    """Test that If-None-Match is forwarded to db_app and its ETag and 304 are relayed"""
+
+    sent_headers = []
+
+    def mock_get(_url, **kwargs):
+        sent_headers.append(kwargs.get('headers', {}))
+        if kwargs.get('headers', {}).get('If-None-Match') == '"products-1-abc"':
+            response = mock_response(None, 304)
+        else:
+            response = mock_response([{"product_name": "Tea"}], 200)
+        response.headers.update({'ETag': '"products-1-abc"', 'Cache-Control': 'no-cache'})
+        return response
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    fresh = flask_test_client.get('/all-products')
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] == '"products-1-abc"'
+    assert fresh.headers['Cache-Control'] == 'no-cache'
+
+    cached = flask_test_client.get('/all-products', headers={'If-None-Match': '"products-1-abc"'})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == '"products-1-abc"'
+    assert sent_headers[1]['If-None-Match'] == '"products-1-abc"'
+    assert 'If-None-Match' not in sent_headers[0]
+
+
+def test_list_all_purchases_streams_ndjson_export(flask_test_client, monkeypatch, mock_response):
+    """Test that format=ndjson is forwarded and the export is streamed, not buffered or shared"""
+
+    calls = []
+
+    def mock_get(_url, **kwargs):
+        calls.append(kwargs)
+        response = mock_response()
+        response.headers['Content-Type'] = 'application/x-ndjson'
+        response.iter_content = lambda chunk_size=1: iter([b'{"purchase_id": "1"}\n', b'{"purchase_id": "2"}\n'])
+        return response
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    monkeypatch.setattr(main, "PASSTHROUGH_PROXY", False)
+
+    response = flask_test_client.get('/all-purchases?format=ndjson')
+
+    assert response.status_code == 200
+    assert response.content_type == 'application/x-ndjson'
+    assert response.data == b'{"purchase_id": "1"}\n{"purchase_id": "2"}\n'
+    assert calls[0]['params'] == {'format': 'ndjson'}
+    assert calls[0]['stream'] is True
+
+
+def test_wiki_app_post_uses_cache(flask_test_client, monkeypatch, mock_response):
+    """Test that repeated Wikipedia queries are answered from the gateway cache."""
+
+    calls = []
+
+    def mock_post(_url, json, **_kwargs):
+        calls.append(json)
+        return mock_response({
+            'title': 'Python (programming language)',
+            'summary': 'Python is a programming language.',
+            'url': 'https://en.wikipedia.org/wiki/Python_(programming_language)',
+            'main_image': None
+        }, 200)
+
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
+
+    first = flask_test_client.post('/wiki-app', data={'query': 'Python'})
+    second = flask_test_client.post('/wiki-app', data={'query': '  python '})
+
+    assert len(calls) == 1
+    assert b'Python (programming language)' in first.data
+    assert second.data == first.data
+
+    stats = flask_test_client.get('/cache-stats').json['wiki']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_wiki_app_post_caches_not_found(flask_test_client, monkeypatch, mock_response):
+    """Test that 404 answers from the Wikipedia service are cached as negative entries."""
+
+    calls = []
+
+    def mock_post(_url, json, **_kwargs):
+        calls.append(json)
+        return mock_response({'error': 'Article not found.'}, 404)
+
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
+
+    flask_test_client.post('/wiki-app', data={'query': 'Nonexistent'})
+    response = flask_test_client.post('/wiki-app', data={'query': 'Nonexistent'})
+
+    assert len(calls) == 1
+    assert b'Article not found.' in response.data
+    assert flask_test_client.get('/cache-stats').json['wiki']['negative_hits'] == 1
+
+
+def test_wiki_app_post_treats_error_payload_as_not_found(flask_test_client, monkeypatch, mock_response):
+    """Test that a 200 answer carrying an error instead of an article is shown and cached as not found."""
+
+    calls = []
+
+    def mock_post(_url, json, **_kwargs):
+        calls.append(json)
+        return mock_response({'error': "No article found for 'Nonexistent'"}, 200)
+
+    monkeypatch.setattr(wiki_client.session, "post", mock_post)
+
+    first = flask_test_client.post('/wiki-app', data={'query': 'Nonexistent'})
+    second = flask_test_client.post('/wiki-app', data={'query': 'Nonexistent'})
+
+    assert first.status_code == 200
+    assert b'No article found for' in second.data
+    assert len(calls) == 1
+
+
+def test_batch_runs_sub_requests_concurrently(flask_test_client, monkeypatch, mock_response):
+    """Test that /batch answers every sub-request with its own status, timing and body."""
+
+    bodies = {
+        'http://db_app:5001/all-customers': [{'name': 'Ann'}],
+        'http://db_app:5001/all-products': {'items': [], 'next': None},
+        'http://db_app:5001/purchases-total': {'total_price': 10.0, 'purchase_count': 1}
+    }
+    calls = []
+
+    def mock_get(url, **kwargs):
+        calls.append((url, kwargs.get('params')))
+        if url.endswith('/all-purchases'):
+            raise requests.exceptions.ConnectionError("Connection refused")
+        return mock_response(bodies[url], 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    response = flask_test_client.post('/batch', json={'requests': [
+        {'id': 'customers', 'path': '/all-customers'},
+        {'id': 'products', 'path': '/all-products', 'params': {'limit': 25}},
+        {'id': 'purchases', 'path': '/all-purchases'},
+        {'id': 'total', 'path': '/all-purchases-price'},
+        {'id': 'email', 'path': '/send-email'}
+    ]})
+
+    assert response.status_code == 200
+    results = {result['id']: result for result in response.json['responses']}
+    assert list(results) == ['customers', 'products', 'purchases', 'total', 'email']
+    assert results['customers']['status'] == 200
+    assert results['customers']['body'] == [{'name': 'Ann'}]
+    assert results['products']['body'] == {'items': [], 'next': None}
+    assert results['total']['body']['total_price'] == 10.0
+    assert results['purchases']['status'] == 502
+    assert 'Connection refused' in results['purchases']['error']
+    assert results['email']['status'] == 404
+    assert all('duration_ms' in result for result in results.values())
+    assert ('http://db_app:5001/all-products', {'limit': '25'}) in calls
+    assert len(calls) == 4
+
+
+def test_batch_rejects_bad_bodies(flask_test_client):
+    """Test that /batch needs a non-empty, bounded list of sub-requests."""
+
+    assert flask_test_client.post('/batch', json={}).status_code == 400
+    assert flask_test_client.post('/batch', json={'requests': []}).status_code == 400
+    too_many = [{'path': '/all-customers'}] * (main.BATCH_MAX_REQUESTS + 1)
+    assert flask_test_client.post('/batch', json={'requests': too_many}).status_code == 400
@@ -0,0 +1,90 @@
+"""
+It is a module which tests the metrics registry from metrics.py
+and the /metrics endpoint of the gateway
+"""
+import json
+from metrics import MetricsRegistry, UPSTREAM_DURATION
+from main_app.main import db_client
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Observations are counted in cumulative le buckets with sum and count"""
+    registry = MetricsRegistry()
+    registry.const_labels["service"] = "test"
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{service="test",route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{service="test",route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{service="test",route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{service="test",route="/a"} 5.55' in text
+    assert 'latency_seconds_count{service="test",route="/a"} 3' in text
+
+
+def test_counter_and_label_escaping():
+    """Label values are escaped in the text format"""
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total", "Events.", ("name",))
+
+    counter.inc('say "hi"\n')
+    counter.inc('say "hi"\n', amount=2)
+
+    assert 'events_total{name="say \\"hi\\"\\n"} 3.0' in registry.render()
+
+
+def test_snapshots_of_other_processes_are_added_up(tmp_path):
+    """A registry with a directory merges the snapshots written by other workers"""
+    registry = MetricsRegistry(directory=str(tmp_path))
+    counter = registry.counter("requests_total", "Requests.", ("route",))
+    counter.inc("/a")
+
+    other_worker = MetricsRegistry()
+    other_worker.counter("requests_total", "Requests.", ("route",)).inc("/a", amount=4)
+    other_worker.counter("requests_total", "Requests.", ("route",)).inc("/b")
+    (tmp_path / "99999999.json").write_text(json.dumps(other_worker.snapshot()))
+
+    text = registry.render()
+
+    assert 'requests_total{route="/a"} 5.0' in text
+    assert 'requests_total{route="/b"} 1.0' in text
+    assert (tmp_path / "99999999.json").exists()
+
+
+def test_snapshots_of_exited_processes_are_retired(tmp_path):
+    """The snapshot of an exited worker is folded into retired.json, keeping its counts"""
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.counter("requests_total", "Requests.", ("route",)).inc("/a")
+
+    for pid, amount in ((99999998, 2), (99999999, 3)):
+        exited_worker = MetricsRegistry()
+        exited_worker.counter("requests_total", "Requests.", ("route",)).inc("/a", amount=amount)
+        (tmp_path / f"{pid}.json").write_text(json.dumps(exited_worker.snapshot()))
+        registry.retire(pid)
+    registry.retire(12345678)
+
+    assert [path.name for path in tmp_path.iterdir()] == ["retired.json"]
+    assert 'requests_total{route="/a"} 6.0' in registry.render()
+
+
+def test_metrics_endpoint_reports_routes_and_backend_calls(flask_test_client, monkeypatch, mock_response):
+    """The gateway exposes route latencies and backend HTTP call timings"""
+
+    def mock_get(_url, **_kwargs):
+        return mock_response([{"product_name": "Spiced Latte"}], 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    flask_test_client.get("/all-products")
+
+    response = flask_test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{service="main_app",method="GET",route="/all-products",status="200"}' in text
+    assert 'upstream_call_duration_seconds_count{service="main_app",system="http",operation="db_app",outcome="success"}' in text
+    assert UPSTREAM_DURATION.snapshot()["values"]
@@ -0,0 +1,107 @@
+"""
+It is a module which tests response compression from response_compression.py
+and its use on the responses relayed by the gateway
+"""
+import gzip
+import zlib
+import pytest
+from response_compression import Compressor, compress, compress_stream, negotiate
+from main_app import main
+from main_app.main import db_client
+
+LARGE_LIST = [{"name": f"Name {i}", "surname": f"Surname {i}", "email": f"user{i}@example.com"} for i in range(200)]
+
+
+def test_negotiate_honors_preference_and_q_values(monkeypatch):
+    """The first configured encoding the client accepts is chosen, q=0 refuses it"""
+    monkeypatch.setenv("COMPRESSION_ENCODINGS", "gzip")
+    assert negotiate("br, gzip;q=0.5") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") == "gzip"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_streamed_chunks_are_decodable_as_they_arrive(encoding):
+    """Each flushed chunk can be decoded without the rest of the stream"""
+    try:
+        Compressor(encoding)
+    except ValueError:
+        pytest.skip(f"{encoding} encoder not installed")
+    chunks = list(compress_stream(iter([b"a" * 1000, b"b" * 1000]), encoding, flush_size=1000))
+
+    assert len(b"".join(chunks)) < 2000
+    if encoding == "gzip":
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert decoder.decompress(chunks[0]) == b"a" * 1000
+        assert decoder.decompress(b"".join(chunks[1:])) == b"b" * 1000
+    elif encoding == "br":
+        brotli = pytest.importorskip("brotli")
+        decoder = brotli.Decompressor()
+        assert decoder.process(chunks[0]) == b"a" * 1000
+        assert decoder.process(b"".join(chunks[1:])) == b"b" * 1000
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        decoder = zstandard.ZstdDecompressor().decompressobj()
+        assert decoder.decompress(chunks[0]) == b"a" * 1000
+        assert decoder.decompress(b"".join(chunks[1:])) == b"b" * 1000
+
+
+def test_gateway_compresses_large_relayed_json(flask_test_client, monkeypatch, mock_response):
+    """Large JSON answers are gzip-encoded for a client that accepts gzip"""
+    monkeypatch.setenv("COMPRESSION_ENCODINGS", "gzip")
+
+    def mock_get(_url, **_kwargs):
+        response = mock_response(LARGE_LIST, 200)
+        response.headers["ETag"] = '"customers-3-abc"'
+        return response
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    monkeypatch.setattr(main, "PASSTHROUGH_PROXY", False)
+    response = flask_test_client.get("/all-customers", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["ETag"] == 'W/"customers-3-abc"'
+    assert main.json.loads(gzip.decompress(response.data)) == LARGE_LIST
+
+
+def test_small_streamed_chunks_are_flushed_together():
+    """Small chunks are compressed together until the flush size is reached"""
+    lines = [b'{"name": "Name %d", "surname": "Surname"}\n' % i for i in range(2000)]
+    whole = compress(b"".join(lines), "gzip")
+
+    per_line = b"".join(compress_stream(iter(lines), "gzip", flush_size=1))
+    buffered = list(compress_stream(iter(lines), "gzip", flush_size=32768))
+
+    assert gzip.decompress(b"".join(buffered)) == b"".join(lines)
+    assert len(b"".join(buffered)) < len(whole) * 1.1 < len(per_line)
+    assert len(buffered) < 10
+
+
+def test_gateway_compresses_streamed_passthrough(flask_test_client, monkeypatch, mock_response):
+    """Passthrough responses are compressed while they stream"""
+    monkeypatch.setenv("COMPRESSION_ENCODINGS", "gzip")
+    monkeypatch.setattr(db_client.session, "post", lambda _url, **_kwargs: mock_response(LARGE_LIST, 201))
+
+    response = flask_test_client.post("/add-customer", json={}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert main.json.loads(gzip.decompress(response.data)) == LARGE_LIST
+
+
+def test_small_or_unaccepted_answers_are_not_compressed(flask_test_client, monkeypatch, mock_response):
+    """Bodies under the size threshold and clients without Accept-Encoding get identity"""
+    monkeypatch.setattr(db_client.session, "get", lambda _url, **_kwargs: mock_response(LARGE_LIST, 200))
+    monkeypatch.setattr(main, "PASSTHROUGH_PROXY", False)
+
+    assert "Content-Encoding" not in flask_test_client.get("/all-customers").headers
+    small = flask_test_client.get("/mail-queue-stats", headers={"Accept-Encoding": "gzip"})
+    assert len(small.data) < 1024
+    assert "Content-Encoding" not in small.headers
+
+
+def test_compress_round_trips_gzip():
+    """A whole body compressed at an explicit level decodes to the original"""
+    assert gzip.decompress(compress(b"x" * 5000, "gzip", level=9)) == b"x" * 5000
@@ -0,0 +1,157 @@
+"""
+It is a module which tests request coalescing from singleflight.py
+and its use for backend GETs in the gateway
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from singleflight import SingleFlight
+from main_app.main import app, db_client
+
+
+def run_concurrently(count, function):
+    """Call function from count threads at once and return the results"""
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(function) for _ in range(count)]
+        return [future.result() for future in futures]
+
+
+def test_concurrent_calls_share_one_execution():
+    """Callers arriving while a call is in flight get its result"""
+    flight = SingleFlight("test")
+    release = threading.Event()
+    executions = []
+
+    def slow_call():
+        executions.append(1)
+        release.wait(5)
+        return {"value": 42}
+
+    def caller():
+        return flight.do("key", slow_call)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(caller) for _ in range(8)]
+        while flight.stats()["requests"] < 8:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(executions) == 1
+    assert all(result == {"value": 42} for result in results)
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 7
+    assert stats["in_flight"] == 0
+
+
+def test_error_is_raised_in_every_waiter_and_key_is_released():
+    """A failing shared call fails all of its callers, the next call runs again"""
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing_call():
+        release.wait(5)
+        raise ValueError("backend down")
+
+    def caller():
+        try:
+            flight.do("key", failing_call)
+        except ValueError as e:
+            return str(e)
+        return None
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(caller) for _ in range(4)]
+        while flight.stats()["requests"] < 4:
+            time.sleep(0.01)
+        release.set()
+        assert [future.result() for future in futures] == ["backend down"] * 4
+
+    assert flight.do("key", lambda: "fresh") == "fresh"
+    assert flight.stats()["executions"] == 2
+    assert flight.stats()["errors"] == 1
+
+
+def test_different_keys_are_not_coalesced():
+    """Only identical keys share a call"""
+    flight = SingleFlight("test")
+
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["coalesced"] == 0
+
+
+@pytest.fixture
+def slow_products(monkeypatch, mock_response):
+    """Make db_app answer /all-products slowly and count the upstream calls"""
+    calls = []
+
+    def mock_get(_url, **_kwargs):
+        calls.append(_kwargs.get("params"))
+        time.sleep(0.2)
+        return mock_response([{"product_name": "Spiced Latte"}], 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    return calls
+
+
+def test_gateway_coalesces_identical_gets(flask_test_client, slow_products):
+    """Identical concurrent /all-products requests reach db_app once"""
+    before = db_client.flight.stats()["coalesced"]
+
+    def fetch():
+        response = app.test_client().get("/all-products?limit=5")
+        return response.status_code, response.get_json()
+
+    results = run_concurrently(6, fetch)
+
+    assert results == [(200, [{"product_name": "Spiced Latte"}])] * 6
+    assert slow_products == [{"limit": "5"}]
+    assert db_client.flight.stats()["coalesced"] - before == 5
+
+    stats = flask_test_client.get("/coalescing-stats").json
+    assert stats["db_app"]["coalesced"] >= 5
+
+
+def test_waiters_keep_their_own_budget(flask_test_client, monkeypatch, mock_response):
+    """A waiter is not failed by a leader that ran out of its shorter budget, and a
+    waiter with a short budget does not wait for a slower leader"""
+    calls = []
+
+    def mock_get(_url, timeout, **_kwargs):
+        calls.append(timeout)
+        if timeout < 0.3:
+            time.sleep(timeout)
+            raise requests.exceptions.ReadTimeout("read timed out")
+        time.sleep(0.3)
+        return mock_response([{"product_name": "Spiced Latte"}], 200)
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+
+    def fetch(budget_ms):
+        start = time.monotonic()
+        response = app.test_client().get("/all-products?limit=5", headers={"X-Request-Budget-Ms": str(budget_ms)})
+        return response.status_code, time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        short_leader = executor.submit(fetch, 150)
+        while not calls:
+            time.sleep(0.01)
+        long_waiter = executor.submit(fetch, 2000)
+        assert short_leader.result()[0] != 200
+        assert long_waiter.result()[0] == 200
+    assert len(calls) == 2
+
+    calls.clear()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        long_leader = executor.submit(fetch, 2000)
+        while not calls:
+            time.sleep(0.01)
+        short_waiter = executor.submit(fetch, 100)
+        status, seconds = short_waiter.result()
+        assert status != 200
+        assert seconds < 0.25
+        assert long_leader.result()[0] == 200
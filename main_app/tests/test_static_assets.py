@@ -0,0 +1,125 @@
+"""
+It is a module which tests the static asset build from build_static.py
+and the serving of built assets from static_assets.py
+"""
+import gzip
+import pytest
+from flask import Flask, url_for
+from build_static import build
+from static_assets import StaticAssets, IMMUTABLE_CACHE_CONTROL
+
+ICON_CSS = ('.fa-github:before{content:"\\f09b"}.fa-gitlab:before{content:"\\f296"}'
+            '@font-face{src:url(../webfonts/icons.svg#fontawesome) format("svg")}')
+SVG_FONT = ('<svg><defs><font>\n'
+            '<glyph glyph-name="github" unicode="&#xf09b;"\nd="M1 1" />\n'
+            '<glyph glyph-name="gitlab" unicode="&#xf296;"\nd="M2 2" />\n'
+            '</font></defs></svg>')
+
+
+@pytest.fixture
+def static_build(tmp_path):
+    """Build a small static tree and return (source_dir, output_dir, manifest)"""
+    source = tmp_path / "static"
+    (source / "css").mkdir(parents=True)
+    (source / "js").mkdir()
+    (source / "webfonts").mkdir()
+    (source / "sass").mkdir()
+    (source / "css" / "icons.css").write_text(ICON_CSS)
+    (source / "css" / "main.css").write_text(
+        '@import url("icons.css");\n@import url("https://fonts.example.com/css");\nbody { color: red; }\n'
+    )
+    (source / "js" / "main.js").write_text("console.log('hello');\n" * 200)
+    (source / "webfonts" / "icons.svg").write_text(SVG_FONT)
+    (source / "sass" / "main.scss").write_text("body { color: red; }")
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "home.html").write_text(
+        '<a class="icon brands fa-github"></a><!-- <a class="icon brands fa-gitlab"></a> -->'
+    )
+
+    output = tmp_path / "static_build"
+    manifest = build(str(source), str(output), str(templates))
+    return source, output, manifest
+
+
+@pytest.fixture
+def static_client(static_build):
+    """Flask app serving the built assets"""
+    source, output, _ = static_build
+    app = Flask(__name__, static_folder=str(source))
+    StaticAssets(str(output)).init_app(app)
+    return app
+
+
+def test_build_fingerprints_and_rewrites_css(static_build):
+    """Files get hashed names and stylesheets point at the hashed names"""
+    _, output, manifest = static_build
+
+    assert set(manifest) == {"css/icons.css", "css/main.css", "js/main.js", "webfonts/icons.svg"}
+    assert manifest["js/main.js"].startswith("js/main.") and manifest["js/main.js"].endswith(".js")
+
+    main_css = (output / manifest["css/main.css"]).read_text()
+    assert f'url("{manifest["css/icons.css"].split("/")[1]}")' in main_css
+    assert "https://fonts.example.com/css" in main_css
+    icons_css = (output / manifest["css/icons.css"]).read_text()
+    assert f'url(../{manifest["webfonts/icons.svg"]}#fontawesome)' in icons_css
+
+
+def test_build_subsets_svg_font_and_precompresses(static_build):
+    """Only glyphs used by the templates are kept, text assets get a gzip variant"""
+    _, output, manifest = static_build
+
+    font = (output / manifest["webfonts/icons.svg"]).read_text()
+    assert 'glyph-name="github"' in font
+    assert 'glyph-name="gitlab"' not in font
+
+    script = output / manifest["js/main.js"]
+    with gzip.open(str(script) + ".gz") as compressed:
+        assert compressed.read() == script.read_bytes()
+
+
+def test_url_for_returns_hashed_name(static_client, static_build):
+    """url_for('static') resolves logical names through the manifest"""
+    _, _, manifest = static_build
+    with static_client.test_request_context():
+        assert url_for("static", filename="js/main.js") == "/static/" + manifest["js/main.js"]
+        assert url_for("static", filename="images/missing.png") == "/static/images/missing.png"
+
+
+def test_serves_precompressed_variant(static_client, static_build):
+    """A client accepting gzip gets the .gz variant with immutable caching"""
+    _, output, manifest = static_build
+    client = static_client.test_client()
+
+    response = client.get("/static/" + manifest["js/main.js"], headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.mimetype in ("text/javascript", "application/javascript")
+    assert gzip.decompress(response.data) == (output / manifest["js/main.js"]).read_bytes()
+    response.close()
+
+
+def test_serves_identity_without_accept_encoding(static_client, static_build):
+    """Clients without compression support get the plain file"""
+    _, output, manifest = static_build
+    client = static_client.test_client()
+
+    response = client.get("/static/" + manifest["js/main.js"], headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.data == (output / manifest["js/main.js"]).read_bytes()
+    response.close()
+
+
+def test_unhashed_name_falls_back_to_source(static_client):
+    """Old unhashed URLs are still served from the source folder"""
+    client = static_client.test_client()
+
+    response = client.get("/static/js/main.js")
+
+    assert response.status_code == 200
+    assert "immutable" not in response.headers.get("Cache-Control", "")
+    response.close()
@@ -0,0 +1,52 @@
+"""
+It is a module which tests the streaming multipart body from streaming_multipart.py
+"""
+import io
+from werkzeug.formparser import parse_form_data
+from streaming_multipart import MultipartFileStream
+
+
+def parse_body(stream):
+    """Parse a multipart body the way the webcamera service does"""
+    body = b''.join(stream)
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': stream.content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }
+    _, _, files = parse_form_data(environ)
+    return body, files
+
+
+def test_multipart_stream_round_trip():
+    """The streamed body is a valid multipart form with the original file"""
+    payload = bytes(range(256)) * 1000
+    stream = MultipartFileStream('image', 'photo.jpg', io.BytesIO(payload), 'image/jpeg', chunk_size=4096)
+
+    body, files = parse_body(stream)
+
+    assert len(body) == len(stream)
+    assert files['image'].filename == 'photo.jpg'
+    assert files['image'].mimetype == 'image/jpeg'
+    assert files['image'].read() == payload
+
+
+def test_multipart_stream_reads_bounded_chunks():
+    """Reads never return more than the requested size"""
+    stream = MultipartFileStream('image', 'photo.jpg', io.BytesIO(b'x' * 100000), chunk_size=1024)
+
+    sizes = [len(chunk) for chunk in stream]
+
+    assert max(sizes) == 1024
+    assert sum(sizes) == len(stream)
+
+
+def test_multipart_stream_starts_at_current_position():
+    """Only the unread part of the file is sent"""
+    file_obj = io.BytesIO(b'skipped-image')
+    file_obj.read(8)
+
+    _, files = parse_body(MultipartFileStream('image', 'a"b.jpg', file_obj))
+
+    assert files['image'].read() == b'image'
@@ -0,0 +1,55 @@
+"""
+It is a module which tests trace propagation and Server-Timing from tracing.py
+and backend_client.py
+"""
+import json
+from tracing import parse_server_timing
+from main_app.main import db_client
+
+
+def test_parse_server_timing():
+    """Entries are split into name, duration and description"""
+    header = 'total;dur=12.5, dynamodb.Query;dur=7.0;desc="3 calls", cache'
+
+    assert parse_server_timing(header) == [
+        ("total", 12.5, ""),
+        ("dynamodb.Query", 7.0, "3 calls"),
+        ("cache", 0.0, "")
+    ]
+
+
+def test_gateway_forwards_trace_id_and_backend_timings(flask_test_client, monkeypatch, mock_response):
+    """The trace ID is sent to db_app and its Server-Timing is reported under its name"""
+    sent_headers = []
+
+    def mock_get(_url, **kwargs):
+        sent_headers.append(kwargs["headers"])
+        response = mock_response([{"name": "Ann"}], 200)
+        response.headers["Server-Timing"] = 'total;dur=9.0, dynamodb.Query;dur=6.0;desc="2 calls"'
+        return response
+
+    monkeypatch.setattr(db_client.session, "get", mock_get)
+    response = flask_test_client.get("/search-customers?surname=Lee", headers={"X-Trace-Dump": "1"})
+
+    trace_id = response.headers["X-Trace-Id"]
+    assert sent_headers[0]["X-Trace-Id"] == trace_id
+    server_timing = response.headers["Server-Timing"]
+    assert "http.db_app;dur=" in server_timing
+    assert "db_app.total;dur=9.0" in server_timing
+    assert "db_app.dynamodb.Query;dur=6.0" in server_timing
+
+    dump = json.loads(response.headers["X-Trace-Spans"])
+    assert dump["trace_id"] == trace_id
+    assert dump["service"] == "main_app"
+    remote = [span for span in dump["spans"] if span["name"] == "db_app.dynamodb.Query"]
+    assert remote[0]["attributes"] == {"remote": True, "description": "2 calls"}
+
+
+def test_caller_trace_id_is_kept(flask_test_client):
+    """A valid incoming trace ID is reused, an invalid one is replaced"""
+    kept = flask_test_client.get("/pool-stats", headers={"X-Trace-Id": "abc123def456"})
+    replaced = flask_test_client.get("/pool-stats", headers={"X-Trace-Id": "bad id!"})
+
+    assert kept.headers["X-Trace-Id"] == "abc123def456"
+    assert replaced.headers["X-Trace-Id"] != "bad id!"
+    assert "X-Trace-Spans" not in kept.headers
@@ -0,0 +1,69 @@
+"""
+It is a module which tests the TTL/LRU cache from ttl_cache.py
+"""
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+def test_cache_hit_and_miss():
+    """Stored values are returned and lookups are counted"""
+    cache = TTLCache("test", ttl=60)
+
+    assert cache.get("python") is None
+    cache.set("python", {"title": "Python"}, size=10)
+    entry = cache.get("python")
+
+    assert entry.value == {"title": "Python"}
+    assert not entry.negative
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 10
+
+
+def test_cache_entries_expire(monkeypatch):
+    """Entries expire after their ttl, negative entries after negative_ttl"""
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache("test", ttl=60, negative_ttl=5)
+
+    cache.set("found", "article", size=1)
+    cache.set("missing", "not found", size=1, negative=True)
+    now[0] += 10
+
+    assert cache.get("found").value == "article"
+    assert cache.get("missing") is None
+
+    now[0] += 60
+    assert cache.get("found") is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_cache_evicts_least_recently_used():
+    """The least recently used entry is evicted when max_entries is exceeded"""
+    cache = TTLCache("test", ttl=60, max_entries=2)
+
+    cache.set("a", 1, size=1)
+    cache.set("b", 2, size=1)
+    cache.get("a")
+    cache.set("c", 3, size=1)
+
+    assert cache.get("b") is None
+    assert cache.get("a").value == 1
+    assert cache.get("c").value == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_respects_byte_limit():
+    """Entries are evicted to stay under max_bytes and oversized values are skipped"""
+    cache = TTLCache("test", ttl=60, max_bytes=100)
+
+    cache.set("a", "x", size=60)
+    cache.set("b", "y", size=60)
+    cache.set("huge", "z", size=101)
+
+    assert cache.get("a") is None
+    assert cache.get("b").value == "y"
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] == 60
@@ -0,0 +1,112 @@
+'''This module provides a small thread-safe in-process cache for main_app.
+Entries expire after a time to live, the least recently used entries are
+evicted when the entry count or the total size in bytes exceeds its limits,
+and hit/miss counters are kept for the stats endpoint.'''
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple
+
+
+class CacheEntry(NamedTuple):
+    '''A cached value with its size, expiry time and negative flag.'''
+    value: Any
+    size: int
+    expires_at: float
+    negative: bool
+
+
+class TTLCache:
+    '''A bounded LRU cache whose entries expire after a time to live.'''
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 1024,
+        max_bytes: int = 4 * 1024 * 1024,
+        negative_ttl: float | None = None
+    ) -> None:
+        '''Create an empty cache. Negative entries (e.g. "not found" answers)
+        use negative_ttl, which defaults to ttl.'''
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable) -> CacheEntry | None:
+        '''Return the live entry for key and mark it as recently used, or None on a miss.'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.negative:
+                self._negative_hits += 1
+            else:
+                self._hits += 1
+            return entry
+
+    def set(self, key: Hashable, value: Any, size: int, negative: bool = False, ttl: float | None = None) -> None:
+        '''Store value under key. Values larger than max_bytes are not cached.'''
+        if size > self.max_bytes:
+            return
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, size, time.monotonic() + ttl, negative)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        '''Drop every entry and reset the counters.'''
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = self._negative_hits = self._misses = 0
+            self._evictions = self._expirations = 0
+
+    def _remove(self, key: Hashable) -> None:
+        '''Remove key from the cache. The caller must hold the lock.'''
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> dict[str, Any]:
+        '''Return the cache counters and current size.'''
+        with self._lock:
+            lookups = self._hits + self._negative_hits + self._misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl,
+                'hits': self._hits,
+                'negative_hits': self._negative_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'hit_ratio': round((self._hits + self._negative_hits) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,317 @@
+'''This module provides request and upstream-call metrics for the Flask services.
+It is shared by main_app, db_app, webcamera_app and wiki_app: the original lives
+in shared/metrics.py and is copied into every service by `make sync-shared`.
+
+Counters and latency histograms are kept in memory and served in the Prometheus
+text format on /metrics. Recording a sample is a bucket lookup and an increment
+under a lock. When METRICS_DIR is set (gunicorn.conf.py sets it), every worker
+process writes a snapshot of its metrics there at most once per flush interval,
+and /metrics adds up the snapshots of all workers, so a scrape that reaches any
+worker sees the whole service. When a worker exits, gunicorn's child_exit hook
+calls mark_process_dead, which folds its snapshot into retired.json, so the
+totals keep counting while exited and recycled workers leave no files behind.'''
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+from flask import Flask, Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+RETIRED_SNAPSHOT = 'retired.json'
+
+
+class Metric:
+    '''Base class of a metric family with a fixed list of label names.'''
+    kind = ''
+
+    def __init__(self, metrics_registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: tuple[str, ...]) -> None:
+        self.registry = metrics_registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], Any] = {}
+
+    def snapshot(self) -> dict[str, Any]:
+        '''Return the metric as a JSON-serializable dict.'''
+        with self.registry.lock:
+            values = [[list(labels), value if not isinstance(value, list) else list(value)]
+                      for labels, value in self._values.items()]
+        return {'type': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames),
+                'values': values}
+
+
+class Counter(Metric):
+    '''A monotonically increasing count.'''
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        '''Add amount to the counter of the given label values.'''
+        with self.registry.lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Histogram(Metric):
+    '''A distribution of observed values over fixed buckets.'''
+    kind = 'histogram'
+
+    def __init__(self, metrics_registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(metrics_registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        '''Record one value for the given label values.'''
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            row = self._values.get(labels)
+            if row is None:
+                # one count per bucket, one for +Inf, then the sum of values
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def snapshot(self) -> dict[str, Any]:
+        '''Return the histogram, including its buckets, as a JSON-serializable dict.'''
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+class MetricsRegistry:
+    '''A set of metrics rendered together, optionally shared between processes.'''
+    def __init__(self, directory: str | None = None, flush_interval: float = 1.0) -> None:
+        '''Create an empty registry. With a directory, snapshots of this process
+        are written there and merged with those of the other processes.'''
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.const_labels: dict[str, str] = {}
+        self._metrics: dict[str, Metric] = {}
+        self._last_flush = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        '''Register a counter, or return the one registered under that name.'''
+        if name not in self._metrics:
+            self._metrics[name] = Counter(self, name, documentation, labelnames)
+        metric = self._metrics[name]
+        assert isinstance(metric, Counter)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        '''Register a histogram, or return the one registered under that name.'''
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(self, name, documentation, labelnames, buckets)
+        metric = self._metrics[name]
+        assert isinstance(metric, Histogram)
+        return metric
+
+    def snapshot(self) -> dict[str, Any]:
+        '''Return all metrics of this process as a JSON-serializable dict.'''
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def maybe_flush(self) -> None:
+        '''Write the snapshot of this process if the flush interval has passed.'''
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Write the snapshot of this process to the shared directory.'''
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def collect(self) -> dict[str, Any]:
+        '''Return the snapshot of this process added up with those of the other processes.'''
+        merged = self.snapshot()
+        if not self.directory:
+            return merged
+        own_file = f'{os.getpid()}.json'
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json') or name == own_file:
+                continue
+            _merge_snapshot(merged, _read_snapshot(os.path.join(self.directory, name)))
+        return merged
+
+    def retire(self, pid: int) -> None:
+        '''Fold the snapshot of a process that exited into the retired snapshot and remove its file.'''
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{pid}.json')
+        if not os.path.exists(path):
+            return
+        retired_path = os.path.join(self.directory, RETIRED_SNAPSHOT)
+        retired = _read_snapshot(retired_path)
+        _merge_snapshot(retired, _read_snapshot(path))
+        tmp_path = f'{retired_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(retired, snapshot_file)
+            os.replace(tmp_path, retired_path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def render(self) -> str:
+        '''Return all metrics in the Prometheus text exposition format.'''
+        self.flush()
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            for labels, value in metric['values']:
+                pairs = list(self.const_labels.items()) + list(zip(metric['labelnames'], labels))
+                if metric['type'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else _format_number(bound)
+                        lines.append(f'{name}_bucket{_format_labels(pairs + [("le", le)])} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(pairs)} {_format_number(value[-1])}')
+                    lines.append(f'{name}_count{_format_labels(pairs)} {cumulative}')
+                else:
+                    lines.append(f'{name}{_format_labels(pairs)} {_format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _read_snapshot(path: str) -> dict[str, Any]:
+    '''Read a snapshot file; a missing or unreadable one is empty.'''
+    try:
+        with open(path, encoding='utf-8') as snapshot_file:
+            snapshot: dict[str, Any] = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return {}
+    return snapshot
+
+
+def _merge_snapshot(target: dict[str, Any], other: dict[str, Any]) -> None:
+    '''Add the metrics of another snapshot to a snapshot.'''
+    for metric_name, metric in other.items():
+        _merge_metric(target.setdefault(metric_name, {**metric, 'values': []}), metric)
+
+
+def _merge_metric(target: dict[str, Any], other: dict[str, Any]) -> None:
+    '''Add the values of another process to a metric snapshot.'''
+    rows = {tuple(labels): value for labels, value in target['values']}
+    for labels, value in other['values']:
+        key = tuple(labels)
+        if key not in rows:
+            rows[key] = value
+        elif isinstance(value, list):
+            rows[key] = [mine + theirs for mine, theirs in zip(rows[key], value)]
+        else:
+            rows[key] = rows[key] + value
+    target['values'] = [[list(labels), value] for labels, value in rows.items()]
+
+
+def _format_labels(pairs: list[tuple[str, Any]]) -> str:
+    '''Format label pairs as {name="value",...}, escaping the values.'''
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _escape(value: Any) -> str:
+    '''Escape a label value for the text exposition format.'''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: float) -> str:
+    '''Format a sample value the way Prometheus expects.'''
+    return repr(float(value))
+
+
+registry = MetricsRegistry(
+    directory=os.getenv('METRICS_DIR') or None,
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+)
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds',
+    'Time to handle an HTTP request, by route, method and status.',
+    ('method', 'route', 'status')
+)
+UPSTREAM_DURATION = registry.histogram(
+    'upstream_call_duration_seconds',
+    'Time of calls to upstream systems (DynamoDB, S3, Wikipedia, backend HTTP).',
+    ('system', 'operation', 'outcome')
+)
+
+
+def mark_process_dead(pid: int) -> None:
+    '''Retire the snapshot of a worker process that exited; called from gunicorn's child_exit hook.'''
+    registry.retire(pid)
+
+
+def observe_upstream(system: str, operation: str, seconds: float, success: bool = True) -> None:
+    '''Record one call to an upstream system.'''
+    UPSTREAM_DURATION.observe(seconds, system, operation, 'success' if success else 'error')
+
+
+@contextmanager
+def time_upstream(system: str, operation: str) -> Iterator[None]:
+    '''Time the enclosed block as one upstream call; an exception marks it as an error.'''
+    start = time.perf_counter()
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        observe_upstream(system, operation, time.perf_counter() - start, success)
+
+
+def instrument_boto3_client(client: Any, system: str) -> None:
+    '''Time every API call made through a boto3 client, by operation name.'''
+    def start_timer(context: dict[str, Any], **_kwargs: Any) -> None:
+        context['metrics_start'] = time.perf_counter()
+
+    def record(context: dict[str, Any], event_name: str, http_response: Any = None, **_kwargs: Any) -> None:
+        # after-call-error carries no model, the operation is the last part of the event name
+        start = context.pop('metrics_start', None)
+        if start is not None:
+            success = http_response is not None and http_response.status_code < 400
+            observe_upstream(system, event_name.rsplit('.', 1)[-1], time.perf_counter() - start, success)
+
+    client.meta.events.register('before-call', start_timer)
+    client.meta.events.register('after-call', record)
+    client.meta.events.register('after-call-error', record)
+
+
+def instrument_app(app: Flask, service: str) -> None:
+    '''Time every request of a Flask app by route and serve the metrics on /metrics.'''
+    registry.const_labels['service'] = service
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+        registry.maybe_flush()
+        return response
+
+    def metrics() -> Response:
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,193 @@
+'''This module provides negotiated response compression for the Flask services.
+It is shared by main_app, db_app, webcamera_app and wiki_app: the original lives
+in shared/response_compression.py and is copied into every service by `make sync-shared`.
+
+Responses with a compressible content type are encoded with the best encoding
+the client accepts, from COMPRESSION_ENCODINGS (zstd, br and gzip by default).
+zstd and br are used only when the zstandard and brotli packages are installed;
+gzip is always available. Buffered bodies smaller than COMPRESSION_MIN_SIZE
+bytes are sent as they are. Streamed bodies are compressed as they are produced
+and flushed once COMPRESSION_FLUSH_SIZE bytes have been fed since the last flush,
+or when a chunk arrives COMPRESSION_FLUSH_INTERVAL seconds after it; flushing
+every small chunk (e.g. every NDJSON line) would cost most of the compression.
+
+A compressed response carries a weak ETag (W/"..."), since its bytes differ
+from the identity encoding. If-None-Match uses the weak comparison, so the
+weak tag still revalidates against the version it came from.'''
+import os
+import time
+import zlib
+import importlib
+from types import ModuleType
+from typing import Callable, Iterable, Iterator
+from flask import Flask, Response, request
+
+
+def _optional_module(name: str) -> ModuleType | None:
+    '''Import an optional encoder package, or return None when it is not installed.'''
+    try:
+        return importlib.import_module(name)
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+
+
+brotli = _optional_module('brotli')
+zstandard = _optional_module('zstandard')
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript',
+                      'application/xml', 'image/svg+xml', 'text/')
+MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+FLUSH_SIZE = int(os.getenv('COMPRESSION_FLUSH_SIZE', '32768'))
+FLUSH_INTERVAL = float(os.getenv('COMPRESSION_FLUSH_INTERVAL', '1.0'))
+LEVELS = {
+    'gzip': int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')),
+    'br': int(os.getenv('COMPRESSION_BR_LEVEL', '4')),
+    'zstd': int(os.getenv('COMPRESSION_ZSTD_LEVEL', '3'))
+}
+
+
+class Compressor:
+    '''An incremental encoder: compress() returns the bytes ready so far, flush() ends a chunk
+    so it can be decoded without what follows, finish() ends the stream.'''
+    def __init__(self, encoding: str, level: int | None = None) -> None:
+        '''Start a stream in the given encoding, at its configured level unless one is given.'''
+        self.encoding = encoding
+        level = LEVELS[encoding] if level is None else level
+        self._compress: Callable[[bytes], bytes]
+        self._flush: Callable[[], bytes]
+        self._finish: Callable[[], bytes]
+        if encoding == 'gzip':
+            gzip_encoder = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = gzip_encoder.compress
+            self._flush = lambda: gzip_encoder.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = gzip_encoder.flush
+        elif encoding == 'br' and brotli is not None:
+            br_encoder = brotli.Compressor(quality=level)
+            self._compress = br_encoder.process
+            self._flush = br_encoder.flush
+            self._finish = br_encoder.finish
+        elif encoding == 'zstd' and zstandard is not None:
+            zstd_module = zstandard
+            zstd_encoder = zstd_module.ZstdCompressor(level=level).compressobj()
+            self._compress = zstd_encoder.compress
+            self._flush = lambda: zstd_encoder.flush(zstd_module.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = zstd_encoder.flush
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        '''Feed data to the encoder.'''
+        return self._compress(data)
+
+    def flush(self) -> bytes:
+        '''Return everything fed so far in a decodable form.'''
+        return self._flush()
+
+    def finish(self) -> bytes:
+        '''End the stream.'''
+        return self._finish()
+
+
+def available_encodings() -> list[str]:
+    '''Return the configured encodings that can be produced, in order of preference.'''
+    configured = os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',')
+    installed = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [encoding.strip() for encoding in configured if installed.get(encoding.strip())]
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    '''Pick the preferred available encoding the client accepts with a non-zero q value.'''
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        key, _, value = params.strip().partition('=')
+        if key.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, level: int | None = None) -> bytes:
+    '''Compress a whole body.'''
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(
+    chunks: Iterable[str | bytes],
+    encoding: str,
+    flush_size: int = FLUSH_SIZE,
+    flush_interval: float = FLUSH_INTERVAL
+) -> Iterator[bytes]:
+    '''Compress a streamed body, flushing once flush_size bytes have been fed since the
+    last flush, or when a chunk arrives flush_interval seconds after it.'''
+    compressor = Compressor(encoding)
+    unflushed = 0
+    last_flush = time.monotonic()
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            unflushed += len(chunk)
+            if unflushed >= flush_size or time.monotonic() - last_flush >= flush_interval:
+                data += compressor.flush()
+                unflushed = 0
+                last_flush = time.monotonic()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def is_compressible(response: Response) -> bool:
+    '''Tell whether a response may be compressed at all.'''
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_response(response: Response) -> Response:
+    '''Encode a response for the client of the current request, if it is worth it.'''
+    if not is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+    if encoding is None or request.method == 'HEAD':
+        return response
+    if response.is_streamed:
+        length = response.headers.get('Content-Length')
+        if length is not None and int(length) < MIN_SIZE:
+            return response
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < MIN_SIZE:
+            return response
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def compress_app(app: Flask) -> None:
+    '''Compress the responses of a Flask app according to the client's Accept-Encoding.'''
+    app.after_request(compress_response)
@@ -1,12 +1,15 @@
 '''This module provides functionality for interacting with an AWS S3 bucket. 
 It allows uploading image bytes to S3 and generating a presigned URL to 
-access the uploaded object.'''
+access the uploaded object or an object uploaded earlier.'''
 import os
 import io
 import logging
+from typing import IO
 from dotenv import load_dotenv
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
+from metrics import instrument_boto3_client
+from tracing import trace_boto3_client
 
 load_dotenv()
 LOGGER = logging.getLogger(__name__)
@@ -27,6 +30,8 @@ class S3Handler:
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY
         )
+        instrument_boto3_client(self.s3_client, 's3')
+        trace_boto3_client(self.s3_client, 's3')
         LOGGER.info("Initialized S3Handler with AWS credentials, AWS_DEFAULT_REGION=%s, AWS_ACCESS_KEY_ID=%s, AWS_SECRET_ACCESS_KEY=%s", AWS_DEFAULT_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
 
     def upload_bytes_and_get_presigned_url(
@@ -36,7 +41,15 @@ class S3Handler:
         expiration: int = 3600
     ) -> str:
         '''Uploads image bytes to S3 and returns a presigned URL for the object.'''
-        file_obj = io.BytesIO(image_bytes)
+        return self.upload_fileobj_and_get_presigned_url(io.BytesIO(image_bytes), object_name, expiration)
+
+    def upload_fileobj_and_get_presigned_url(
+        self,
+        file_obj: IO[bytes],
+        object_name: str,
+        expiration: int = 3600
+    ) -> str:
+        '''Streams a file object to S3 in parts and returns a presigned URL for the object.'''
         try:
             LOGGER.info("Uploading %s to S3", object_name)
             self.s3_client.upload_fileobj(file_obj, S3_BUCKET, object_name)
@@ -51,3 +64,22 @@ class S3Handler:
         except (BotoCoreError, ClientError) as e:
             LOGGER.error("Failed to upload or generate URL: %s", e)
             raise RuntimeError(f"Failed to upload or generate URL: {str(e)}") from e
+
+    def get_presigned_url(self, object_name: str, expiration: int = 3600) -> str | None:
+        '''Returns a presigned URL for an existing object, or None when the object does not exist.'''
+        try:
+            self.s3_client.head_object(Bucket=S3_BUCKET, Key=object_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                LOGGER.info("Object %s not found", object_name)
+                return None
+            LOGGER.error("Failed to look up object: %s", e)
+            raise RuntimeError(f"Failed to look up object: {str(e)}") from e
+        except BotoCoreError as e:
+            LOGGER.error("Failed to look up object: %s", e)
+            raise RuntimeError(f"Failed to look up object: {str(e)}") from e
+        return str(self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': S3_BUCKET, 'Key': object_name},
+            ExpiresIn=expiration
+        ))
@@ -3,12 +3,14 @@
 - Error handling works when an image file is missing or an S3 upload fails.'''
 from unittest.mock import patch
 from io import BytesIO
+from metrics import instrument_boto3_client
+from s3_handler import S3_BUCKET
 
 def test_upload_image_success(test_client, mock_s3_handler):
     """Test successful image upload to S3."""
     mock_url = "https://mock-s3-url"
 
-    with patch.object(mock_s3_handler, "upload_bytes_and_get_presigned_url", return_value=mock_url):
+    with patch.object(mock_s3_handler, "upload_fileobj_and_get_presigned_url", return_value=mock_url):
         with patch("webcamera_app.webcamera_app.s3_handler", mock_s3_handler):
             data = {"image": (BytesIO(b"test_image_data"), "test.jpg")}
             response = test_client.post("/upload", data=data, content_type="multipart/form-data")
@@ -26,10 +28,40 @@ def test_upload_image_no_file(test_client):
 
 def test_upload_image_s3_failure(test_client, mock_s3_handler):
     """Test handling of an S3 upload failure."""
-    with patch.object(mock_s3_handler, "upload_bytes_and_get_presigned_url", side_effect=Exception("S3 upload failed")):
+    with patch.object(mock_s3_handler, "upload_fileobj_and_get_presigned_url", side_effect=Exception("S3 upload failed")):
         with patch("webcamera_app.webcamera_app.s3_handler", mock_s3_handler):
             data = {"image": (BytesIO(b"test_image_data"), "test.jpg")}
             response = test_client.post("/upload", data=data, content_type="multipart/form-data")
 
             assert response.status_code == 500
             assert "Upload failed: S3 upload failed" in response.json["error"]
+
+
+def test_metrics_endpoint(test_client, mock_s3_client):
+    """Test that S3 calls of an instrumented client are exposed on /metrics."""
+    instrument_boto3_client(mock_s3_client, "s3")
+    mock_s3_client.put_object(Bucket="webcamera-app-hu2119tru05", Key="image.jpg", Body=b"data")
+
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'service="webcamera_app",system="s3",operation="PutObject",outcome="success"' in text
+
+
+def test_download_url(test_client, mock_s3_handler, mock_s3_client):
+    """Test that /download signs existing objects and answers 404 for missing ones."""
+    mock_s3_client.create_bucket(
+        Bucket=S3_BUCKET,
+        CreateBucketConfiguration={"LocationConstraint": "eu-central-1"},
+    )
+    mock_s3_client.put_object(Bucket=S3_BUCKET, Key="image.jpg", Body=b"data")
+
+    with patch("webcamera_app.webcamera_app.s3_handler", mock_s3_handler):
+        found = test_client.get("/download/image.jpg")
+        missing = test_client.get("/download/missing.jpg")
+
+    assert found.status_code == 200
+    assert "image.jpg" in found.json["url"]
+    assert found.json["expires_in"] == 3600
+    assert missing.status_code == 404
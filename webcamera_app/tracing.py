@@ -0,0 +1,248 @@
+'''This module provides per-request tracing for the Flask services.
+It is shared by main_app, db_app, webcamera_app and wiki_app: the original lives
+in shared/tracing.py and is copied into every service by `make sync-shared`.
+
+Every request gets a trace ID, taken from the X-Trace-Id header of the caller or
+created when there is none (so main_app creates it and the backends reuse it).
+DynamoDB, S3 and HTTP calls made while handling the request are recorded as
+timed spans. The response carries the trace ID and a Server-Timing header with
+the spans added up by name. A backend's Server-Timing header is read back by
+the caller and its entries are added under the backend's name, so the gateway
+shows the HTTP hop and the calls made inside the backend side by side.
+
+A JSON dump of the spans is returned in the X-Trace-Spans header when the
+request sends `X-Trace-Dump: 1`, and logged for every request when
+TRACE_LOG_SPANS is true.
+
+The gateway also sends the time left of its own request budget in the
+X-Request-Budget-Ms header. It becomes the deadline of the trace: the backends
+cut their call timeouts to it with budget_timeout, no DynamoDB or S3 call (or
+retry of one) is sent after it, and a request that runs out of it is answered 504.'''
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+from flask import Flask, Response, jsonify, request
+
+TRACE_HEADER = 'X-Trace-Id'
+BUDGET_HEADER = 'X-Request-Budget-Ms'
+DUMP_HEADER = 'X-Trace-Dump'
+SPANS_HEADER = 'X-Trace-Spans'
+TRACE_ID_RE = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+SERVER_TIMING_NAME_RE = re.compile(r'[^A-Za-z0-9!#$%&\'*+.^_`|~-]')
+LOG_SPANS = os.getenv('TRACE_LOG_SPANS', 'false').lower() in ('1', 'true')
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BudgetExceededError(Exception):
+    '''Raised when a call is about to be made after the request budget is spent.'''
+
+
+class Trace:
+    '''The spans recorded while handling one request.'''
+    def __init__(self, trace_id: str, service: str) -> None:
+        '''Start a trace now.'''
+        self.trace_id = trace_id
+        self.service = service
+        self.start = time.perf_counter()
+        # time.monotonic() value by which the caller needs the answer, None without a budget
+        self.deadline: float | None = None
+        self.spans: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, **attributes: Any) -> None:
+        '''Record a span that began at the perf_counter() value start and took duration seconds.'''
+        record: dict[str, Any] = {
+            'name': name,
+            'start_ms': round((start - self.start) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3)
+        }
+        if attributes:
+            record['attributes'] = attributes
+        with self._lock:
+            self.spans.append(record)
+
+    def add_remote(self, prefix: str, start: float, server_timing: str) -> None:
+        '''Record the Server-Timing entries of a backend response as spans named prefix.name.'''
+        for name, duration_ms, description in parse_server_timing(server_timing):
+            attributes: dict[str, Any] = {'remote': True}
+            if description:
+                attributes['description'] = description
+            self.add(f'{prefix}.{name}', start, duration_ms / 1000, **attributes)
+
+    def server_timing(self, total: float) -> str:
+        '''Return the Server-Timing header: the request total and the spans added up by name.'''
+        totals: dict[str, list[float]] = {}
+        with self._lock:
+            for record in self.spans:
+                name_total = totals.setdefault(record['name'], [0.0, 0])
+                name_total[0] += record['duration_ms']
+                name_total[1] += 1
+        entries = [f'total;dur={total * 1000:.1f}']
+        for name, (duration_ms, count) in totals.items():
+            entry = f'{SERVER_TIMING_NAME_RE.sub("_", name)};dur={duration_ms:.1f}'
+            if count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+    def dump(self, total: float) -> dict[str, Any]:
+        '''Return the trace as a JSON-serializable dict.'''
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            'trace_id': self.trace_id,
+            'service': self.service,
+            'duration_ms': round(total * 1000, 3),
+            'spans': spans
+        }
+
+
+_current: ContextVar[Trace | None] = ContextVar('trace', default=None)
+
+
+def current_trace() -> Trace | None:
+    '''Return the trace of the request being handled, if any.'''
+    return _current.get()
+
+
+def trace_headers() -> dict[str, str]:
+    '''Return the headers that carry the current trace to a backend call.'''
+    trace = current_trace()
+    return {TRACE_HEADER: trace.trace_id} if trace is not None else {}
+
+
+def remaining_budget() -> float | None:
+    '''Return the seconds left of the budget the caller gave the current request, or None.'''
+    trace = current_trace()
+    if trace is None or trace.deadline is None:
+        return None
+    return trace.deadline - time.monotonic()
+
+
+def check_budget(target: str) -> float | None:
+    '''Return the seconds left of the request budget before calling target, or None without
+    a budget. Raises BudgetExceededError when the budget is spent.'''
+    remaining = remaining_budget()
+    if remaining is not None and remaining <= 0:
+        raise BudgetExceededError(f'Request budget spent before calling {target}')
+    return remaining
+
+
+def budget_timeout(timeout: float, target: str) -> float:
+    '''Return the timeout of a call to target made now: timeout, cut to the request budget left.'''
+    remaining = check_budget(target)
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+def parse_server_timing(header: str) -> list[tuple[str, float, str]]:
+    '''Parse a Server-Timing header into (name, duration in ms, description) entries.'''
+    entries = []
+    for metric in header.split(','):
+        parts = [part.strip() for part in metric.split(';')]
+        if not parts[0]:
+            continue
+        duration = 0.0
+        description = ''
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            value = value.strip().strip('"')
+            if key.strip() == 'dur':
+                try:
+                    duration = float(value)
+                except ValueError:
+                    pass
+            elif key.strip() == 'desc':
+                description = value
+        entries.append((parts[0], duration, description))
+    return entries
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    '''Record the enclosed block as a span of the current trace; an exception is noted on the span.'''
+    trace = current_trace()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attributes['error'] = type(e).__name__
+        raise
+    finally:
+        if trace is not None:
+            trace.add(name, start, time.perf_counter() - start, **attributes)
+
+
+def trace_boto3_client(client: Any, system: str) -> None:
+    '''Record every API call made through a boto3 client as a span named system.Operation,
+    and refuse to send a request, or a retry of one, after the request budget is spent.'''
+    def start_span(context: dict[str, Any], **_kwargs: Any) -> None:
+        context['trace_start'] = time.perf_counter()
+
+    def refuse_after_budget(**_kwargs: Any) -> None:
+        # runs before every attempt, so retries stop once the budget is spent
+        check_budget(system)
+
+    def end_span(context: dict[str, Any], event_name: str, http_response: Any = None, **_kwargs: Any) -> None:
+        # after-call-error carries no model, the operation is the last part of the event name
+        start = context.pop('trace_start', None)
+        trace = current_trace()
+        if start is not None and trace is not None:
+            attributes: dict[str, Any] = {}
+            if http_response is None or http_response.status_code >= 400:
+                attributes['error'] = True
+            operation = event_name.rsplit('.', 1)[-1]
+            trace.add(f'{system}.{operation}', start, time.perf_counter() - start, **attributes)
+
+    client.meta.events.register('before-call', start_span)
+    client.meta.events.register('before-send', refuse_after_budget)
+    client.meta.events.register('after-call', end_span)
+    client.meta.events.register('after-call-error', end_span)
+
+
+def trace_app(app: Flask, service: str) -> None:
+    '''Open a trace for every request of a Flask app and report it on the response.
+    A request whose budget runs out is answered 504.'''
+    @app.before_request
+    def start_trace() -> None:
+        trace_id = request.headers.get(TRACE_HEADER, '')
+        if not TRACE_ID_RE.match(trace_id):
+            trace_id = uuid.uuid4().hex
+        trace = Trace(trace_id, service)
+        budget = request.headers.get(BUDGET_HEADER, '')
+        if budget.isdigit():
+            trace.deadline = time.monotonic() + int(budget) / 1000
+        _current.set(trace)
+
+    @app.errorhandler(BudgetExceededError)
+    def budget_exceeded(error: BudgetExceededError) -> tuple[Response, int]:
+        LOGGER.warning("%s: %s", service, error)
+        return jsonify({'error': str(error)}), 504
+
+    @app.after_request
+    def finish_trace(response: Response) -> Response:
+        trace = current_trace()
+        if trace is None:
+            return response
+        total = time.perf_counter() - trace.start
+        response.headers[TRACE_HEADER] = trace.trace_id
+        response.headers['Server-Timing'] = trace.server_timing(total)
+        wants_dump = request.headers.get(DUMP_HEADER, '').lower() in ('1', 'true')
+        if wants_dump or LOG_SPANS:
+            dump = json.dumps(trace.dump(total), separators=(',', ':'))
+            if wants_dump:
+                response.headers[SPANS_HEADER] = dump
+            if LOG_SPANS:
+                LOGGER.info("trace %s", dump)
+        return response
+
+    @app.teardown_request
+    def end_trace(_error: BaseException | None) -> None:
+        _current.set(None)
@@ -2,15 +2,24 @@
 and uploads the captured image to an AWS S3 bucket. The user receives a 
 presigned URL to access or download the image.'''
 
+import os
 import datetime
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from s3_handler import S3Handler
+from metrics import instrument_app
+from tracing import trace_app
+from response_compression import compress_app
 
 app = Flask(__name__)
+instrument_app(app, 'webcamera_app')
+trace_app(app, 'webcamera_app')
+compress_app(app)
 s3_handler = S3Handler()
 CORS(app)
 
+PRESIGNED_URL_EXPIRATION = int(os.getenv('PRESIGNED_URL_EXPIRATION', '3600'))
+
 @app.route('/upload', methods=['POST'])
 def upload_image() -> tuple[Response, int]:
     '''Receives an image from the frontend and uploads it directly to S3.'''
@@ -24,16 +33,31 @@ def upload_image() -> tuple[Response, int]:
         timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         object_name = f'image_{timestamp}.jpg'
         app.logger.info("Uploading image %s", object_name)
-        url = s3_handler.upload_bytes_and_get_presigned_url(
-            image_bytes=image.read(),
-            object_name=object_name
+        url = s3_handler.upload_fileobj_and_get_presigned_url(
+            file_obj=image.stream,
+            object_name=object_name,
+            expiration=PRESIGNED_URL_EXPIRATION
         )
         app.logger.info("Image uploaded successfully: %s", url)
-        return jsonify({'url': url, 'download_url': url}), 200
+        return jsonify({'url': url, 'download_url': url, 'object_name': object_name,
+                        'expires_in': PRESIGNED_URL_EXPIRATION}), 200
 
     except Exception as e:
         app.logger.error("Upload failed: %s", e, exc_info=True)
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@app.route('/download/<filename>', methods=['GET'])
+def download_url(filename: str) -> tuple[Response, int]:
+    '''Returns a presigned URL of an uploaded image and how many seconds it stays valid.'''
+    try:
+        url = s3_handler.get_presigned_url(filename, expiration=PRESIGNED_URL_EXPIRATION)
+    except RuntimeError as e:
+        app.logger.error("Download URL failed: %s", e)
+        return jsonify({'error': str(e)}), 500
+    if url is None:
+        return jsonify({'error': 'File not found'}), 404
+    return jsonify({'url': url, 'expires_in': PRESIGNED_URL_EXPIRATION}), 200
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", debug=True, port=5454)
+    app.run(host="0.0.0.0", debug=os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true'),
+            port=int(os.getenv('PORT', '5454')))
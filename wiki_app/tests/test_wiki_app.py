@@ -35,7 +35,7 @@ def test_non_existent_wikipedia_page(test_client):
         mock_page.return_value.exists.return_value = False
 
         response = test_client.post("/query", json={"query": query})
-        assert response.status_code == 200
+        assert response.status_code == 404
         data = response.get_json()
 
         assert "error" in data
@@ -81,3 +81,42 @@ def test_image_fetch_failure(test_client):
         assert data["title"] == query
         assert "Python is a programming language" in data["summary"]
         assert data["main_image"] is None
+
+def test_spent_budget_skips_wikipedia(test_client):
+    """Test that a request whose budget from the gateway is spent is answered 504 without calling Wikipedia."""
+    with patch("wikipediaapi.Wikipedia.page") as mock_page:
+        response = test_client.post("/query", json={"query": "Python"}, headers={"X-Request-Budget-Ms": "0"})
+
+    assert response.status_code == 504
+    assert "Request budget spent" in response.json["error"]
+    mock_page.assert_not_called()
+
+def test_image_fetch_timeout_is_cut_to_the_budget(test_client):
+    """Test that the Wikipedia timeout is cut to the request budget left."""
+    with patch("wikipediaapi.Wikipedia.page") as mock_page, \
+         patch("requests.get") as mock_requests:
+        mock_page.return_value.exists.return_value = True
+        mock_page.return_value.title = "Python"
+        mock_page.return_value.summary = "Python is a programming language..."
+        mock_page.return_value.fullurl = "https://en.wikipedia.org/wiki/Python"
+        mock_requests.return_value.status_code = 500
+
+        response = test_client.post("/query", json={"query": "Python"}, headers={"X-Request-Budget-Ms": "2000"})
+
+    assert response.status_code == 200
+    assert 0 < mock_requests.call_args.kwargs["timeout"] <= 2
+
+def test_metrics_endpoint(test_client):
+    """Test that query latency and Wikipedia call timings are exposed on /metrics."""
+    with patch("wikipediaapi.Wikipedia.page") as mock_page, \
+         patch("requests.get") as mock_requests:
+
+        mock_page.return_value.exists.return_value = False
+        mock_requests.return_value.status_code = 500
+        test_client.post("/query", json={"query": "Nothing here"})
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'route="/query"' in text
+    assert 'system="wikipedia",operation="extracts",outcome="success"' in text
@@ -1,44 +1,62 @@
 '''This Flask application provides an API endpoint to fetch Wikipedia articles 
 based on a user query. It extracts the article's title, summary, full URL, 
 and main image (if available).'''
+import os
 import requests
 import wikipediaapi
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from bs4 import BeautifulSoup
+from metrics import instrument_app, time_upstream
+from tracing import BudgetExceededError, budget_timeout, check_budget, trace_app, span
+from response_compression import compress_app
 
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'wiki_app')
+trace_app(app, 'wiki_app')
+compress_app(app)
+
+# upper bound of one Wikipedia call; the gateway's request budget can cut it further
+WIKIPEDIA_TIMEOUT = float(os.getenv('WIKIPEDIA_TIMEOUT', '30'))
 
 wiki_wiki = wikipediaapi.Wikipedia(
     user_agent='MyWebPortfolio (anna.rozumova108@gmail.com)',
         language='en',
-        extract_format=wikipediaapi.ExtractFormat.HTML
+        extract_format=wikipediaapi.ExtractFormat.HTML,
+        timeout=WIKIPEDIA_TIMEOUT
 )
 
 @app.route('/query', methods=['POST'])
-def query_wikipedia() -> Response:
-    '''Fetch Wikipedia page and extract article details'''
+def query_wikipedia() -> tuple[Response, int]:
+    '''Fetch Wikipedia page and extract article details; a missing article is answered 404'''
     try:
         data = request.get_json()
         query = data.get('query', '')
 
         if not query:
-            return jsonify({'error': 'No query provided'})
-        page = wiki_wiki.page(query)
-        if not page.exists():
-            return jsonify({'error': f"No article found for '{query}'"})
+            return jsonify({'error': 'No query provided'}), 200
+        check_budget('Wikipedia')
+        with time_upstream('wikipedia', 'extracts'), span('wikipedia.extracts'):
+            page = wiki_wiki.page(query)
+            exists = page.exists()
+        if not exists:
+            return jsonify({'error': f"No article found for '{query}'"}), 404
 
         title = page.title
         raw_summary = page.summary[:500] + "..." if len(page.summary) > 500 else page.summary
-        url = page.fullurl
+        check_budget('Wikipedia')
+        with time_upstream('wikipedia', 'info'), span('wikipedia.info'):
+            url = page.fullurl
 
         soup = BeautifulSoup(raw_summary, 'html.parser')
         summary = soup.get_text()
 
         main_image = None
-        response = requests.get(f"https://en.wikipedia.org/api/rest_v1/page/summary/{query}", timeout=30)
+        with time_upstream('wikipedia', 'rest_summary'), span('wikipedia.rest_summary'):
+            response = requests.get(f"https://en.wikipedia.org/api/rest_v1/page/summary/{query}",
+                                    timeout=budget_timeout(WIKIPEDIA_TIMEOUT, 'Wikipedia'))
         if response.status_code == 200:
             data = response.json()
             main_image = data.get('thumbnail', {}).get('source', None)
@@ -48,10 +66,13 @@ def query_wikipedia() -> Response:
             'summary': summary,
             'url': url,
             'main_image': main_image,
-        })
+        }), 200
+    except BudgetExceededError:
+        raise
     except Exception as e:
         app.logger.error(f"Unexpected error: {str(e)}")
-        return jsonify({'error': f"Internal Server Error: {str(e)}"})
+        return jsonify({'error': f"Internal Server Error: {str(e)}"}), 500
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", debug=True, port=8000)
+    app.run(host="0.0.0.0", debug=os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true'),
+            port=int(os.getenv('PORT', '8000')))